@@ -0,0 +1,2 @@
+# Load-testing and benchmark tooling for QStack
+# Nothing in here is imported by the server
@@ -0,0 +1,309 @@
+"""
+Scripted load scenarios against a running QStack server
+
+Each scenario takes a Context and drives simulated hackers, mentors and
+admins with their own forged sessions, recording every call in ctx.recorder.
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import requests
+
+from bench.sessions import client_for
+
+# Query and commit counts reported by the server in its Server-Timing header
+DB_TIMING = re.compile(r'db;desc="(\d+) queries(?:, (\d+) commits)?"')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Recorder:
+    """Thread-safe collection of per-route latencies, statuses, query and commit counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.queries = defaultdict(list)
+        self.commits = defaultdict(list)
+        self.notes = []
+
+    def record(self, route, elapsed, status):
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            self.statuses[route][status] += 1
+
+    def record_queries(self, route, count, commits=None):
+        with self._lock:
+            self.queries[route].append(count)
+            if commits is not None:
+                self.commits[route].append(commits)
+
+    def note(self, message):
+        with self._lock:
+            self.notes.append(message)
+
+    def report(self, title):
+        print(f"\n== {title}")
+        print(f"{'route':<34}{'reqs':>7}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'q/req':>7}{'c/req':>7}")
+        for route in sorted(self.latencies):
+            times = self.latencies[route]
+            errors = sum(n for status, n in self.statuses[route].items() if not status or status >= 500)
+            queries = self.queries.get(route)
+            q_per_req = f"{sum(queries) / len(queries):.1f}" if queries else "-"
+            commits = self.commits.get(route)
+            c_per_req = f"{sum(commits) / len(commits):.2f}" if commits else "-"
+            print(f"{route:<34}{len(times):>7}{errors:>8}"
+                  f"{percentile(times, 50) * 1000:>9.1f}{percentile(times, 99) * 1000:>9.1f}{q_per_req:>7}{c_per_req:>7}")
+        for message in self.notes:
+            print(f"  {message}")
+
+
+class Context:
+    def __init__(self, app, base_url, ids, duration, interval, seed=1):
+        self.app = app
+        self.base_url = base_url
+        self.ids = ids
+        self.duration = duration
+        self.interval = interval
+        self.rng = random.Random(seed)
+        self.recorder = Recorder()
+
+    def client(self, user_id):
+        return client_for(self.app, self.base_url, user_id)
+
+    def call(self, client, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = client.request(method, self.base_url + path, timeout=60, allow_redirects=False, **kwargs)
+        except requests.RequestException:
+            response = None
+        route = f"{method} {path}"
+        self.recorder.record(route, time.perf_counter() - start,
+                             response.status_code if response is not None else None)
+        if response is not None:
+            match = DB_TIMING.search(response.headers.get("Server-Timing", ""))
+            if match:
+                self.recorder.record_queries(route, int(match.group(1)),
+                                             int(match.group(2)) if match.group(2) else None)
+        return response
+
+    def sleep_interval(self, rng):
+        time.sleep(rng.uniform(*self.interval))
+
+
+def _run_threads(targets):
+    threads = [threading.Thread(target=target, daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def polling_storm(ctx):
+    """Hackers poll their ticket, mentors poll the queue while tickets churn"""
+    deadline = time.time() + ctx.duration
+
+    def hacker(uid, seed):
+        rng = random.Random(seed)
+        client = ctx.client(uid)
+        time.sleep(rng.uniform(*ctx.interval))
+        while time.time() < deadline:
+            ctx.call(client, "GET", "/api/ticket/status")
+            ctx.call(client, "GET", "/api/ticket/get")
+            ctx.sleep_interval(rng)
+
+    def mentor(uid, seed):
+        rng = random.Random(seed)
+        client = ctx.client(uid)
+        claimed = None
+        time.sleep(rng.uniform(*ctx.interval))
+        while time.time() < deadline:
+            response = ctx.call(client, "GET", "/api/queue/get")
+            ctx.call(client, "GET", "/api/queue/claimed")
+            ctx.call(client, "GET", "/api/queue/ranking")
+
+            # Churn: occasionally pick up an open ticket and hand it back next round
+            if claimed is not None:
+                ctx.call(client, "POST", "/api/queue/unclaim", json={"id": claimed})
+                claimed = None
+            elif response is not None and response.ok and rng.random() < 0.1:
+                open_tickets = [t for t in response.json() if t.get("mentor_id") is None]
+                if open_tickets:
+                    claimed = rng.choice(open_tickets)["id"]
+                    claim = ctx.call(client, "POST", "/api/queue/claim", json={"id": claimed})
+                    if claim is None or not claim.ok:
+                        claimed = None
+            ctx.sleep_interval(rng)
+
+    targets = [lambda uid=uid, i=i: hacker(uid, i) for i, uid in enumerate(ctx.ids["hacker"])]
+    targets += [lambda uid=uid, i=i: mentor(uid, -i - 1) for i, uid in enumerate(ctx.ids["mentor"])]
+    _run_threads(targets)
+
+
+def claim_race(ctx, tickets=20):
+    """Every mentor tries to claim the same open tickets at the same instant"""
+    mentors = ctx.ids["mentor"]
+    clients = [ctx.client(uid) for uid in mentors]
+
+    admin = ctx.client(ctx.ids["admin"][0])
+    response = ctx.call(admin, "GET", "/api/queue/get")
+    open_ids = [t["id"] for t in response.json() if t.get("mentor_id") is None][:tickets] if response is not None and response.ok else []
+
+    double_claims = 0
+    for ticket_id in open_ids:
+        barrier = threading.Barrier(len(clients))
+        winners = []
+
+        def racer(client):
+            barrier.wait()
+            result = ctx.call(client, "POST", "/api/queue/claim", json={"id": ticket_id})
+            if result is not None and result.ok:
+                winners.append(client)
+
+        _run_threads([lambda c=c: racer(c) for c in clients])
+        if len(winners) > 1:
+            double_claims += 1
+        if winners:
+            ctx.call(winners[0], "POST", "/api/queue/unclaim", json={"id": ticket_id})
+
+    ctx.recorder.note(f"claim race: {len(open_ids)} tickets x {len(clients)} mentors, "
+                      f"{double_claims} claimed by more than one mentor")
+
+
+def submission_burst(ctx):
+    """Hackers without an open ticket all submit at once"""
+    hackers = ctx.ids.get("burst", [])
+    if not hackers:
+        return
+    barrier = threading.Barrier(len(hackers))
+
+    def submitter(uid, seed):
+        rng = random.Random(seed)
+        client = ctx.client(uid)
+        barrier.wait()
+        ctx.call(client, "POST", "/api/ticket/submit", json={
+            "question": rng.choice(["Wifi down", "Can't install node", "Build failing"]),
+            "content": "Tried restarting, still broken",
+            "location": f"Table {rng.randint(1, 80)}",
+            "tags": ["Wifi"],
+            "images": [],
+        })
+
+    _run_threads([lambda uid=uid, i=i: submitter(uid, i) for i, uid in enumerate(hackers)])
+
+
+def ticket_lifecycle(ctx):
+    """Hackers draft, submit and rate a ticket, retrying submit and rate with the same Idempotency-Key
+
+    The c/req column shows how many commits each write costs.
+    """
+    hackers = ctx.ids.get("burst", [])
+    mentors = ctx.ids["mentor"]
+    if not hackers:
+        return
+    replayed = Counter()
+
+    def hacker(uid, mentor_uid, seed):
+        rng = random.Random(seed)
+        client = ctx.client(uid)
+        mentor = ctx.client(mentor_uid)
+        ticket = {
+            "question": rng.choice(["Wifi down", "Can't install node", "Build failing"]),
+            "content": "Tried restarting, still broken",
+            "location": f"Table {rng.randint(1, 80)}",
+            "tags": ["Wifi"],
+            "images": [],
+        }
+        # Start from a clean slate if an earlier scenario left a ticket behind
+        ctx.call(client, "POST", "/api/ticket/remove", json={"del": True})
+        ctx.call(client, "POST", "/api/ticket/save", json=ticket)
+
+        key = str(uuid.uuid4())
+        for _ in range(2):
+            response = ctx.call(client, "POST", "/api/ticket/submit", json=ticket, headers={"Idempotency-Key": key})
+            if response is not None and response.headers.get("Idempotent-Replayed"):
+                replayed["submit"] += 1
+
+        response = ctx.call(client, "GET", "/api/ticket/get")
+        if response is None or not response.ok or not response.json().get("active"):
+            return
+        ticket_id = response.json()["ticket"]["id"]
+        claim = ctx.call(mentor, "POST", "/api/queue/claim", json={"id": ticket_id})
+        if claim is None or not claim.ok:
+            return
+        ctx.call(client, "POST", "/api/ticket/resolve", json={"mentor_id": mentor_uid})
+
+        key = str(uuid.uuid4())
+        for _ in range(2):
+            response = ctx.call(client, "POST", "/api/ticket/rate", headers={"Idempotency-Key": key}, json={
+                "id": ticket_id, "mentor_id": mentor_uid, "rating": rng.choice([4, 4.5, 5]), "review": "Thanks!",
+            })
+            if response is not None and response.headers.get("Idempotent-Replayed"):
+                replayed["rate"] += 1
+
+    _run_threads([
+        lambda uid=uid, i=i: hacker(uid, mentors[i % len(mentors)], i) for i, uid in enumerate(hackers)
+    ])
+    ctx.recorder.note(f"idempotent retries: {replayed['submit']}/{len(hackers)} submits and "
+                      f"{replayed['rate']}/{len(hackers)} ratings replayed instead of repeated")
+
+
+def aligned_viewers(ctx):
+    """Every mentor and hacker refreshes the leaderboard or network view on the same tick
+
+    With request coalescing the q/req of these routes stays near zero however
+    many viewers there are.
+    """
+    deadline = time.time() + ctx.duration
+    period = ctx.interval[1]
+
+    def viewer(uid, path):
+        client = ctx.client(uid)
+        while True:
+            # Sleep to the next shared tick, so the requests arrive together
+            tick = (time.time() // period + 1) * period
+            if tick >= deadline:
+                return
+            time.sleep(tick - time.time())
+            ctx.call(client, "GET", path)
+
+    targets = [lambda uid=uid: viewer(uid, "/api/queue/ranking") for uid in ctx.ids["mentor"]]
+    targets += [lambda uid=uid: viewer(uid, "/api/queue/network") for uid in ctx.ids["hacker"]]
+    _run_threads(targets)
+
+
+def admin_dashboard(ctx):
+    """Admins keep the dashboard open, refreshing every few seconds"""
+    deadline = time.time() + ctx.duration
+
+    def admin(uid, seed):
+        rng = random.Random(seed)
+        client = ctx.client(uid)
+        while time.time() < deadline:
+            ctx.call(client, "GET", "/api/admin/ticketdata")
+            ctx.call(client, "GET", "/api/admin/userdata")
+            ctx.call(client, "GET", "/api/admin/alltickets")
+            ctx.sleep_interval(rng)
+
+    _run_threads([lambda uid=uid, i=i: admin(uid, i) for i, uid in enumerate(ctx.ids["admin"])])
+
+
+SCENARIOS = {
+    "polling_storm": polling_storm,
+    "claim_race": claim_race,
+    "submission_burst": submission_burst,
+    "ticket_lifecycle": ticket_lifecycle,
+    "aligned_viewers": aligned_viewers,
+    "admin_dashboard": admin_dashboard,
+}
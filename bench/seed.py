@@ -0,0 +1,140 @@
+"""
+Seeded data generator for benchmarks
+
+Creates hackers, mentors and admins plus a realistic mix of tickets
+(unclaimed, claimed, awaiting feedback, completed) and mentor ratings. All
+rows use ids prefixed with "bench-" so they can be removed again with reset().
+The same seed always produces the same data.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, text, update
+
+from server import db
+from server.models import Rating, Ticket, User
+
+PREFIX = "bench-"
+
+QUESTIONS = [
+    "Wifi keeps dropping",
+    "Can't install node",
+    "React state not updating",
+    "CORS error calling our API",
+    "Python import error",
+    "Docker container won't start",
+    "Git merge conflict",
+    "Arduino not detected over USB",
+    "How do I deploy to Vercel?",
+    "Firebase auth redirect loop",
+]
+TAGS = ["React", "Python", "Node.js", "Hardware", "Git", "Docker", "Firebase", "Wifi", "Flask", "Java"]
+LOCATIONS = ["Table 12", "Table 40", "Room 101", "Atrium", "Hardware lab"]
+REVIEWS = ["Super helpful!", "Fixed it in 5 minutes", "Thanks!", "Explained it clearly", ""]
+
+
+def user_ids(role, count):
+    return [f"{PREFIX}{role}-{i:04d}" for i in range(count)]
+
+
+def _user_row(uid, role):
+    return {
+        "id": uid,
+        "role": role,
+        "location": "in person",
+        "zoomlink": "",
+        "discord": f"{uid}#0001",
+        "phone": "",
+        "resolved_tickets": 0,
+        "ratings": [],
+        "reviews": [],
+    }
+
+
+def reset():
+    """Remove every row created by seed()"""
+    db.session.execute(update(User).where(User.id.like(f"{PREFIX}%")).values(ticket_id=None))
+    db.session.execute(delete(Ticket).where(Ticket.creator_id.like(f"{PREFIX}%")))
+    db.session.execute(delete(Rating).where(Rating.mentor_id.like(f"{PREFIX}%")))
+    db.session.execute(text("DELETE FROM idempotency_keys WHERE user_id LIKE :prefix"), {"prefix": f"{PREFIX}%"})
+    db.session.execute(delete(User).where(User.id.like(f"{PREFIX}%")))
+    db.session.commit()
+
+
+def seed(hackers=300, mentors=40, admins=3, tickets=600, burst=100, seed=1):
+    """Populate the database and return the generated user ids by role
+
+    "burst" users are hackers that have never submitted a ticket.
+    Must be called inside an app context.
+    """
+    rng = random.Random(seed)
+    reset()
+
+    ids = {
+        "hacker": user_ids("hacker", hackers),
+        "mentor": user_ids("mentor", mentors),
+        "admin": user_ids("admin", admins),
+        "burst": user_ids("burst", burst),
+    }
+    db.session.execute(
+        insert(User),
+        [_user_row(uid, "hacker" if role == "burst" else role) for role, uids in ids.items() for uid in uids],
+    )
+
+    now = datetime.utcnow()
+    statuses = ["unclaimed", "claimed", "awaiting_feedback", "completed"]
+    weights = [0.25, 0.1, 0.15, 0.5]
+    rows = []
+    for _ in range(tickets):
+        status = rng.choices(statuses, weights)[0]
+        created = now - timedelta(minutes=rng.uniform(1, 36 * 60))
+        claimant = rng.choice(ids["mentor"]) if status != "unclaimed" else None
+        creator = rng.choice(ids["hacker"])
+        rows.append({
+            "creator_id": creator,
+            "claimant_id": claimant,
+            "claimant_name": claimant,
+            "question": rng.choice(QUESTIONS),
+            "content": " ".join(rng.choice(QUESTIONS) for _ in range(rng.randint(2, 8))),
+            "location": rng.choice(LOCATIONS),
+            "tags": rng.sample(TAGS, rng.randint(1, 3)),
+            "images": [],
+            "creator_email": f"{creator}@example.com",
+            "creator_name": creator,
+            "active": status == "unclaimed",
+            "status": status,
+            "createdAt": created,
+            "claimedAt": created + timedelta(minutes=rng.uniform(0.5, 25)) if claimant else None,
+        })
+    created_tickets = db.session.execute(
+        insert(Ticket).returning(Ticket.id, Ticket.creator_id, Ticket.status), rows
+    ).all()
+
+    # Point each hacker at their most recent open ticket
+    latest = {}
+    for ticket_id, creator_id, status in created_tickets:
+        if status in ("unclaimed", "claimed", "awaiting_feedback"):
+            latest[creator_id] = ticket_id
+    if latest:
+        db.session.execute(
+            update(User), [{"id": uid, "ticket_id": tid} for uid, tid in latest.items()]
+        )
+
+    # Ratings and reviews for mentors
+    mentor_rows = []
+    for uid in ids["mentor"]:
+        count = rng.randint(0, 30)
+        mentor_rows.append({
+            "id": uid,
+            "resolved_tickets": count + rng.randint(0, 5),
+            "ratings": [rng.choice([3, 3.5, 4, 4.5, 5]) for _ in range(count)],
+            "reviews": [
+                {"reviewer": rng.choice(ids["hacker"]), "text": text}
+                for text in (rng.choice(REVIEWS) for _ in range(count))
+                if text
+            ],
+        })
+    db.session.execute(update(User), mentor_rows)
+
+    db.session.commit()
+    return ids
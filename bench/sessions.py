@@ -0,0 +1,31 @@
+"""
+Session-forging fixture for benchmarks
+
+Signs a Flask session cookie with the app's own secret so simulated clients
+are logged in without going through the auth server or Firebase. The session
+already carries a firebase_id_token, so HackPSU API calls made on behalf of
+the client use it instead of exchanging a custom token with Firebase.
+"""
+import requests
+
+
+def forge_session_cookie(app, user_id, name=None, email=None):
+    """Return a signed session cookie value for user_id"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({
+        "user_id": user_id,
+        "user_name": name or user_id,
+        "user_email": email or f"{user_id}@example.com",
+        "firebase_id_token": "bench-token",
+    })
+
+
+def client_for(app, base_url, user_id):
+    """requests.Session logged in as user_id against a running server"""
+    client = requests.Session()
+    client.cookies.set(
+        app.config.get("SESSION_COOKIE_NAME", "session"),
+        forge_session_cookie(app, user_id),
+    )
+    client.base_url = base_url
+    return client
@@ -0,0 +1,81 @@
+"""
+Worker cold start benchmark
+
+Measures, in fresh interpreters, how long a worker takes to import the server
+package, build the app with create_app() and answer its first request
+(/api/ticket/tagslist, which needs no database). With --top, also lists the
+modules that take longest to import, from python -X importtime.
+
+Usage:
+    python -m bench.startup --runs 10
+    python -m bench.startup --top 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+app = server.create_app()
+created = time.perf_counter()
+app.test_client().get("/api/ticket/tagslist")
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "total_ms": (served - start) * 1000,
+}))
+"""
+
+
+def run_probe():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server; server.create_app()"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4)))
+    # Cumulative times include children, so only top-level entries add up
+    for cumulative, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>9.1f} ms  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports")
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    print(f"{'phase':<18} {'median ms':>10} {'max ms':>10}")
+    for key in ("import_ms", "create_app_ms", "first_request_ms", "total_ms"):
+        values = [sample[key] for sample in samples]
+        print(f"{key[:-3]:<18} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+    if args.top:
+        print()
+        import_profile(args.top)
+
+
+if __name__ == "__main__":
+    main()
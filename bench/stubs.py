@@ -0,0 +1,149 @@
+"""
+Stub HTTP servers standing in for QStack's upstream dependencies
+
+Each stub runs in a background thread on localhost and can be told to add
+latency or fail a fraction of requests, so load tests can reproduce a slow or
+flaky upstream without touching the real HackPSU services.
+"""
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_session_jwt(uid, email=None, name=None, privilege=4):
+    """Build an unsigned Firebase-style session JWT
+
+    QStack decodes the __session cookie without verifying the signature and
+    relies on the auth server to say whether it is valid, so the stub auth
+    server accepts anything and this is enough to log in.
+    """
+
+    def encode(part):
+        raw = json.dumps(part, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    payload = {
+        "uid": uid,
+        "email": email or f"{uid}@example.com",
+        "name": name or uid,
+        "production": privilege,
+        "staging": privilege,
+    }
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(payload)}.stub"
+
+
+class StubServer:
+    """Threaded HTTP server that dispatches (method, path prefix) to handlers
+
+    Handlers are called with the request handler and return (status, body);
+    dict/list bodies are sent as JSON.
+    """
+
+    def __init__(self, routes, port=0, latency=0.0, error_rate=0.0):
+        self.routes = routes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                with stub._lock:
+                    stub.requests += 1
+
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length) if length else b""
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                if stub.error_rate and random.random() < stub.error_rate:
+                    return self._send(503, {"error": "injected failure"})
+
+                path = self.path.split("?", 1)[0]
+                for (route_method, prefix), handler in stub.routes.items():
+                    if route_method == method and path.startswith(prefix):
+                        return self._send(*handler(self))
+                return self._send(404, {"error": "not found"})
+
+            def _send(self, status, body):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def auth_server(**kwargs):
+    """Stub of the HackPSU auth server (/api/sessionUser, /api/sessionLogout)"""
+    routes = {
+        ("GET", "/api/sessionUser"): lambda req: (200, {"customToken": "stub-custom-token"}),
+        ("POST", "/api/sessionLogout"): lambda req: (200, {"success": True}),
+    }
+    return StubServer(routes, **kwargs)
+
+
+def hackpsu_api(**kwargs):
+    """Stub of apiv3.hackpsu.org (/organizers/{id}, /users/{id}, /users/info/me)"""
+
+    def profile(req):
+        uid = req.path.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        return 200, {
+            "id": uid,
+            "firstName": "Bench",
+            "lastName": uid,
+            "email": f"{uid}@example.com",
+            "privilege": 4 if "organizers" in req.path else 0,
+        }
+
+    routes = {
+        ("GET", "/organizers/"): profile,
+        ("GET", "/users/"): profile,
+    }
+    return StubServer(routes, **kwargs)
+
+
+def gotify(**kwargs):
+    """Stub of the Gotify push server (/message)"""
+    routes = {
+        ("POST", "/message"): lambda req: (200, {"id": 1}),
+    }
+    return StubServer(routes, **kwargs)
@@ -0,0 +1,146 @@
+"""
+Load test: how many slow upstream calls can QStack hold open at once?
+
+Starts a stub auth server that answers after --latency seconds, boots
+gunicorn from gunicorn.conf.py pointed at it, then fires --concurrency
+simultaneous /api/auth/logout requests (each one makes a blocking call to the
+auth server). While that storm is in flight it probes /api/ticket/tagslist,
+which never leaves the process, to see whether the app still answers.
+
+Usage:
+    python -m bench.upstream_concurrency --worker-class sync gevent
+"""
+import argparse
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from bench.stubs import auth_server, make_session_jwt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def timed_get(port, path, cookie=None, timeout=60):
+    headers = {"Cookie": f"__session={cookie}"} if cookie else {}
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path, headers=headers)
+        status = conn.getresponse().status
+    except Exception:
+        status = None
+    finally:
+        conn.close()
+    return status, time.perf_counter() - start
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status, _ = timed_get(port, "/api/ticket/tagslist", timeout=1)
+        if status:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def run_scenario(worker_class, args, stub):
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=worker_class,
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_WORKER_CONNECTIONS=str(args.worker_connections),
+        PORT=str(args.port),
+        AUTH_SERVER_URL=f"{stub.url}/api/sessionUser",
+        AUTH_LOGOUT_URL=f"{stub.url}/api/sessionLogout",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_for_port(args.port):
+            print(f"[{worker_class}] gunicorn did not start")
+            return
+
+        cookie = make_session_jwt("loadtest-user")
+        slow_times = []
+        probe_times = []
+        done = threading.Event()
+
+        def slow_request():
+            status, elapsed = timed_get(args.port, "/api/auth/logout", cookie)
+            if status:
+                slow_times.append(elapsed)
+
+        def probe():
+            while not done.is_set():
+                status, elapsed = timed_get(args.port, "/api/ticket/tagslist", timeout=args.latency * 4)
+                probe_times.append(elapsed if status else args.latency * 4)
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=slow_request) for _ in range(args.concurrency)]
+        prober = threading.Thread(target=probe)
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        prober.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        done.set()
+        prober.join()
+
+        # Requests finishing within ~one upstream latency were served concurrently
+        concurrent = sum(1 for t in slow_times if t < args.latency * 1.5)
+        print(f"[{worker_class}] {args.workers} workers, {args.concurrency} slow requests "
+              f"({args.latency:.1f}s upstream latency)")
+        print(f"  wall time             {wall:.2f}s")
+        print(f"  completed             {len(slow_times)}/{args.concurrency}")
+        print(f"  served concurrently   {concurrent}")
+        print(f"  slow p50 / p99        {percentile(slow_times, 50):.2f}s / {percentile(slow_times, 99):.2f}s")
+        if probe_times:
+            print(f"  local probe p50 / p99 {statistics.median(probe_times) * 1000:.0f}ms / "
+                  f"{percentile(probe_times, 99) * 1000:.0f}ms")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-class", nargs="+", default=["sync", "gevent"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker-connections", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=3901)
+    args = parser.parse_args()
+
+    stub = auth_server(latency=args.latency).start()
+    try:
+        for worker_class in args.worker_class:
+            run_scenario(worker_class, args, stub)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
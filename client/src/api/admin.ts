@@ -1,14 +1,63 @@
+interface Columnar {
+  columns: Array<string>;
+  rows: Array<Array<unknown>>;
+}
+
+// Expand a ?format=columnar response back into an array of objects
+function fromColumnar(data: Columnar) {
+  return data.rows.map((row) =>
+    Object.fromEntries(data.columns.map((column, i) => [column, row[i]]))
+  );
+}
+
 export async function getTicketStats() {
-  const res = await fetch("/api/admin/ticketdata");
+  // Stats cover past events too, not just the live tickets
+  const res = await fetch("/api/admin/ticketdata?archived=true");
   return { ok: res.ok, tags: JSON.parse(await res.text()) };
 }
 
 export async function getUserStats() {
-  const res = await fetch("/api/admin/userdata");
-  return { ok: res.ok, tags: JSON.parse(await res.text()) };
+  const res = await fetch("/api/admin/userdata?format=columnar");
+  const data = JSON.parse(await res.text());
+  return { ok: res.ok, tags: res.ok ? fromColumnar(data) : data };
+}
+
+export async function getAllTickets(archived: boolean = false) {
+  const res = await fetch(
+    `/api/admin/alltickets?format=columnar&archived=${archived}`
+  );
+  const data = JSON.parse(await res.text());
+  return { ok: res.ok, tickets: res.ok ? fromColumnar(data) : data };
+}
+
+export async function getEvents() {
+  const res = await fetch("/api/admin/events");
+  return { ok: res.ok, events: JSON.parse(await res.text()) };
+}
+
+// Starts a new event and makes it current
+export async function createEvent(name: string) {
+  const res = await fetch("/api/admin/events", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ name }),
+  });
+  return { ok: res.ok, events: JSON.parse(await res.text()) };
+}
+
+export async function makeEventCurrent(id: number) {
+  const res = await fetch(`/api/admin/events/${id}/current`, { method: "POST" });
+  return { ok: res.ok, ...JSON.parse(await res.text()) };
+}
+
+// Archives the event's tickets
+export async function closeEvent(id: number) {
+  const res = await fetch(`/api/admin/events/${id}/close`, { method: "POST" });
+  return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
 
-export async function getAllTickets() {
-  const res = await fetch("/api/admin/alltickets");
-  return { ok: res.ok, tickets: JSON.parse(await res.text()) };
+export async function searchTickets(query: string, page: number = 1) {
+  const params = new URLSearchParams({ q: query, page: String(page) });
+  const res = await fetch(`/api/ticket/search?${params}`);
+  return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
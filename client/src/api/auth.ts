@@ -13,6 +13,7 @@ export interface UserInfo {
   discord: string;
   phone: string;
   preferred: string;
+  skills?: Array<string>;
 }
 
 export async function updateUser(user: UserInfo) {
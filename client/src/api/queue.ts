@@ -3,13 +3,13 @@ export async function getTickets() {
   return { ok: res.ok, tickets: JSON.parse(await res.text()) };
 }
 
-export async function claimTicket(id: number) {
+export async function claimTicket(id: number, cluster: boolean = false) {
   const res = await fetch("/api/queue/claim", {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ id: id }),
+    body: JSON.stringify({ id: id, cluster: cluster }),
   });
   return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
@@ -25,13 +25,17 @@ export async function unclaimTicket(id: number) {
   return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
 
-export async function resolveTicket(id: number, creator: string) {
+export async function resolveTicket(
+  id: number,
+  creator: string,
+  cluster: boolean = false
+) {
   const res = await fetch("/api/queue/resolve", {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ id: id, creator: creator }),
+    body: JSON.stringify({ id: id, creator: creator, cluster: cluster }),
   });
   return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
@@ -45,3 +49,21 @@ export async function getMentorRankings() {
   const res = await fetch("/api/queue/ranking");
   return { ok: res.ok, rankings: JSON.parse(await res.text()) };
 }
+
+export interface MentorsOnline {
+  total: number;
+  byLocation: Record<string, number>;
+  byTag: Record<string, number>;
+}
+
+export async function getMentorsOnline() {
+  const res = await fetch("/api/queue/mentors");
+  return { ok: res.ok, mentors: JSON.parse(await res.text()) as MentorsOnline };
+}
+
+// Ticket change events pushed by the server; polling remains the fallback
+export function subscribe(onChange: () => void) {
+  const source = new EventSource("/api/queue/events");
+  source.onmessage = () => onChange();
+  return source;
+}
@@ -6,6 +6,40 @@ interface Ticket {
   images: Array<string>;
 }
 
+function idempotencyKey() {
+  if (typeof crypto !== "undefined" && "randomUUID" in crypto) {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// POST that is safe to retry: the server replays its first response for a
+// repeated Idempotency-Key instead of creating the ticket or rating again
+async function postIdempotent(url: string, body: object, attempts = 3) {
+  const key = idempotencyKey();
+  for (let attempt = 1; ; attempt++) {
+    try {
+      const res = await fetch(url, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "Idempotency-Key": key,
+        },
+        body: JSON.stringify(body),
+      });
+      if (res.status < 500 || attempt >= attempts) {
+        return res;
+      }
+    } catch (err) {
+      // Network error: the request may or may not have reached the server
+      if (attempt >= attempts) {
+        throw err;
+      }
+    }
+    await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+  }
+}
+
 export async function getTags() {
   const res = await fetch("/api/ticket/tagslist");
   return { ok: res.ok, tags: JSON.parse(await res.text()) };
@@ -23,16 +57,25 @@ export async function save(ticket: Ticket) {
 }
 
 export async function submit(ticket: Ticket) {
-  const res = await fetch(`/api/ticket/submit`, {
+  const res = await postIdempotent(`/api/ticket/submit`, ticket);
+  return { ok: res.ok, ...JSON.parse(await res.text()) };
+}
+
+
+export async function uploadImage(file: File) {
+  const body = new FormData();
+  body.append("file", file);
+  const res = await fetch("/api/attachments", {
     method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
-    body: JSON.stringify(ticket),
+    body: body,
   });
   return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
 
+export async function similar(text: string) {
+  const res = await fetch(`/api/ticket/similar?q=${encodeURIComponent(text)}`);
+  return { ok: res.ok, tickets: JSON.parse(await res.text()) };
+}
 
 export async function getTicket() {
   const res = await fetch("/api/ticket/get");
@@ -50,6 +93,15 @@ export async function remove(del: boolean) {
   return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
 
+export interface QueueEta {
+  position: number;
+  queued: number;
+  mentorsOnline: number;
+  claimsPerHour: number;
+  medianWaitSeconds: number | null;
+  etaSeconds: number | null;
+}
+
 export async function getStatus() {
   const res = await fetch("/api/ticket/status");
   return { ok: res.ok, ...JSON.parse(await res.text()) };
@@ -66,13 +118,7 @@ export async function getFeedback() {
 }
 
 export async function rate(id: number, mentor_id: number, rating: number, review: string, reviewerName?: string) {
-  const res = await fetch("/api/ticket/rate", {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
-    body: JSON.stringify({ id: id, mentor_id: mentor_id, rating: rating, review: review, reviewerName: reviewerName}),
-  });
+  const res = await postIdempotent("/api/ticket/rate", { id: id, mentor_id: mentor_id, rating: rating, review: review, reviewerName: reviewerName});
   return { ok: res.ok, ...JSON.parse(await res.text()) };
 }
 
@@ -21,6 +21,7 @@ interface userState {
   discord: string;
   phone: string;
   preferred: string;
+  skills: Array<string>;
   discordRequired?: boolean;
   contactRequired?: boolean;
   // eslint-disable-next-line @typescript-eslint/no-explicit-any
@@ -36,6 +37,7 @@ export const useUserStore = create<userState>((set) => ({
   discord: "",
   phone: "",
   preferred: "",
+  skills: [],
   loggedIn: undefined,
   discordRequired: false,
   contactRequired: false,
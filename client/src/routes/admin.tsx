@@ -8,11 +8,14 @@ import {
   Table,
   Group,
   Rating,
-  Button
+  Button,
+  Switch,
+  TextInput
 } from "@mantine/core";
 import { useNavigate } from "react-router-dom";
 import { computeNormalizedRating } from "../utils";
 import * as admin from "../api/admin";
+import * as queue from "../api/queue";
 import React from "react";
 
 interface ticket {
@@ -28,9 +31,19 @@ interface user {
   location: string;
   discord: string;
   reviews: Array<string | { reviewer: string; text: string }>;
+  skills: Array<string>;
+  online: boolean;
   id: number;
 }
 
+interface hackathonEvent {
+  id: number;
+  name: string;
+  current: boolean;
+  createdAt: string;
+  closedAt: string | null;
+}
+
 interface adminTicket {
   id: number;
   question: string;
@@ -46,6 +59,7 @@ interface adminTicket {
   claimedAt: string | null;
   location: string;
   tags: Array<string>;
+  archived: boolean;
 }
 
 export default function AdminPanel() {
@@ -54,6 +68,13 @@ export default function AdminPanel() {
   const [ticketStats, setTicketStats] = useState<ticket>();
   const [users, setUsers] = useState<Array<user>>([]);
   const [allTickets, setAllTickets] = useState<Array<adminTicket>>([]);
+  const [includeArchived, setIncludeArchived] = useState<boolean>(false);
+  const [searchQuery, setSearchQuery] = useState<string>("");
+  // Ticket ids matching searchQuery, best match first; null when not searching
+  const [searchIds, setSearchIds] = useState<Array<number> | null>(null);
+  const [mentorsOnline, setMentorsOnline] = useState<queue.MentorsOnline>();
+  const [hackathonEvents, setHackathonEvents] = useState<Array<hackathonEvent>>([]);
+  const [newEventName, setNewEventName] = useState<string>("");
   const [expandedUserId, setExpandedUserId] = useState<number | null>(null); // Track which user's row is expanded
 
   const toggleExpandRow = (userId: number) => {
@@ -64,7 +85,9 @@ export default function AdminPanel() {
     try {
       const ticketRes = await admin.getTicketStats();
       const userRes = await admin.getUserStats();
-      const ticketsRes = await admin.getAllTickets();
+      const ticketsRes = await admin.getAllTickets(includeArchived);
+      const eventsRes = await admin.getEvents();
+      const mentorsRes = await queue.getMentorsOnline();
 
       if (!ticketRes.ok) {
         throw new Error("Ticket stats fetch failed");
@@ -89,15 +112,64 @@ export default function AdminPanel() {
         setAllTickets(ticketsRes.tickets);
         setLoading(false);
       }
+
+      if (eventsRes.ok) {
+        setHackathonEvents(eventsRes.events);
+      }
+
+      if (mentorsRes.ok) {
+        setMentorsOnline(mentorsRes.mentors);
+      }
     } catch (error) {
       navigate("/error");
     }
-  }, [navigate]);
+  }, [navigate, includeArchived]);
 
   useEffect(() => {
     fetchStats();
   }, [fetchStats]);
 
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSearchIds(null);
+      return;
+    }
+    const timeout = setTimeout(async () => {
+      const res = await admin.searchTickets(searchQuery);
+      setSearchIds(
+        res.ok ? res.tickets.map((ticket: { id: number }) => ticket.id) : []
+      );
+    }, 300);
+    return () => clearTimeout(timeout);
+  }, [searchQuery]);
+
+  const startEvent = async () => {
+    if (!newEventName.trim()) return;
+    const res = await admin.createEvent(newEventName.trim());
+    if (res.ok) {
+      setNewEventName("");
+      fetchStats();
+    }
+  };
+
+  const switchEvent = async (id: number) => {
+    await admin.makeEventCurrent(id);
+    fetchStats();
+  };
+
+  const closeEvent = async (hackathon: hackathonEvent) => {
+    if (!window.confirm(`Close ${hackathon.name} and archive its tickets?`)) return;
+    await admin.closeEvent(hackathon.id);
+    fetchStats();
+  };
+
+  const shownTickets =
+    searchIds === null
+      ? allTickets
+      : searchIds
+          .map((id) => allTickets.find((ticket) => ticket.id === id))
+          .filter((ticket): ticket is adminTicket => ticket !== undefined);
+
   return (
     <Container size="md" py="6rem">
       <LoadingOverlay visible={loading} />
@@ -122,6 +194,14 @@ export default function AdminPanel() {
                 Ticket Stats
               </Title>
               <Text>Total Resolved Tickets: {ticketStats.total}</Text>
+              {mentorsOnline && (
+                <Text>
+                  Mentors Online: {mentorsOnline.total}
+                  {Object.entries(mentorsOnline.byLocation)
+                    .map(([location, count]) => ` (${location}: ${count})`)
+                    .join("")}
+                </Text>
+              )}
               <Text>Average Time to Claim Ticket: {ticketStats.averageTime}</Text>
                 Average Mentor Rating:{" "}
                 {ticketStats.averageRating == 0 ?
@@ -149,6 +229,50 @@ export default function AdminPanel() {
             </Paper>
           </Group>
         )}
+        <Paper style={{ padding: "1rem 0", backgroundColor: "#20232a", borderBottom: "1px solid #333" }}>
+          <Title order={2} style={{ marginBottom: "0.5rem" }}>
+            Events
+          </Title>
+          <Text size="sm" style={{ marginBottom: "0.5rem" }}>
+            The queue, leaderboard and user stats show only the current event.
+          </Text>
+          <Table>
+            <Table.Tbody>
+              {hackathonEvents.map((hackathon) => (
+                <Table.Tr key={hackathon.id}>
+                  <Table.Td>{hackathon.name}</Table.Td>
+                  <Table.Td>
+                    {hackathon.current
+                      ? "Current"
+                      : hackathon.closedAt
+                      ? "Closed"
+                      : "Open"}
+                  </Table.Td>
+                  <Table.Td>
+                    {!hackathon.current && !hackathon.closedAt && (
+                      <Button size="xs" variant="light" onClick={() => switchEvent(hackathon.id)}>
+                        Make current
+                      </Button>
+                    )}{" "}
+                    {!hackathon.current && !hackathon.closedAt && (
+                      <Button size="xs" color="red" variant="light" onClick={() => closeEvent(hackathon)}>
+                        Close
+                      </Button>
+                    )}
+                  </Table.Td>
+                </Table.Tr>
+              ))}
+            </Table.Tbody>
+          </Table>
+          <Group style={{ marginTop: "0.5rem" }}>
+            <TextInput
+              placeholder="New event name"
+              value={newEventName}
+              onChange={(e) => setNewEventName(e.currentTarget.value)}
+            />
+            <Button onClick={startEvent}>Start event</Button>
+          </Group>
+        </Paper>
         {users?.length > 0 && (
           <Group
             style={{
@@ -184,7 +308,10 @@ export default function AdminPanel() {
                     <Table.Tr>
                       <Table.Td>{user.name}</Table.Td>
                       <Table.Td>{user.email}</Table.Td>
-                      <Table.Td>{user.role}</Table.Td>
+                      <Table.Td>
+                        {user.role}
+                        {user.online && " (online)"}
+                      </Table.Td>
                       <Table.Td>{user.location}</Table.Td>
                       <Table.Td>{user.discord}</Table.Td>
                       <Table.Td>
@@ -243,6 +370,17 @@ export default function AdminPanel() {
             <Title order={2} style={{ marginBottom: "0.5rem" }}>
               All Tickets
             </Title>
+            <Switch
+              label="Include past events"
+              checked={includeArchived}
+              onChange={(e) => setIncludeArchived(e.currentTarget.checked)}
+            />
+            <TextInput
+              placeholder="Search questions, tags and details"
+              value={searchQuery}
+              onChange={(e) => setSearchQuery(e.currentTarget.value)}
+              style={{ width: "100%" }}
+            />
             <Table
               striped
               borderColor="grey"
@@ -264,7 +402,7 @@ export default function AdminPanel() {
                 </Table.Tr>
               </Table.Thead>
               <Table.Tbody>
-                {allTickets.map((ticket) => (
+                {shownTickets.map((ticket) => (
                   <Table.Tr key={ticket.id}>
                     <Table.Td>{ticket.id}</Table.Td>
                     <Table.Td style={{ maxWidth: "200px", overflow: "hidden", textOverflow: "ellipsis" }}>
@@ -33,7 +33,7 @@ export default function NetworkVisualization() {
 
     const fetchData = async () => {
       try {
-        const response = await fetch("/api/queue");
+        const response = await fetch("/api/queue/network");
         const data = await response.json();
 
         const mentorNodes = new Map<string, Node>();
@@ -67,7 +67,7 @@ export default function NetworkVisualization() {
             links.push({
               source: mentorId,
               target: `ticket-${ticket.id}`,
-              status: ticket.status === "resolved" ? "resolved" : "active",
+              status: ticket.status === "awaiting_feedback" ? "resolved" : "active",
             });
           }
         });
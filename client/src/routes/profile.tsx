@@ -8,12 +8,14 @@ import {
   Button,
   Text,
   Checkbox,
+  TagsInput,
 } from "@mantine/core";
 import { notifications } from "@mantine/notifications";
 import * as auth from "../api/auth";
+import * as ticket from "../api/ticket";
 
 export default function ProfilePage() {
-  const [name, email, role, location, zoomlink, getUser, discord, phone, preferred] =
+  const [name, email, role, location, zoomlink, getUser, discord, phone, preferred, skills] =
     useUserStore((store) => [
       store.name,
       store.email,
@@ -24,7 +26,9 @@ export default function ProfilePage() {
       store.discord,
       store.phone,
       store.preferred,
+      store.skills,
     ]);
+  const [tagsList, setTagsList] = useState<Array<string>>([]);
 
   const [user, updateUser] = useState<auth.UserInfo>({
     name: name,
@@ -36,6 +40,7 @@ export default function ProfilePage() {
     discord: discord,
     phone: phone,
     preferred: preferred,
+    skills: skills,
   });
 
   useEffect(() => {
@@ -48,9 +53,14 @@ export default function ProfilePage() {
       password: "",
       discord: discord,
       phone: phone,
-      preferred: preferred
+      preferred: preferred,
+      skills: skills,
     });
-  }, [name, email, role, location, zoomlink, discord, phone, preferred]);
+  }, [name, email, role, location, zoomlink, discord, phone, preferred, skills]);
+
+  useEffect(() => {
+    ticket.getTags().then((res) => setTagsList(res.tags));
+  }, []);
 
   const formatPhoneNumber = (value: string) => {
     // Remove all non-digits
@@ -216,6 +226,14 @@ export default function ProfilePage() {
                 label={"Virtual"}
               />
             </Group>
+            <TagsInput
+              mt="md"
+              label="What can you help with?"
+              description="Hackers see how many mentors are online for each tag"
+              data={tagsList}
+              value={user.skills}
+              onChange={(value) => updateUser({ ...user, skills: value })}
+            />
           </>
         )}
 
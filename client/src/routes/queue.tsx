@@ -14,7 +14,7 @@ import CodeBlockLowlight from "@tiptap/extension-code-block-lowlight";
 import { useEditor } from "@tiptap/react";
 import StarterKit from "@tiptap/starter-kit";
 import { all, createLowlight } from "lowlight";
-import { useCallback, useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import * as queue from "../api/queue";
 import classes from "./root.module.css";
@@ -33,10 +33,17 @@ interface ticket {
   phone: string;
   createdAt: Date;
   images: Array<string>;
+  thumbnails: Array<string | null>;
   email: string;
   preferred: string;
+  status: string;
+  mentor_id: string | null;
+  cluster_id: number | null;
 }
 
+// Near-duplicate tickets share the id of the first ticket in their group
+const clusterOf = (ticket: ticket) => ticket.cluster_id ?? ticket.id;
+
 interface displayContentProps {
   content: string;
 }
@@ -123,11 +130,28 @@ export default function QueuePage() {
       });
   }, [setTickets, setLoading, navigate, previousTicketCount, soundPlayed]);
 
+  const [live, setLive] = useState<boolean>(false);
+
   useEffect(() => {
     getTickets();
-    const interval = setInterval(getTickets, 5000);
+    // With the event stream connected, polling is only a safety net
+    const interval = setInterval(getTickets, live ? 30000 : 5000);
     return () => clearInterval(interval);
-  }, [getTickets]);
+  }, [getTickets, live]);
+
+  // getTickets changes identity as counts change; keep one stream open regardless
+  const refresh = useRef(getTickets);
+  refresh.current = getTickets;
+
+  useEffect(() => {
+    const source = queue.subscribe(() => {
+      refresh.current();
+      checkClaimed();
+    });
+    source.onopen = () => setLive(true);
+    source.onerror = () => setLive(false);
+    return () => source.close();
+  }, []);
 
   useEffect(() => {
     checkClaimed();
@@ -162,8 +186,8 @@ export default function QueuePage() {
     }
   };
 
-  const handleClaim = async (id: number) => {
-    const res = await queue.claimTicket(id);
+  const handleClaim = async (id: number, cluster: boolean = false) => {
+    const res = await queue.claimTicket(id, cluster);
     showNotif(res);
     checkClaimed();
     getTickets();
@@ -176,13 +200,37 @@ export default function QueuePage() {
     getTickets();
   };
 
-  const handleResolve = async (id: number, creator: string) => {
-    const res = await queue.resolveTicket(id, creator);
+  const handleResolve = async (
+    id: number,
+    creator: string,
+    cluster: boolean = false
+  ) => {
+    const res = await queue.resolveTicket(id, creator, cluster);
     showNotif(res);
     checkClaimed();
     getTickets();
   };
 
+  // Open tickets grouped with an earlier open ticket are shown under it
+  const activeTickets = tickets.filter((ticket) => ticket.active);
+  const duplicatesOf = (ticket: ticket) =>
+    activeTickets.filter(
+      (other) => other.id !== ticket.id && clusterOf(other) === clusterOf(ticket)
+    );
+  const isGroupLead = (ticket: ticket) =>
+    activeTickets.find((other) => clusterOf(other) === clusterOf(ticket))
+      ?.id === ticket.id;
+
+  // Duplicates claimed along with the mentor's current ticket
+  const claimedWith = (ticket: ticket) =>
+    tickets.filter(
+      (other) =>
+        other.id !== ticket.id &&
+        other.status === "claimed" &&
+        other.mentor_id === ticket.mentor_id &&
+        clusterOf(other) === clusterOf(ticket)
+    );
+
   return (
     <Container size="md" py="6rem">
       <LoadingOverlay visible={loading} />
@@ -205,12 +253,25 @@ export default function QueuePage() {
           <Container className="mt-5" size="sm">
             {tickets.map(
               (ticket) =>
-                ticket.active && (
+                ticket.active &&
+                isGroupLead(ticket) && (
                   <div key={ticket.id}>
                     <Card className="my-3">
                       <Group>
                         <Title order={2}>{ticket.question}</Title>
+                        {duplicatesOf(ticket).length > 0 && (
+                          <Badge color="orange" variant="light" size="lg">
+                            +{duplicatesOf(ticket).length} similar
+                          </Badge>
+                        )}
                       </Group>
+                      {duplicatesOf(ticket).map((duplicate) => (
+                        <div className="text-sm" key={duplicate.id}>
+                          Also asking: {duplicate.question} &mdash;{" "}
+                          {duplicate.creator || "No Name Provided"} at{" "}
+                          {duplicate.location}
+                        </div>
+                      ))}
 
                       <DisplayContent content={ticket.content} />
                       <Group>
@@ -224,12 +285,14 @@ export default function QueuePage() {
                         {
                           <div className={classes.previewContainer}>
                             {ticket.images.map((image, index) => (
-                              <img
-                                key={index}
-                                src={image}
-                                alt={`Ticket Image ${index + 1}`}
-                                style={{ maxWidth: "100%", margin: "10px 0" }}
-                              />
+                              <a key={index} href={image} target="_blank" rel="noreferrer">
+                                <img
+                                  src={ticket.thumbnails?.[index] ?? image}
+                                  alt={`Ticket Image ${index + 1}`}
+                                  loading="lazy"
+                                  style={{ maxWidth: "100%", margin: "10px 0" }}
+                                />
+                              </a>
                             ))}
                           </div>
                         }
@@ -288,12 +351,19 @@ export default function QueuePage() {
                           })()}
                         </Badge>
                       </div>
-                      <Button
-                        onClick={() => handleClaim(ticket.id)}
-                        className="mt-5"
-                      >
-                        Claim
-                      </Button>
+                      <Group className="mt-5" grow>
+                        <Button onClick={() => handleClaim(ticket.id)}>
+                          Claim
+                        </Button>
+                        {duplicatesOf(ticket).length > 0 && (
+                          <Button
+                            color="orange"
+                            onClick={() => handleClaim(ticket.id, true)}
+                          >
+                            Claim all {duplicatesOf(ticket).length + 1}
+                          </Button>
+                        )}
+                      </Group>
                     </Card>
                   </div>
                 )
@@ -324,12 +394,14 @@ export default function QueuePage() {
                         {
                           <div className={classes.previewContainer}>
                             {ticket.images.map((image, index) => (
-                              <img
-                                key={index}
-                                src={image}
-                                alt={`Ticket Image ${index + 1}`}
-                                style={{ maxWidth: "100%", margin: "10px 0" }}
-                              />
+                              <a key={index} href={image} target="_blank" rel="noreferrer">
+                                <img
+                                  src={ticket.thumbnails?.[index] ?? image}
+                                  alt={`Ticket Image ${index + 1}`}
+                                  loading="lazy"
+                                  style={{ maxWidth: "100%", margin: "10px 0" }}
+                                />
+                              </a>
                             ))}
                           </div>
                         }
@@ -377,13 +449,28 @@ export default function QueuePage() {
                           </Badge>
                         </div>
                       )}
+                      {claimedWith(ticket).map((duplicate) => (
+                        <div className="mt-5" key={duplicate.id}>
+                          Also claimed: {duplicate.question} &mdash;{" "}
+                          <Badge>
+                            {duplicate.creator || "No Name Provided"}
+                          </Badge>{" "}
+                          at <Badge>{duplicate.location}</Badge>
+                        </div>
+                      ))}
                       <Group className="mt-5" grow>
                         <Button
                           onClick={() =>
-                            handleResolve(ticket.id, ticket.creator)
+                            handleResolve(
+                              ticket.id,
+                              ticket.creator,
+                              claimedWith(ticket).length > 0
+                            )
                           }
                         >
-                          Mark as Resolved
+                          {claimedWith(ticket).length > 0
+                            ? `Mark all ${claimedWith(ticket).length + 1} as Resolved`
+                            : "Mark as Resolved"}
                         </Button>
                         <Button
                           color="red"
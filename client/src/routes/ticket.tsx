@@ -27,7 +27,9 @@ import { useEditor } from "@tiptap/react";
 import StarterKit from "@tiptap/starter-kit";
 import { all, createLowlight } from "lowlight";
 import { useCallback, useEffect, useState } from "react";
+import * as queue from "../api/queue";
 import * as ticket from "../api/ticket";
+import type { QueueEta } from "../api/ticket";
 import classes from "./root.module.css";
 
 interface mentor {
@@ -38,6 +40,14 @@ interface mentor {
   id: number;
 }
 
+interface similarTicket {
+  id: number;
+  question: string;
+  location: string;
+  tags: Array<string>;
+  status: string;
+}
+
 interface ticket {
   id: number;
   creator: string;
@@ -48,6 +58,12 @@ interface ticket {
   images: Array<string>;
 }
 
+function formatWait(seconds: number) {
+  const minutes = Math.max(1, Math.round(seconds / 60));
+  if (minutes < 90) return `${minutes} minute${minutes === 1 ? "" : "s"}`;
+  return `${Math.round(minutes / 60)} hours`;
+}
+
 export default function TicketPage() {
   const [question, setQuestion] = useState<string>("");
   const [content, setContent] = useState<string>("");
@@ -56,6 +72,8 @@ export default function TicketPage() {
 
   const [tags, setTags] = useState<Array<string>>([]);
   const [tagsList, setTagsList] = useState<Array<string>>([]);
+  const [mentorsOnline, setMentorsOnline] = useState<queue.MentorsOnline>();
+  const [queueEta, setQueueEta] = useState<QueueEta | null>(null);
   const [active, setActive] = useState<boolean | undefined>(undefined);
   const [claimed, setClaimed] = useState<boolean>(false);
   const [mentorData, setMentorData] = useState<mentor>();
@@ -70,6 +88,9 @@ export default function TicketPage() {
   );
 
   const [resolvedTickets, setResolvedTickets] = useState<Array<ticket>>([]);
+  const [similarTickets, setSimilarTickets] = useState<Array<similarTicket>>(
+    []
+  );
 
   const editor = useEditor(
     {
@@ -117,6 +138,7 @@ export default function TicketPage() {
       setSoundPlayed(false);
       setClaimed(false);
       setMentorData(undefined);
+      setQueueEta(res.eta ?? null);
     } else if (res.ok && res.status === "awaiting_feedback") {
       setSoundPlayed(false);
       setClaimed(false);
@@ -161,6 +183,14 @@ export default function TicketPage() {
     getTicket();
   }, [getTicket]);
 
+  useEffect(() => {
+    const getMentorsOnline = () =>
+      queue.getMentorsOnline().then((res) => res.ok && setMentorsOnline(res.mentors));
+    getMentorsOnline();
+    const interval = setInterval(getMentorsOnline, 30000);
+    return () => clearInterval(interval);
+  }, []);
+
   useEffect(() => {
     getStatus();
     const interval = setInterval(getStatus, 5000);
@@ -179,6 +209,20 @@ export default function TicketPage() {
     }
   }, [content, editor]);
 
+  // Look for open tickets like this one while it is being written
+  useEffect(() => {
+    if (active || question.trim().length < 3) {
+      setSimilarTickets([]);
+      return;
+    }
+    const timeout = setTimeout(() => {
+      ticket.similar([question, ...tags].join(" ")).then((res) => {
+        setSimilarTickets(res.ok ? res.tickets : []);
+      });
+    }, 500);
+    return () => clearTimeout(timeout);
+  }, [active, question, tags]);
+
   const checkForResolvedTickets = async () => {
     const res = await ticket.getFeedback();
     if (res.ok && res.tickets.length > 0) {
@@ -290,6 +334,13 @@ export default function TicketPage() {
       getTicket();
     }
     showNotif(res);
+    if (res.ok && res.duplicates?.length > 0) {
+      notifications.show({
+        title: "Similar tickets in queue",
+        color: "yellow",
+        message: `Your ticket looks like ${res.duplicates.length} already waiting (e.g. "${res.duplicates[0].question}" at ${res.duplicates[0].location}). A mentor may help you all together.`,
+      });
+    }
   };
 
   const handleEdit = async (del: boolean = false) => {
@@ -307,21 +358,19 @@ export default function TicketPage() {
   };
 
   const handleDrop = async (newFiles: Array<FileWithPath>) => {
-    const newImages: Array<string> = (await Promise.all(
-      newFiles.map((file) => fileToBase64(file))
-    )) as Array<string>;
+    const uploads = await Promise.all(
+      newFiles.map((file) => ticket.uploadImage(file))
+    );
+    const failed = uploads.find((res) => !res.ok);
+    if (failed) {
+      showNotif(failed);
+    }
+    const newImages: Array<string> = uploads
+      .filter((res) => res.ok)
+      .map((res) => res.url);
     setImages((prevImages: Array<string>) => [...prevImages, ...newImages]);
   };
 
-  const fileToBase64 = (file: File) => {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.readAsDataURL(file);
-      reader.onload = () => resolve(reader.result);
-      reader.onerror = (error) => reject(error);
-    });
-  };
-
   const removeImage = (imageToRemove: string) => {
     if (!active) {
       setImages(images.filter((image: string) => image !== imageToRemove));
@@ -375,6 +424,14 @@ export default function TicketPage() {
               </HoverCard.Dropdown>
             </HoverCard>
           </Title>
+          {active && queueEta && (
+            <Text className="text-center" mt="sm">
+              You are #{queueEta.position} of {queueEta.queued} in the queue.
+              {queueEta.etaSeconds !== null
+                ? ` A mentor should pick up your ticket in about ${formatWait(queueEta.etaSeconds)}.`
+                : " No mentors are online right now."}
+            </Text>
+          )}
 
           <TextInput
             disabled={active}
@@ -385,6 +442,24 @@ export default function TicketPage() {
             label="Describe your problem in one sentence"
             placeholder="What is python?"
           />
+          {similarTickets.length > 0 && (
+            <Card mt="sm" withBorder>
+              <Text size="sm" fw={500}>
+                Others are asking something similar. If one of these is your
+                problem, you may want to head over and join them:
+              </Text>
+              {similarTickets.map((similar) => (
+                <Text size="sm" mt="xs" key={similar.id}>
+                  {similar.question} &mdash; {similar.location}
+                  {similar.tags.map((tag) => (
+                    <Badge size="xs" variant="light" ml="xs" key={tag}>
+                      {tag}
+                    </Badge>
+                  ))}
+                </Text>
+              ))}
+            </Card>
+          )}
           <Text className="cursor-default select-none" size="md" mt="lg">
             Include any additional details or code snippets
           </Text>
@@ -431,6 +506,15 @@ export default function TicketPage() {
             value={tags}
             onChange={setTags}
           />
+          {mentorsOnline && (
+            <Text size="sm" c="dimmed" mt="xs">
+              {mentorsOnline.total} mentor{mentorsOnline.total === 1 ? "" : "s"} online
+              {tags
+                .filter((tag) => mentorsOnline.byTag[tag])
+                .map((tag) => `, ${mentorsOnline.byTag[tag]} for ${tag}`)
+                .join("")}
+            </Text>
+          )}
           <TextInput
             disabled={active}
             onChange={(e) => setLocation(e.currentTarget.value)}
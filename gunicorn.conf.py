@@ -0,0 +1,61 @@
+# Gunicorn configuration for QStack
+# Loaded by start.prod.sh via `gunicorn -c gunicorn.conf.py wsgi:app`
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '3001')}"
+
+# Number of worker processes
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+
+# "gevent" runs each request in a greenlet so a slow call to the auth server,
+# Firebase or the HackPSU API only parks that request instead of the whole
+# worker. Set GUNICORN_WORKER_CLASS=sync to fall back to the old behaviour.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+
+# Max concurrent requests (greenlets) per gevent worker
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "200"))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+# Build the app once in the master and fork workers from it, so a new or
+# restarted worker has nothing left to import. The app opens no database
+# connections at import time; post_fork drops any pooled ones anyway.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+if preload_app and worker_class == "gevent":
+    # The app is imported before any worker starts, so patch before that
+    from gevent import monkey
+
+    monkey.patch_all()
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative so a query in flight yields to other greenlets"""
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
+        server.log.info(f"Worker {worker.pid}: psycopg2 patched for gevent")
+
+    if preload_app:
+        from server import db, log
+
+        # Connections must not be shared across processes; the logging thread
+        # did not survive the fork
+        with worker.app.wsgi().app_context():
+            db.engine.dispose(close=False)
+        log.restart_after_fork()
+
+
+def child_exit(server, worker):
+    """Tell the Prometheus multiprocess collector that a worker has gone away"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,62 +1,73 @@
-import json
-from os import environ as env
+import os
 
-from authlib.integrations.flask_client import OAuth
-from apiflask import APIFlask
-from flask import redirect, render_template, session, url_for
 from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
+
+# Loads .env, so it must come before anything that reads the environment
 from server.config import APP_SECRET_KEY, FRONTEND_URL
-import os
 
 STATIC_FOLDER = "../client/dist"
 
-app = APIFlask(
-    __name__,
-    docs_path=None,
-    static_folder=STATIC_FOLDER,
-    template_folder=STATIC_FOLDER,
-    static_url_path="/",
-)
-
 db = SQLAlchemy()
 
-app.secret_key = APP_SECRET_KEY
-app.config.from_pyfile("config.py")
 
-# Configure CORS for HackPSU auth integration
-allowed_origins = [
-    'https://auth.hackpsu.org',
-    'https://hackpsu.org',
-    'http://localhost:3000',  # Local HackPSU auth server
-    FRONTEND_URL,
-    os.environ.get('AUTH_SERVER_URL', '').replace('/api/sessionUser', '') if os.environ.get('AUTH_SERVER_URL') else None
-]
-allowed_origins = [origin for origin in allowed_origins if origin]  # Filter out None values
+def create_app():
+    """Build the QStack app
 
-CORS(app,
-     origins=allowed_origins,
-     supports_credentials=True)
+    Importing the server package is cheap; this does the actual setup. Nothing
+    here opens a database connection (the schema is managed by
+    server/migrate.py), and rarely used integrations such as Discord OAuth are
+    set up on first use, so a worker is ready as soon as this returns.
+    """
+    from apiflask import APIFlask
+    from flask import render_template
+    from flask_cors import CORS
 
+    from server import events, hackathons, log, metrics, perf, presence, scheduler, sessions
 
-with app.app_context():
-    from server.controllers import api
+    app = APIFlask(
+        __name__,
+        docs_path=None,
+        static_folder=STATIC_FOLDER,
+        template_folder=STATIC_FOLDER,
+        static_url_path="/",
+    )
 
-    app.register_blueprint(api)
+    app.secret_key = APP_SECRET_KEY
+    app.config.from_pyfile("config.py")
+
+    # Configure CORS for HackPSU auth integration
+    allowed_origins = [
+        'https://auth.hackpsu.org',
+        'https://hackpsu.org',
+        'http://localhost:3000',  # Local HackPSU auth server
+        FRONTEND_URL,
+        os.environ.get('AUTH_SERVER_URL', '').replace('/api/sessionUser', '') if os.environ.get('AUTH_SERVER_URL') else None
+    ]
+    allowed_origins = [origin for origin in allowed_origins if origin]  # Filter out None values
 
-    from server import models
+    CORS(app,
+         origins=allowed_origins,
+         supports_credentials=True)
+
+    log.configure_logging()
+    app.before_request(log.check_control_file)
+
+    perf.init_app(app)
+    metrics.init_app(app)
 
     db.init_app(app)
+    events.init_app(app)
+    sessions.init_app(app)
+    hackathons.init_app(app)
+    presence.init_app(app)
+    scheduler.init_app(app)
+
+    from server.controllers import api
 
-    # Create tables if they don't exist
-    # Wrapped in try/except to handle race conditions with multiple workers
-    with app.app_context():
-        try:
-            db.create_all()
-        except Exception as e:
-            # Tables may already exist from another worker, continue
-            app.logger.warning(f"Database tables may already exist: {e}")
+    app.register_blueprint(api)
 
     @app.errorhandler(404)
     def _default(_error):
         return render_template("index.html"), 200
+
+    return app
@@ -0,0 +1,144 @@
+# Ticket archival
+#
+# Finished tickets are moved out of the hot tickets table into
+# tickets_archive, so the queue, claim and status queries only ever see the
+# tickets of the current event no matter how many events came before. A
+# ticket is archived once it was created more than ARCHIVE_AFTER_HOURS ago
+# and is either completed, or inactive and no longer anybody's draft
+# (users.ticket_id). Tickets that are claimed or awaiting feedback stay put.
+#
+# Rows move in batches, each a single DELETE ... RETURNING feeding an INSERT,
+# so a ticket is always in exactly one of the two tables. Admin analytics can
+# opt into reading both through tickets_union().
+#
+#   python -m server.archive                     # archive once
+#   python -m server.archive --interval 3600     # keep archiving hourly
+#
+# start.prod.sh runs the second form next to the web workers.
+
+import argparse
+import os
+import time
+
+from sqlalchemy import literal, select, text, union_all
+
+from server import db
+from server.log import get_logger
+
+ARCHIVE_AFTER_HOURS = float(os.environ.get("ARCHIVE_AFTER_HOURS", "12"))
+ARCHIVE_BATCH = int(os.environ.get("ARCHIVE_BATCH", "500"))
+
+# Columns shared by tickets and tickets_archive
+COLUMNS = (
+    "id", "creator_id", "claimant_id", "claimant_name", "question", "content", "location", "tags",
+    "images", "creator_email", "creator_name", "active", "status", '"createdAt"', '"claimedAt"',
+    "cluster_id", "event_id", '"resolvedAt"',
+)
+
+log = get_logger("archive")
+
+
+def archive_batch(cutoff, batch=ARCHIVE_BATCH):
+    """Move one batch of finished tickets created before cutoff; returns how many moved"""
+    columns = ", ".join(COLUMNS)
+    moved = db.session.execute(
+        text(f"""
+            WITH moved AS (
+                DELETE FROM tickets WHERE id IN (
+                    SELECT t.id FROM tickets t
+                    WHERE t."createdAt" < :cutoff
+                      AND (
+                          t.status = 'completed'
+                          OR (
+                              NOT t.active
+                              AND t.status IS DISTINCT FROM 'claimed'
+                              AND t.status IS DISTINCT FROM 'awaiting_feedback'
+                              AND NOT EXISTS (SELECT 1 FROM users u WHERE u.ticket_id = t.id)
+                          )
+                      )
+                    ORDER BY t.id
+                    LIMIT :batch
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {columns}
+            ),
+            -- No foreign key does this for us: tickets is partitioned
+            cleared AS (
+                UPDATE users SET ticket_id = NULL WHERE ticket_id IN (SELECT id FROM moved)
+            )
+            INSERT INTO tickets_archive ({columns}) SELECT {columns} FROM moved
+        """),
+        {"cutoff": cutoff, "batch": batch},
+    ).rowcount
+    db.session.commit()
+    return moved
+
+
+def archive(older_than_hours=ARCHIVE_AFTER_HOURS, batch=ARCHIVE_BATCH):
+    """Archive every eligible ticket, one batch per transaction"""
+    # createdAt is written by the database's now(), so take the cutoff from its clock too
+    cutoff = db.session.execute(
+        text("SELECT LOCALTIMESTAMP - make_interval(secs => :seconds)"), {"seconds": older_than_hours * 3600}
+    ).scalar()
+    started = time.perf_counter()
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch)
+        total += moved
+        if moved < batch:
+            break
+    log.info("archive run", extra={
+        "archived": total,
+        "cutoff": cutoff.isoformat(),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return total
+
+
+def tickets_union(*columns):
+    """SELECT of the given Ticket columns over live and archived tickets
+
+    Adds an "archived" boolean column. Column names must exist in both tables.
+    Queries over it need execution_options(all_events=True), or the live half
+    is limited to the current event.
+    """
+    from server.models import ArchivedTicket, Ticket
+
+    live = select(*(getattr(Ticket, name) for name in columns), literal(False).label("archived"))
+    cold = select(*(getattr(ArchivedTicket, name) for name in columns), literal(True).label("archived"))
+    return union_all(live, cold).subquery()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move finished tickets to tickets_archive")
+    parser.add_argument("--older-than", type=float, default=ARCHIVE_AFTER_HOURS,
+                        help="only archive tickets created more than this many hours ago")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH, help="tickets moved per transaction")
+    parser.add_argument("--interval", type=int, default=0, help="repeat every N seconds (default: run once)")
+    args = parser.parse_args()
+
+    from server import create_app
+
+    app = create_app()
+    while True:
+        started = time.monotonic()
+        with app.app_context():
+            try:
+                total = archive(args.older_than, args.batch)
+            except Exception:
+                db.session.rollback()
+                log.exception("Archive run failed")
+                if not args.interval:
+                    raise
+            else:
+                if not args.interval:
+                    print(f"Archived {total} ticket(s)")
+            finally:
+                db.session.remove()
+        if not args.interval:
+            return
+        time.sleep(max(args.interval - (time.monotonic() - started), 0))
+
+
+if __name__ == "__main__":
+    main()
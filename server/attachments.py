@@ -0,0 +1,222 @@
+# Ticket image attachments
+#
+# Uploaded images are stored on local disk under ATTACHMENTS_DIR, named by
+# the SHA-256 of their contents, next to a small JPEG thumbnail generated at
+# upload time. Tickets keep only the reference ("<sha256>.<ext>") in
+# Ticket.images. Files never change once written, so they can be cached
+# forever.
+#
+# Tickets saved before attachments were stored may still hold inline data
+# URIs; move them into the store with
+#
+#   python -m server.attachments --backfill
+
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+
+from server.log import get_logger
+
+ATTACHMENTS_DIR = os.path.abspath(os.environ.get("ATTACHMENTS_DIR", "attachments"))
+MAX_ATTACHMENT_BYTES = int(os.environ.get("MAX_ATTACHMENT_BYTES", str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = 40_000_000
+MAX_IMAGES_PER_TICKET = 10
+THUMBNAIL_SIZE = (320, 320)
+
+# Pillow format -> (extension, mimetype)
+FORMATS = {
+    "PNG": ("png", "image/png"),
+    "JPEG": ("jpg", "image/jpeg"),
+    "GIF": ("gif", "image/gif"),
+    "WEBP": ("webp", "image/webp"),
+}
+MIMETYPES = {ext: mimetype for ext, mimetype in FORMATS.values()}
+
+REF_PATTERN = re.compile(r"([0-9a-f]{64})\.(png|jpg|gif|webp)")
+DATA_URI_PATTERN = re.compile(r"data:image/[\w.+-]+;base64,(.*)", re.S)
+
+log = get_logger("attachments")
+
+
+class InvalidAttachment(ValueError):
+    pass
+
+
+def _path(digest, name):
+    return os.path.join(ATTACHMENTS_DIR, digest[:2], digest[2:4], name)
+
+
+def original_path(ref):
+    match = REF_PATTERN.fullmatch(ref)
+    return _path(match.group(1), ref) if match else None
+
+
+def thumbnail_path(ref):
+    match = REF_PATTERN.fullmatch(ref)
+    return _path(match.group(1), f"{match.group(1)}.thumb.jpg") if match else None
+
+
+def mimetype(ref):
+    return MIMETYPES[ref.rsplit(".", 1)[1]]
+
+
+def url(ref):
+    return f"/api/attachments/{ref}"
+
+
+def thumbnail_url(ref):
+    return f"/api/attachments/{ref}/thumb"
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def store(data):
+    """Validate and store an image, returning its reference
+
+    Raises InvalidAttachment for anything that isn't a supported image.
+    """
+    from PIL import Image
+
+    if len(data) > MAX_ATTACHMENT_BYTES:
+        raise InvalidAttachment(f"Images must be under {MAX_ATTACHMENT_BYTES // (1024 * 1024)} MB")
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.verify()
+        # verify() leaves the image unusable; reopen it for the thumbnail
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidAttachment("Unsupported or corrupt image") from e
+
+    if image.format not in FORMATS:
+        raise InvalidAttachment("Images must be PNG, JPEG, GIF or WebP")
+
+    digest = hashlib.sha256(data).hexdigest()
+    ref = f"{digest}.{FORMATS[image.format][0]}"
+
+    # Same content, same name: nothing to do if it is already stored
+    if not os.path.exists(original_path(ref)):
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, "JPEG", quality=80, optimize=True)
+        _write_atomic(thumbnail_path(ref), buffer.getvalue())
+        _write_atomic(original_path(ref), data)
+        log.info("Stored attachment %s (%s bytes)", ref, len(data))
+    return ref
+
+
+def store_data_uri(image):
+    """Store an inline data URI image, returning its reference; raises InvalidAttachment"""
+    data_uri = DATA_URI_PATTERN.match(image)
+    if not data_uri:
+        raise InvalidAttachment("Not a data URI")
+    try:
+        return store(base64.b64decode(data_uri.group(1), validate=True))
+    except binascii.Error as e:
+        raise InvalidAttachment("Inline image is not valid base64") from e
+
+
+def normalize_refs(images):
+    """Turn what a client sends as Ticket.images into stored references
+
+    Accepts references, attachment URLs and (from older clients) data URIs,
+    which are stored on the way in. Raises InvalidAttachment for anything
+    else, e.g. links to other sites or references to files that don't exist.
+    """
+    refs = []
+    for image in images or []:
+        if not isinstance(image, str):
+            raise InvalidAttachment("Images must be attachment references")
+        match = REF_PATTERN.search(image)
+        if match and os.path.exists(original_path(match.group(0))):
+            refs.append(match.group(0))
+        elif DATA_URI_PATTERN.match(image):
+            refs.append(store_data_uri(image))
+        else:
+            log.warning("Rejecting image that is not a stored attachment: %.100s", image)
+            raise InvalidAttachment("Images must be uploaded to /api/attachments first")
+    return list(dict.fromkeys(refs))[:MAX_IMAGES_PER_TICKET]
+
+
+def backfill(batch=100):
+    """Move inline data URI images on existing tickets into the store; returns how many tickets changed
+
+    Covers live and archived tickets of every event. Images that can't be
+    stored are logged and removed from the ticket.
+    """
+    from sqlalchemy import text
+
+    from server import db
+
+    changed = 0
+    for table in ("tickets", "tickets_archive"):
+        after = 0
+        while True:
+            rows = db.session.execute(
+                text(f"""
+                    SELECT id, images FROM {table}
+                    WHERE id > :after AND EXISTS (SELECT 1 FROM unnest(images) AS image WHERE image LIKE 'data:%')
+                    ORDER BY id
+                    LIMIT :batch
+                """),
+                {"after": after, "batch": batch},
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                images = []
+                for image in row.images:
+                    if not image.startswith("data:"):
+                        images.append(image)
+                        continue
+                    try:
+                        images.append(store_data_uri(image))
+                    except InvalidAttachment as e:
+                        log.warning("Dropping inline image of %s %s: %s", table, row.id, e)
+                db.session.execute(
+                    text(f"UPDATE {table} SET images = :images WHERE id = :id"),
+                    {"images": list(dict.fromkeys(images)), "id": row.id},
+                )
+            db.session.commit()
+            changed += len(rows)
+            after = rows[-1].id
+            log.info("Backfilled %s ticket(s) so far", changed)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ticket attachment maintenance")
+    parser.add_argument("--backfill", action="store_true",
+                        help="move inline data URI images of existing tickets into the attachment store")
+    parser.add_argument("--batch", type=int, default=100, help="tickets per transaction")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (pass --backfill)")
+
+    from server import create_app
+
+    app = create_app()
+    with app.app_context():
+        print(f"Moved inline images of {backfill(args.batch)} ticket(s) into {ATTACHMENTS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
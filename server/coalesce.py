@@ -0,0 +1,143 @@
+# Request coalescing for expensive shared views
+#
+# The leaderboard (/api/queue/ranking), the admin ticket stats
+# (/api/admin/ticketdata) and the network view (/api/queue/network) return the
+# same thing to everyone who asks, and their viewers poll on timers that tend
+# to line up. shared() makes the work scale with distinct results rather
+# than with viewers:
+#
+#   - Each worker keeps the latest result per key and serves it for
+#     SHARED_RESULT_TTL seconds.
+#   - After that one request per worker and key (single flight) fetches it
+#     again. Concurrent requests for the same key get the expired copy if it
+#     is less than SHARED_RESULT_MAX_STALE seconds old, or else wait for that
+#     one fetch.
+#   - Workers share results through the unlogged shared_results table. The
+#     first worker to find a result expired takes a lease on it and
+#     recomputes it; until it is stored the others serve the expired copy.
+#
+# Results are kept as the JSON that is sent, so a hit costs no serialization
+# either. Everything in a key's result must be the same for every viewer.
+
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import text
+
+from server import db, metrics
+
+SHARED_RESULT_TTL = float(os.environ.get("SHARED_RESULT_TTL", "5"))
+SHARED_RESULT_MAX_STALE = float(os.environ.get("SHARED_RESULT_MAX_STALE", "60"))
+# A worker that dies while recomputing holds up the others at most this long
+REFRESH_LEASE_SECONDS = 30
+
+_results = {}  # key -> (JSON body, computed at as unix time)
+_flights = {}  # key -> threading.Event, set when this worker's fetch finishes
+_lock = threading.Lock()
+
+
+def _remember(key, body, computed_at):
+    with _lock:
+        current = _results.get(key)
+        if current is None or current[1] <= computed_at:
+            _results[key] = (body, computed_at)
+
+
+def _fetch(view, key, compute, ttl):
+    """Read key from shared_results, recomputing it if it is expired and nobody else is"""
+    with db.engine.connect() as conn:
+        row = conn.execute(
+            text("""
+                SELECT body, extract(epoch FROM now() - computed_at) AS age, refreshing_until > now() AS refreshing
+                FROM shared_results WHERE key = :key
+            """),
+            {"key": key},
+        ).first()
+        usable = row is not None and row.body is not None and row.age < SHARED_RESULT_MAX_STALE
+        if usable and (row.age < ttl or row.refreshing):
+            _remember(key, row.body, time.time() - float(row.age))
+            metrics.COALESCED.labels(view, "shared" if row.age < ttl else "stale").inc()
+            return row.body
+
+        leased = conn.execute(
+            text("""
+                INSERT INTO shared_results (key, refreshing_until) VALUES (:key, now() + make_interval(secs => :lease))
+                ON CONFLICT (key) DO UPDATE SET refreshing_until = EXCLUDED.refreshing_until
+                WHERE shared_results.refreshing_until IS NULL OR shared_results.refreshing_until < now()
+                RETURNING key
+            """),
+            {"key": key, "lease": REFRESH_LEASE_SECONDS},
+        ).scalar()
+        conn.commit()
+    if leased is None and usable:
+        # Another worker took the lease between the two statements
+        metrics.COALESCED.labels(view, "stale").inc()
+        return row.body
+
+    try:
+        body = f"{current_app.json.dumps(compute())}\n"
+    except Exception:
+        if leased is not None:
+            with db.engine.begin() as conn:
+                conn.execute(text("UPDATE shared_results SET refreshing_until = NULL WHERE key = :key"), {"key": key})
+        raise
+    _remember(key, body, time.time())
+    metrics.COALESCED.labels(view, "computed").inc()
+    with db.engine.begin() as conn:
+        # Without the lease someone else is recomputing; leave their lease alone
+        conn.execute(
+            text("""
+                INSERT INTO shared_results (key, body, computed_at) VALUES (:key, :body, now())
+                ON CONFLICT (key) DO UPDATE SET
+                    body = EXCLUDED.body, computed_at = EXCLUDED.computed_at,
+                    refreshing_until = CASE WHEN :leased THEN NULL ELSE shared_results.refreshing_until END
+            """),
+            {"key": key, "body": body, "leased": leased is not None},
+        )
+    return body
+
+
+def _get(view, key, compute, ttl):
+    now = time.time()
+    with _lock:
+        entry = _results.get(key)
+        if entry is not None and now - entry[1] < ttl:
+            metrics.COALESCED.labels(view, "fresh").inc()
+            return entry[0]
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = threading.Event()
+
+    if not leader:
+        if entry is not None and now - entry[1] < SHARED_RESULT_MAX_STALE:
+            metrics.COALESCED.labels(view, "stale").inc()
+            return entry[0]
+        flight.wait(REFRESH_LEASE_SECONDS)
+        with _lock:
+            fetched = _results.get(key)
+        if fetched is not None and fetched is not entry:
+            metrics.COALESCED.labels(view, "joined").inc()
+            return fetched[0]
+        # The fetch failed or is taking too long; try again on our own
+        return _fetch(view, key, compute, ttl)
+
+    try:
+        return _fetch(view, key, compute, ttl)
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.set()
+
+
+def shared(view, compute, *params, ttl=None):
+    """JSON response with compute()'s result, shared by everyone asking for view with the same params
+
+    compute() runs at most about once per ttl seconds (SHARED_RESULT_TTL by
+    default) for all workers together.
+    """
+    key = ":".join(str(part) for part in (view, *params))
+    body = _get(view, key, compute, SHARED_RESULT_TTL if ttl is None else ttl)
+    return current_app.response_class(body, mimetype=current_app.json.mimetype)
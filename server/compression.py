@@ -0,0 +1,73 @@
+# Response compression for /api
+# Compresses JSON responses above COMPRESS_MIN_BYTES with brotli (when the
+# optional brotli package is installed and the client accepts it) or gzip.
+
+import gzip
+import os
+import time
+
+from flask import request
+
+from server.perf import current_stats
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "5"))
+# Brotli quality 4 compresses better than gzip at about the same speed
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE = ("application/json", "text/csv", "text/plain")
+
+
+def _choose_encoding():
+    accepted = {
+        part.split(";", 1)[0].strip().lower()
+        for part in request.headers.get("Accept-Encoding", "").split(",")
+        if not part.strip().endswith(";q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def after_request(response):
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    start = time.perf_counter()
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+    stats = current_stats()
+    if stats is not None:
+        stats.compress_time += time.perf_counter() - start
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    if response.headers.get("ETag"):
+        # A different representation needs a different validator
+        response.set_etag(f"{response.get_etag()[0]}-{encoding}", weak=True)
+    return response
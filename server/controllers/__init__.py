@@ -1,13 +1,21 @@
 from flask import Blueprint
 
+from server import compression, perf
 from server.controllers.auth import auth
 from server.controllers.ticket import ticket
 from server.controllers.queue import queue
 from server.controllers.admin import admin
+from server.controllers.attachments import attachments
 
 api = Blueprint("api", __name__, url_prefix="/api")
 
+api.before_request(perf.before_request)
+api.after_request(perf.after_request)
+# Registered after perf, so it runs first and its time is included in the total
+api.after_request(compression.after_request)
+
 api.register_blueprint(auth)
 api.register_blueprint(ticket)
 api.register_blueprint(queue)
 api.register_blueprint(admin)
+api.register_blueprint(attachments)
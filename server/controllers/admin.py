@@ -1,38 +1,67 @@
 # from concurrent.futures import thread
-from flask import current_app as app, url_for, redirect, session
-from server import db
-from authlib.integrations.flask_client import OAuth
+from flask import current_app as app, url_for, redirect, session, request
 from apiflask import APIBlueprint, abort
 from os import environ as env
 from urllib.parse import quote_plus, urlencode
 import csv
+import logging
 from server.controllers.auth import auth_required_decorator
-from server.models import User, Ticket
-from server.hackpsu_api import get_user_info
+from server.models import User, Ticket, ArchivedTicket, Event, Rating
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import joinedload
+from server import archive, coalesce, db, hackathons, log, presence
+from server.serialization import list_response
 
 admin = APIBlueprint("admin", __name__, url_prefix="/admin")
 
 
+def include_archived():
+    return request.args.get("archived", "").lower() in ("1", "true")
+
+
 @admin.route("/ticketdata")
 @auth_required_decorator(roles=["admin"])
 def getTicketData():
-    mentors = User.query.filter_by(role="mentor").all()
+    # ?archived=true covers every event, archived tickets included; otherwise just the current one
+    allEvents = include_archived()
+    eventId = hackathons.current_event_id()
+    # Every open dashboard polls this; compute it once for all of them
+    return coalesce.shared(
+        "ticketdata", lambda: _ticketData(allEvents, eventId), "all" if allEvents else eventId, ttl=10
+    )
+
+
+def _ticketData(allEvents, eventId):
     totalTickets = 0
     sumAverageMentorRating = 0
     totalMentors = 0
     avgTime = 0
     totalTickets = 0
 
-    for mentor in mentors:
-        totalTickets += len(mentor.ratings)
-        if len(mentor.ratings) != 0:
-            sumAverageMentorRating += sum(mentor.ratings) / len(mentor.ratings)
-            totalMentors += 1
-    
-    for ticket in Ticket.query.all():
-        if ticket.claimedAt is not None:
-            avgTime += (ticket.claimedAt - ticket.createdAt).total_seconds()
-            totalTickets += 1
+    mentorRatings = select(Rating.mentor_id, func.count().label("num"), func.avg(Rating.rating).label("avg"))
+    if not allEvents:
+        mentorRatings = mentorRatings.where(Rating.event_id == eventId)
+    mentorRatings = mentorRatings.group_by(Rating.mentor_id).subquery()
+    for num, average in db.session.execute(select(mentorRatings.c.num, mentorRatings.c.avg)):
+        totalTickets += num
+        sumAverageMentorRating += float(average)
+        totalMentors += 1
+
+    if allEvents:
+        tickets = archive.tickets_union("createdAt", "claimedAt")
+        conditions = [tickets.c.claimedAt.is_not(None)]
+    else:
+        tickets = Ticket.__table__
+        conditions = [tickets.c.claimedAt.is_not(None), tickets.c.event_id == eventId]
+    query = select(
+        func.count(),
+        func.coalesce(func.sum(func.extract("epoch", tickets.c.claimedAt - tickets.c.createdAt)), 0),
+    ).where(*conditions)
+    if allEvents:
+        query = query.execution_options(all_events=True)
+    claimed, claimSeconds = db.session.execute(query).one()
+    avgTime += float(claimSeconds)
+    totalTickets += claimed
 
     if totalMentors != 0:
         averageRating = sumAverageMentorRating/totalMentors
@@ -51,69 +80,70 @@ def getTicketData():
 @auth_required_decorator(roles=["admin"])
 def getUserData():
     users = User.query.all()
-    uids = [str(u.id) for u in users]
-
-    # Get user info from HackPSU API (uses Bearer token automatically)
-    info = get_user_info(uids)
+    # Mentor numbers are for the current event
+    stats = hackathons.mentor_stats()
+    online = presence.online_mentors()
 
     userData = []
     for user in users:
-        # Don't use user.map() as it gets name/email from current session (admin's session)
-        # Instead, build the user data manually with API data
-        api_info = info.get(user.id, {})
-
+        resolved, numRatings, averageRating = stats.get(user.id, (0, 0, None))
         userMap = {
             "id": user.id,
-            "name": api_info.get('name', 'Unknown User'),
-            "email": api_info.get('email', 'No Email'),
+            "name": user.name or 'Unknown User',
+            "email": user.email or 'No Email',
             "role": user.role,
             "location": user.location,
             "zoomlink": user.zoomlink,
             "discord": user.discord,
             "phone": user.phone,
             "resolved_tickets": (
-                user.resolved_tickets if user.role == "mentor" else "Not Applicable"
-            ),
-            "ratings": (
-                sum(user.ratings) / len(user.ratings)
-                if user.role == "mentor" and user.ratings and len(user.ratings) != 0
-                else None
+                resolved if user.role == "mentor" else "Not Applicable"
             ),
+            "ratings": averageRating if user.role == "mentor" else None,
             "reviews": user.reviews if user.reviews != None else [],
+            "skills": user.skills or [],
+            "online": user.id in online,
         }
 
         userData.append(userMap)
 
-    return userData
+    return list_response(userData)
 
 
 @admin.route("/alltickets")
 @auth_required_decorator(roles=["admin"])
 def getAllTickets():
     """Get all tickets with creator and mentor information"""
-    tickets = Ticket.query.order_by(Ticket.createdAt.desc()).all()
-
-    # Get all unique user IDs (creators and claimants)
-    user_ids = set()
-    for ticket in tickets:
-        if ticket.creator_id:
-            user_ids.add(str(ticket.creator_id))
-        if ticket.claimant_id:
-            user_ids.add(str(ticket.claimant_id))
-
-    # Fetch user info from HackPSU API
-    info = get_user_info(list(user_ids))
+    # ?archived=true adds tickets from past events, open or archived
+    query = Ticket.query
+    if include_archived():
+        query = query.execution_options(all_events=True)
+    tickets = (
+        query
+        .options(joinedload(Ticket.creator), joinedload(Ticket.claimant))
+        .order_by(Ticket.createdAt.desc())
+        .all()
+    )
+    if include_archived():
+        archived = (
+            ArchivedTicket.query
+            .options(joinedload(ArchivedTicket.creator), joinedload(ArchivedTicket.claimant))
+            .order_by(ArchivedTicket.createdAt.desc())
+            .all()
+        )
+        tickets = sorted(tickets + archived, key=lambda ticket: ticket.createdAt, reverse=True)
 
     ticketData = []
     for ticket in tickets:
-        # Get creator info (prefer stored name/email, fallback to API)
-        creator_name = ticket.creator_name if ticket.creator_name else info.get(ticket.creator_id, {}).get('name', 'Unknown User')
-        creator_email = ticket.creator_email if ticket.creator_email else info.get(ticket.creator_id, {}).get('email', 'No Email')
+        # Get creator info (prefer name/email stored on the ticket, fall back to the profile)
+        creator = ticket.creator
+        creator_name = ticket.creator_name or (creator and creator.name) or 'Unknown User'
+        creator_email = ticket.creator_email or (creator and creator.email) or 'No Email'
 
-        # Get mentor info (prefer stored name, fallback to API)
+        # Get mentor info (prefer stored name, fall back to the profile)
         mentor_name = None
         if ticket.claimant_id:
-            mentor_name = ticket.claimant_name if ticket.claimant_name else info.get(ticket.claimant_id, {}).get('name', 'Unknown Mentor')
+            mentor_name = ticket.claimant_name or (ticket.claimant and ticket.claimant.name) or 'Unknown Mentor'
 
         ticketData.append({
             "id": ticket.id,
@@ -129,7 +159,79 @@ def getAllTickets():
             "createdAt": ticket.createdAt.isoformat() if ticket.createdAt else None,
             "claimedAt": ticket.claimedAt.isoformat() if ticket.claimedAt else None,
             "location": ticket.location,
-            "tags": ticket.tags
+            "tags": ticket.tags,
+            "archived": isinstance(ticket, ArchivedTicket),
         })
 
-    return ticketData
+    return list_response(ticketData)
+
+
+@admin.route("/events", methods=["GET", "POST"])
+@auth_required_decorator(roles=["admin"])
+def hackathonEvents():
+    """List events, or start a new one with {"name": ...} (it becomes current)"""
+    if request.method == "POST":
+        name = ((request.get_json() or {}).get("name") or "").strip()
+        if not name:
+            return abort(400, "Event name is required")
+        hackathons.create_event(name)
+
+    events = Event.query.order_by(Event.id.desc()).all()
+    return [event.map() for event in events]
+
+
+@admin.route("/events/<int:event_id>/current", methods=["POST"])
+@auth_required_decorator(roles=["admin"])
+def makeEventCurrent(event_id):
+    event = db.session.get(Event, event_id)
+    if event is None:
+        return abort(404, "No such event")
+    if event.closed_at is not None:
+        return abort(400, "Event is closed")
+    hackathons.set_current_event(event_id)
+    return {"message": f"{event.name} is now the current event"}
+
+
+@admin.route("/events/<int:event_id>/close", methods=["POST"])
+@auth_required_decorator(roles=["admin"])
+def closeEvent(event_id):
+    """Move an event's tickets to the archive; its ratings stay for all-time stats"""
+    try:
+        archived = hackathons.close_event(event_id)
+    except ValueError as e:
+        return abort(400, str(e))
+    return {"message": f"Event closed, {archived} tickets archived", "archived": archived}
+
+
+@admin.route("/jobs")
+@auth_required_decorator(roles=["admin"])
+def jobRuns():
+    """Last run of each scheduled maintenance job (server/scheduler.py)"""
+    rows = db.session.execute(text("SELECT * FROM job_runs ORDER BY job")).mappings().all()
+    return [dict(row) for row in rows]
+
+
+@admin.route("/loglevel", methods=["GET", "POST"])
+@auth_required_decorator(roles=["admin"])
+def logLevel():
+    """Change log levels at runtime, e.g. {"levels": {"auth": "DEBUG"}}
+
+    Levels apply to every worker within a few seconds. Post {"levels": {}} to
+    go back to the configured defaults.
+    """
+    if request.method == "POST":
+        levels = (request.get_json() or {}).get("levels", {})
+        for category, level in levels.items():
+            if not isinstance(level, str) or level.upper() not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", "NOTSET"):
+                return abort(400, f"Invalid level for {category}: {level}")
+        log.set_levels({category: level.upper() for category, level in levels.items()})
+
+    loggers = [name for name in logging.root.manager.loggerDict if name.startswith(log.ROOT + ".")]
+    return {
+        "default": logging.getLevelName(logging.getLogger(log.ROOT).level),
+        "levels": {
+            name[len(log.ROOT) + 1:]: logging.getLevelName(logging.getLogger(name).getEffectiveLevel())
+            for name in sorted(loggers)
+        },
+        "dropped": log.NonBlockingQueueHandler.dropped,
+    }
@@ -0,0 +1,56 @@
+import os
+
+from apiflask import APIBlueprint, abort
+from flask import request, send_file
+
+from server import attachments as storage
+from server.controllers.auth import auth_required_decorator
+
+attachments = APIBlueprint("attachments", __name__, url_prefix="/attachments")
+
+# Attachments are content-addressed, so a URL always names the same bytes
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@attachments.route("", methods=["POST"])
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def upload():
+    file = request.files.get("file")
+    if not file:
+        return abort(400, "No file uploaded")
+
+    data = file.stream.read(storage.MAX_ATTACHMENT_BYTES + 1)
+    try:
+        ref = storage.store(data)
+    except storage.InvalidAttachment as e:
+        return abort(400, str(e))
+
+    return {"id": ref, "url": storage.url(ref), "thumbnail": storage.thumbnail_url(ref)}, 201
+
+
+def _send(path, mimetype):
+    if not path or not os.path.exists(path):
+        return abort(404, "Attachment not found")
+
+    # conditional=True streams the file and answers Range and If-None-Match requests
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=os.path.basename(path),
+                         max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+@attachments.route("/<ref>")
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def get(ref):
+    if not storage.REF_PATTERN.fullmatch(ref):
+        return abort(404, "Attachment not found")
+    return _send(storage.original_path(ref), storage.mimetype(ref))
+
+
+@attachments.route("/<ref>/thumb")
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def thumbnail(ref):
+    if not storage.REF_PATTERN.fullmatch(ref):
+        return abort(404, "Attachment not found")
+    return _send(storage.thumbnail_path(ref), "image/jpeg")
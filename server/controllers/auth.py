@@ -3,12 +3,10 @@ from urllib.parse import quote_plus, urlencode
 import os
 
 from apiflask import APIBlueprint, abort
-from flask import current_app as app
+from flask import current_app
 from flask import redirect, request, session
-from authlib.integrations.flask_client import OAuth
 
-
-from server import db
+from server import db, events, presence, upstream
 from server.config import (
     FRONTEND_URL,
     BACKEND_URL,
@@ -30,12 +28,17 @@ from server.firebase_session_auth import (
     hackpsu_admin_required,
     verify_hackpsu_session,
     sync_user_from_auth_server,
-    check_access_permission
+    check_access_permission,
+    session_cache_key,
 )
-from server.hackpsu_api import get_user_info, get_my_info
+from server.log import get_logger
 
 auth = APIBlueprint("auth", __name__, url_prefix="/auth")
-oauth = OAuth(app)
+log = get_logger("auth")
+_oauth = None
+
+# Most skill tags a mentor can list
+MAX_SKILLS = 20
 
 def is_user_valid(user, valid_roles):
     if not user or not user.role:
@@ -44,15 +47,24 @@ def is_user_valid(user, valid_roles):
         return False
     return True
 
-oauth.register(
-    "discord",
-    client_id=DISCORD_CLIENT_ID,
-    client_secret=DISCORD_CLIENT_SECRET,
-    access_token_url="https://discord.com/api/oauth2/token",
-    authorize_url="https://discord.com/api/oauth2/authorize",
-    api_base_url="https://discord.com/api/",
-    client_kwargs={"scope": "identify email"},
-)
+def discord_client():
+    """Discord OAuth client, registered on first use"""
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.flask_client import OAuth
+
+        oauth = OAuth(current_app._get_current_object())
+        oauth.register(
+            "discord",
+            client_id=DISCORD_CLIENT_ID,
+            client_secret=DISCORD_CLIENT_SECRET,
+            access_token_url="https://discord.com/api/oauth2/token",
+            authorize_url="https://discord.com/api/oauth2/authorize",
+            api_base_url="https://discord.com/api/",
+            client_kwargs={"scope": "identify email"},
+        )
+        _oauth = oauth
+    return _oauth.discord
 
 def auth_required_decorator(roles):
     """
@@ -70,6 +82,9 @@ def auth_required_decorator(roles):
                 return abort(401)
             elif user.role not in roles:
                 return abort(401)
+            if user.role == "mentor":
+                # Any API call doubles as a presence heartbeat
+                presence.seen(user.id, user.location, user.skills)
             return func(*args, **kwargs)
 
         return wrapper
@@ -82,48 +97,46 @@ def login():
     """Redirect to HackPSU Firebase auth login - or home if already logged in"""
     return_url = request.args.get("return_url", FRONTEND_URL + "/home")
 
-    print(f"[DEBUG LOGIN] All cookies: {dict(request.cookies)}")
-    print(f"[DEBUG LOGIN] Flask session: {dict(session)}")
+    log.debug("Login cookies: %s, session keys: %s", list(request.cookies.keys()), list(session.keys()))
 
     # Check if user is already logged in via Flask session
     if "user_id" in session:
         user = User.query.filter_by(id=session["user_id"]).first()
         if user:
-            print(f"[DEBUG] User already logged in via session, redirecting to: {return_url}")
+            log.debug("User already logged in via session, redirecting to: %s", return_url)
             return redirect(return_url)
 
     # Check if __session cookie exists and is valid
     session_cookie = request.cookies.get('__session')
-    print(f"[DEBUG LOGIN] __session cookie exists: {session_cookie is not None}")
+    log.debug("__session cookie exists: %s", session_cookie is not None)
 
     if session_cookie:
-        print(f"[DEBUG] __session cookie found (first 20 chars): {session_cookie[:20]}...")
         user_data = verify_hackpsu_session()
-        print(f"[DEBUG] verify_hackpsu_session returned: {user_data}")
+        log.debug("verify_hackpsu_session returned uid=%s", user_data and user_data.get("uid"))
 
         if user_data:
             has_access = check_access_permission(user_data)
-            print(f"[DEBUG] check_access_permission returned: {has_access}")
+            log.debug("check_access_permission returned: %s", has_access)
 
             if has_access:
-                print("[DEBUG] Valid __session cookie, syncing user and redirecting")
+                log.debug("Valid __session cookie, syncing user and redirecting")
                 # Sync user and set session
                 user = sync_user_from_auth_server(user_data)
                 if user:
                     session["user_id"] = user.id
                     session["user_name"] = user_data.get("displayName", "User")
                     session["user_email"] = user_data.get("email", "")
-                    print(f"[DEBUG] Session created for user {user.id}, redirecting to: {return_url}")
+                    log.debug("Session created for user %s, redirecting to: %s", user.id, return_url)
                     return redirect(return_url)
                 else:
-                    print("[DEBUG] Failed to sync user from auth server")
+                    log.debug("Failed to sync user from auth server")
             else:
-                print("[DEBUG] User does not have access permission")
+                log.debug("User does not have access permission")
         else:
-            print("[DEBUG] verify_hackpsu_session returned None")
+            log.debug("verify_hackpsu_session returned None")
 
     # No valid session, redirect to auth login
-    print("[DEBUG] No valid session, redirecting to auth server login")
+    log.debug("No valid session, redirecting to auth server login")
     callback_url = f"{BACKEND_URL}/api/auth/callback?return_url={quote_plus(return_url)}"
     return redirect(f"{AUTH_LOGIN_URL}?returnTo={quote_plus(callback_url)}")
 
@@ -156,7 +169,7 @@ def callback():
     if 'session_token' in user_data:
         session['firebase_session_token'] = user_data['session_token']
 
-    print(f"[DEBUG] Session set: name={session['user_name']}, email={session['user_email']}")
+    log.debug("Session set for user %s", user.id)
 
     # Get the return URL from query params, default to FRONTEND_URL/home
     return_url = request.args.get("return_url", FRONTEND_URL + "/home")
@@ -166,22 +179,20 @@ def callback():
 @auth.route("/logout")
 def logout():
     """Logout - call HackPSU auth logout endpoint and clear session"""
-    import requests
-
     # Get the __session cookie to send to auth server
     session_cookie = request.cookies.get('__session')
 
     # Call HackPSU auth server to revoke Firebase session
     if session_cookie:
         try:
-            response = requests.post(
-                AUTH_LOGOUT_URL,
-                cookies={'__session': session_cookie},
-                timeout=5
-            )
-            print(f"[DEBUG] Auth server logout response: {response.status_code}")
+            response = upstream.auth.post(AUTH_LOGOUT_URL, cookies={'__session': session_cookie})
+            log.debug("Auth server logout response: %s", response.status_code)
         except Exception as e:
-            print(f"[ERROR] Failed to call auth server logout: {e}")
+            log.warning("Failed to call auth server logout: %s", e)
+
+        # Other workers may still trust this cookie from their verified-session cache
+        events.publish("session.revoked", key=session_cache_key(session_cookie))
+        db.session.commit()
 
     # Clear Flask session
     session.clear()
@@ -193,10 +204,10 @@ def logout():
 @auth.route("/discord/login")
 def discord_login():
     if "user_id" not in session:
-        print("in here")
+        log.debug("Discord login without a session, redirecting to login")
         return redirect(FRONTEND_URL + "/api/auth/login")
 
-    return oauth.discord.authorize_redirect(
+    return discord_client().authorize_redirect(
         redirect_uri=BACKEND_URL + "/api/auth/discord/callback"
     )
 
@@ -208,10 +219,10 @@ def discord_callback():
 
     try:
         # Exchange authorization code for access token
-        token = oauth.discord.authorize_access_token()
+        token = discord_client().authorize_access_token()
 
         # Get Discord user profile
-        resp = oauth.discord.get("users/@me", token=token)
+        resp = discord_client().get("users/@me", token=token)
         profile = resp.json()
 
         # Extract Discord info
@@ -228,20 +239,20 @@ def discord_callback():
         user = User.query.filter_by(id=session["user_id"]).first()
         if user:
             user.discord = discord_tag
+            events.publish("user.updated", id=user.id)
             db.session.commit()
 
         # Redirect back to home
         return redirect(FRONTEND_URL + "/home")
 
     except Exception as e:
-        print(f"Discord OAuth error: {e}")
+        log.warning("Discord OAuth error: %s", e)
         return redirect(FRONTEND_URL + "/home?error=discord_failed")
 
 @auth.route("/discord/exchange-token", methods=["POST"])
 def discord_exchange_token():
     data = request.get_json()
     code = data.get("code")
-    print("code", code)
 
     if not code:
         return abort(400, "Missing authorization code")
@@ -252,14 +263,12 @@ def discord_exchange_token():
 
     try:
         # Exchange code for token using the Discord OAuth client
-        token = oauth.discord.fetch_access_token(
+        token = discord_client().fetch_access_token(
             code=code,
             redirect_uri=BACKEND_URL + "/api/auth/discord/callback"
         )
-        print("got token", token)
         # Get Discord user profile
-        resp = oauth.discord.get("users/@me", token=token)
-        print("resp", resp)
+        resp = discord_client().get("users/@me", token=token)
         profile = resp.json()
 
         # Extract Discord info
@@ -274,14 +283,13 @@ def discord_exchange_token():
 
         user = User.query.filter_by(id=session["user_id"]).first()
 
-        print("user", user)
-
         if not user:
             return {"success": False, "error": "User not found"}
 
         user.discord = discord_tag
+        events.publish("user.updated", id=user.id)
         db.session.commit()
-        print("user.discord", user.discord)
+        log.debug("User %s connected Discord", user.id)
         return {"success": True, "discord_tag": discord_tag}
 
     except Exception as e:
@@ -304,8 +312,9 @@ def set_phone():
         return {"success": False, "error": "User not found"}, 404
 
     user.phone = phone
+    events.publish("user.updated", id=user.id)
     db.session.commit()
-    print(f"[DEBUG] User {user.id} set phone: {phone}")
+    log.debug("User %s set phone number", user.id)
     return {"success": True, "phone": phone}
 
 
@@ -324,7 +333,7 @@ def set_firebase_token():
 
     # Store the Firebase ID token in session
     session["firebase_id_token"] = firebase_id_token
-    print(f"[DEBUG] Stored Firebase ID token in session (length: {len(firebase_id_token)})")
+    log.debug("Stored Firebase ID token in session (length: %s)", len(firebase_id_token))
 
     return {"success": True}
 
@@ -418,5 +427,8 @@ def update():
     user.discord = data.get("discord", "")
     user.phone = data.get("phone", "")
     user.preferred = data.get("preferred")
+    if isinstance(data.get("skills"), list):
+        user.skills = sorted({str(tag).strip() for tag in data["skills"] if str(tag).strip()})[:MAX_SKILLS]
+    events.publish("user.updated", id=user.id)
     db.session.commit()
     return {"message": "Your information has been updated!"}
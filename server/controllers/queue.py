@@ -6,13 +6,17 @@ from flask import (
     request,
     send_file,
     jsonify,
+    Response,
 )
+import json
 from server import db
-from authlib.integrations.flask_client import OAuth
 from apiflask import APIBlueprint, abort
+from sqlalchemy import or_, select
+from sqlalchemy.orm import joinedload
 from server.models import User, Ticket
 from server.controllers.auth import auth_required_decorator
-from server.hackpsu_api import get_user_info
+from server import coalesce, events, hackathons, metrics, presence
+from server.serialization import list_response
 
 queue = APIBlueprint("queue", __name__, url_prefix="/queue")
 
@@ -20,11 +24,56 @@ queue = APIBlueprint("queue", __name__, url_prefix="/queue")
 @queue.route("/get")
 @auth_required_decorator(roles=["hacker", "mentor", "admin"])
 def get():
-    tickets = []
-    for ticket in Ticket.query.all():
-        if ticket.status != "awaiting_feedback":
-            tickets.append(dict(ticket.map()))
-    return jsonify(tickets)
+    # Only what the queue page shows: open tickets and the ones being worked on
+    tickets = (
+        Ticket.query
+        .filter(or_(Ticket.active.is_(True), Ticket.status == "claimed"))
+        .options(joinedload(Ticket.creator))
+        .all()
+    )
+    return jsonify(list_response([ticket.map() for ticket in tickets]))
+
+
+def _cluster(ticket):
+    """Query for the tickets grouped with ticket as near-duplicates (including itself)"""
+    root = ticket.cluster_id or ticket.id
+    return Ticket.query.filter(or_(Ticket.id == root, Ticket.cluster_id == root))
+
+
+@queue.route("/events")
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def events_stream():
+    """Server-sent ticket change events, so clients refetch when something changed
+
+    Events carry only a type and ticket ids; clients still load data from /get.
+    """
+    user = User.query.filter_by(id=session["user_id"]).first()
+    # An open stream keeps a mentor online between the page's slower polls
+    heartbeat = (user.id, user.location, list(user.skills or ())) if user.role == "mentor" else None
+
+    def generate():
+        # Reconnect after 5s if the connection drops
+        yield "retry: 5000\n\n"
+        for event in events.stream(["ticket."]):
+            if event is None:
+                if heartbeat:
+                    presence.seen(*heartbeat)
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@queue.route("/mentors")
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def mentors_online():
+    """Mentors online right now, in total, per location and per skill tag"""
+    return presence.counts()
 
 
 @queue.route("/claim", methods=["POST"])
@@ -37,16 +86,30 @@ def claim():
 
     ticket = Ticket.query.get(ticket_id)
     if ticket.claimant_id is not None:
+        metrics.CLAIM_CONFLICTS.inc()
         return abort(400, "Ticket already claimed")
 
-    ticket.status = "claimed"
-    ticket.claimant = user
-    ticket.claimant_name = session.get("user_name", "Mentor")
-    ticket.active = False
+    # {"cluster": true} also claims the open duplicates grouped with this ticket
+    claiming = [ticket]
+    if data.get("cluster"):
+        claiming += [
+            other for other in _cluster(ticket).filter(Ticket.active.is_(True), Ticket.claimant_id.is_(None))
+            if other.id != ticket.id
+        ]
+
+    for claimed_ticket in claiming:
+        claimed_ticket.status = "claimed"
+        claimed_ticket.claimant = user
+        claimed_ticket.claimant_name = user.name or session.get("user_name", "Mentor")
+        claimed_ticket.active = False
+        claimed_ticket.claimedAt = db.func.now()
     user.claimed = ticket
-    ticket.claimedAt = db.func.now()
 
+    events.publish("ticket.claimed", ids=[claimed_ticket.id for claimed_ticket in claiming])
     db.session.commit()
+    metrics.TICKET_CLAIMS.inc(len(claiming))
+    if len(claiming) > 1:
+        return {"message": f"Claimed {len(claiming)} tickets!"}
     return {"message": "Ticket claimed!"}
 
 
@@ -70,7 +133,9 @@ def unclaim():
     user.claimed = None
     ticket.claimedAt = None
 
+    events.publish("ticket.unclaimed", ids=[ticket.id])
     db.session.commit()
+    metrics.TICKET_UNCLAIMS.inc()
 
     return {"message": "Ticket unclaimed!"}
 
@@ -84,13 +149,24 @@ def resolve():
     ticket_id = int(data["id"])
     ticket = Ticket.query.get(ticket_id)
     ticket.status = "awaiting_feedback"
-    
+    ticket.resolvedAt = db.func.now()
+    resolved = [ticket.id]
+
+    # {"cluster": true} also resolves the duplicates this mentor claimed with it
+    if data.get("cluster"):
+        for other in _cluster(ticket).filter(Ticket.claimant_id == user.id, Ticket.status == "claimed"):
+            if other.id != ticket.id:
+                other.status = "awaiting_feedback"
+                other.resolvedAt = db.func.now()
+                resolved.append(other.id)
+
     if not user.resolved_tickets:
         user.resolved_tickets = 0
 
-    user.resolved_tickets = user.resolved_tickets + 1
+    user.resolved_tickets = user.resolved_tickets + len(resolved)
 
     user.claimed = None
+    events.publish("ticket.resolved", ids=resolved)
     db.session.commit()
 
     return {"message": "Ticket resolved! Awaiting user feedback"}
@@ -112,21 +188,25 @@ def claimed():
 @queue.route("/ranking", methods=["GET"])
 @auth_required_decorator(roles=["mentor", "admin"])
 def ranking():
-    mentors = User.query.filter_by(role="mentor")
-    uids = [str(u.id) for u in mentors]
+    # Every viewer polls the same leaderboard; compute it once for all of them
+    return coalesce.shared("ranking", _ranking, hackathons.current_event_id())
 
-    # Get user info from HackPSU API (uses Bearer token automatically)
-    info = get_user_info(uids)
+
+def _ranking():
+    # This event's ratings and resolved tickets only
+    stats = hackathons.mentor_stats()
+    mentors = User.query.filter(User.role == "mentor", User.id.in_(list(stats))).all()
 
     ranking = []
     for mentor in mentors:
-        if mentor.ratings and len(mentor.ratings) > 0:
-            mentor_rating = sum(mentor.ratings) / len(mentor.ratings)
-            mentor_name = info.get(mentor.id, {}).get('name', 'Unknown Mentor')
+        resolved, num_ratings, mentor_rating = stats[mentor.id]
+        if num_ratings > 0:
+            mentor_name = mentor.name or 'Unknown Mentor'
+
             ranking.append(
                 (
-                    mentor.resolved_tickets,
-                    len(mentor.ratings),
+                    resolved,
+                    num_ratings,
                     mentor_name,
                     mentor_rating,
                 )
@@ -148,3 +228,33 @@ def ranking():
         rankings.append(status)
 
     return rankings
+
+
+@queue.route("/network", methods=["GET"])
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def network():
+    """Open and in-progress tickets with the mentors working on them, for the live network view"""
+    return coalesce.shared("network", _network, hackathons.current_event_id(), ttl=2)
+
+
+def _network():
+    rows = db.session.execute(
+        select(Ticket.id, Ticket.creator_name, Ticket.status, Ticket.claimant_id, Ticket.claimant_name)
+        .where(
+            Ticket.event_id == hackathons.current_event_id(),
+            or_(Ticket.active.is_(True), Ticket.status.in_(["claimed", "awaiting_feedback"])),
+        )
+        .order_by(Ticket.id)
+    )
+    return {
+        "tickets": [
+            {
+                "id": row.id,
+                "name": row.creator_name,
+                "status": row.status,
+                "claim_id": row.claimant_id,
+                "claim_name": row.claimant_name,
+            }
+            for row in rows
+        ]
+    }
@@ -1,13 +1,15 @@
 from flask import current_app as app, url_for, redirect, session, request, send_file, jsonify
 from server import db
-from authlib.integrations.flask_client import OAuth
 from apiflask import APIBlueprint, abort
 from os import environ as env
 from urllib.parse import quote_plus, urlencode
 import csv
-from server.models import User, Ticket
+from datetime import datetime, timezone
+from sqlalchemy import text as sql
+from server.models import User, Ticket, Rating
 from server.controllers.auth import auth_required_decorator
 from server.notifications import send_ticket_notification
+from server import attachments, duplicates, eta, events, idempotency, metrics, search as ticket_search
 
 ticket = APIBlueprint("ticket", __name__, url_prefix="/ticket")
 
@@ -37,6 +39,12 @@ def save():
     ):
         return abort(404, "Make sure to fill every field!")
 
+    # Keep only references to stored attachments on the ticket
+    try:
+        data["images"] = attachments.normalize_refs(data.get("images"))
+    except attachments.InvalidAttachment as e:
+        return abort(400, str(e))
+
     # Get creator email and name from session
     creator_email = session.get("user_email", "")
     creator_name = session.get("user_name", "User")
@@ -44,12 +52,14 @@ def save():
     if not user.ticket_id:
         ticket = Ticket(user, data, False, creator_email, creator_name)
         db.session.add(ticket)
-        db.session.commit()
+        # Assigns ticket.id without committing; everything below is one transaction
+        db.session.flush()
         user.ticket_id = ticket.id
     else:
         ticket = Ticket.query.get(user.ticket_id)
         ticket.update(data)
 
+    events.publish("ticket.updated", ids=[ticket.id])
     db.session.commit()
 
     return {"message": "Ticket has been updated."}
@@ -57,6 +67,7 @@ def save():
 
 @ticket.route("/submit", methods=["POST"])
 @auth_required_decorator(roles=["hacker", "admin"])
+@idempotency.idempotent("ticket.submit")
 def submit():
     user = User.query.filter_by(id=session["user_id"]).first()
     if not user:
@@ -79,21 +90,46 @@ def submit():
     ):
         return abort(404, "Make sure to fill every field!")
 
+    # Keep only references to stored attachments on the ticket
+    try:
+        data["images"] = attachments.normalize_refs(data.get("images"))
+    except attachments.InvalidAttachment as e:
+        return abort(400, str(e))
+
     # Get creator email and name from session
     creator_email = session.get("user_email", "")
     creator_name = session.get("user_name", "User")
 
     ticket = Ticket(user, data, True, creator_email, creator_name)
     db.session.add(ticket)
-    db.session.commit()
+    # Assigns ticket.id without committing; everything below is one transaction
+    db.session.flush()
+
+    # Group near-identical tickets (e.g. everyone at a workshop asking about the wifi)
+    matches = duplicates.find_duplicates(ticket)
+    if matches:
+        original = matches[0][0]
+        ticket.cluster_id = original.cluster_id or original.id
 
     user.ticket_id = ticket.id
+    events.publish("ticket.created", ids=[ticket.id])
+    response = idempotency.save_response({
+        "message": "Ticket has been created.",
+        "duplicates": [
+            {"id": match.id, "question": match.question, "location": match.location, "similarity": score}
+            for match, score in matches
+        ],
+    })
     db.session.commit()
 
-    # Send push notification via Gotify
-    send_ticket_notification(data)
+    # Send push notification via Gotify, once per group of duplicates
+    if matches:
+        metrics.DUPLICATE_TICKETS.inc()
+        metrics.NOTIFICATIONS.labels("collapsed").inc()
+    else:
+        send_ticket_notification(data)
 
-    return {"message": "Ticket has been created."}
+    return response
 
 
 @ticket.route("/get")
@@ -112,6 +148,68 @@ def get():
     return jsonify({"active": True, "ticket": ticket.map()}), 200
 
 
+def _parse_time(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return abort(400, f"{name} must be an ISO 8601 date or time")
+    # createdAt is stored as naive UTC
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@ticket.route("/search")
+@auth_required_decorator(roles=["mentor", "admin"])
+def search():
+    """Ranked full-text search, e.g. ?q=react hooks&status=unclaimed&since=2024-10-05&page=2"""
+    text = request.args.get("q", "").strip()
+    if not text:
+        return abort(400, "Missing search query")
+
+    statuses = [status for value in request.args.getlist("status") for status in value.split(",") if status]
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", 20))
+    except ValueError:
+        return abort(400, "page and per_page must be numbers")
+
+    rows, more = ticket_search.search_tickets(
+        text, statuses=statuses, since=_parse_time("since"), until=_parse_time("until"),
+        page=page, per_page=per_page,
+    )
+    return jsonify({
+        "tickets": [dict(ticket.map(), rank=rank) for ticket, rank in rows],
+        "page": page,
+        "more": more,
+    })
+
+
+@ticket.route("/similar")
+@auth_required_decorator(roles=["hacker", "mentor", "admin"])
+def similar():
+    """Open tickets resembling the one being written (?q=question and tags)"""
+    user = User.query.filter_by(id=session["user_id"]).first()
+    rows = ticket_search.similar_open_tickets(
+        request.args.get("q", ""), exclude_id=user.ticket_id if user else None
+    )
+    # Other hackers' tickets: no contact details, just enough to find them
+    return [
+        {
+            "id": ticket.id,
+            "question": ticket.question,
+            "tags": ticket.tags,
+            "location": ticket.location,
+            "status": ticket.status,
+            "createdAt": ticket.createdAt,
+        }
+        for ticket, rank in rows
+    ]
+
+
 @ticket.route("/remove", methods=["POST"])
 @auth_required_decorator(roles=["hacker", "admin"])
 def remove():
@@ -125,8 +223,11 @@ def remove():
     delete = bool(request.get_json()["del"])
     if delete:
         db.session.delete(ticket)
+        user.ticket_id = None
+    else:
+        ticket.active = False
 
-    ticket.active = False
+    events.publish("ticket.removed", ids=[ticket.id])
     db.session.commit()
     return {"message": "Ticket has been removed!"}
 
@@ -141,7 +242,11 @@ def status():
 
     ticket = Ticket.query.get(user.ticket_id)
     if not ticket.claimant_id:
-        return {"status": "unclaimed", "message": "Ticket not claimed!"}
+        response = {"status": "unclaimed", "message": "Ticket not claimed!"}
+        if ticket.active:
+            # Queue position and expected wait; null if there's nothing to base it on
+            response["eta"] = eta.estimate(ticket.id)
+        return response
 
     mentor = User.query.get(ticket.claimant_id)
     if ticket.status == "awaiting_feedback":
@@ -164,7 +269,9 @@ def unclaim():
     ticket.claimant = None
     # ticket.claimant_name = None
     ticket.claimant_id = None
+    events.publish("ticket.unclaimed", ids=[ticket.id])
     db.session.commit()
+    metrics.TICKET_UNCLAIMS.inc()
 
     return {"message": "Ticket unclaimed!"}
 
@@ -185,33 +292,57 @@ def awaiting_feedback():
 
 @ticket.route("/rate", methods=["POST"])
 @auth_required_decorator(roles=["hacker", "admin"])
+@idempotency.idempotent("ticket.rate")
 def rate():
     data = request.get_json()
-    mentor = User.query.get(data["mentor_id"])
-    print("data", data["rating"])
-    
-    if not mentor.ratings:
-        mentor.ratings = []
-    mentor.ratings.append(data["rating"])
-    if len(data["review"]) != 0:
-        if not mentor.reviews:
-            mentor.reviews = []
-        reviewer_name = session.get("user_name") or data.get("reviewerName") or "Anonymous"
-        mentor.reviews.append({"reviewer": reviewer_name, "text": data["review"]})
-    db.session.commit()
+    reviewer_name = session.get("user_name") or data.get("reviewerName") or "Anonymous"
 
     ticket = Ticket.query.get(int(data["id"]))
+    if not ticket:
+        return abort(404, "Ticket not found")
+    if ticket.status == "completed":
+        return abort(400, "Ticket is already completed")
+
+    # Appended in place, so ratings given at the same time can't overwrite each other
+    ratings = db.session.execute(
+        sql("""
+            UPDATE users SET
+                ratings = array_append(coalesce(ratings, '{}'), CAST(:rating AS NUMERIC(2,1))),
+                reviews = CASE WHEN :review = '' THEN reviews ELSE CAST(
+                    coalesce(CAST(reviews AS JSONB), '[]') || jsonb_build_array(
+                        jsonb_build_object('reviewer', CAST(:reviewer AS TEXT), 'text', CAST(:review AS TEXT)))
+                    AS JSON) END
+            WHERE id = :mentor_id
+            RETURNING ratings
+        """),
+        {"rating": data["rating"], "review": data["review"], "reviewer": reviewer_name, "mentor_id": data["mentor_id"]},
+    ).scalar()
+    if ratings is None:
+        return abort(404, "Mentor not found")
+
     ticket.status = "completed"
     ticket.active = False
+    # Per-event leaderboards read these; users.ratings stays the all-time list
+    db.session.add(Rating(
+        event_id=ticket.event_id,
+        mentor_id=data["mentor_id"],
+        ticket_id=ticket.id,
+        rating=data["rating"],
+        reviewer=reviewer_name,
+        review=data["review"] or None,
+    ))
 
     # Clear the user's ticket_id reference so they can create a new ticket
     user = User.query.filter_by(id=session["user_id"]).first()
     if user and user.ticket_id == ticket.id:
         user.ticket_id = None
 
+    events.publish("ticket.completed", ids=[ticket.id])
+    events.publish("user.rated", id=data["mentor_id"])
+    response = idempotency.save_response(ratings)
     db.session.commit()
 
-    return mentor.ratings
+    return response
 
 
 @ticket.route("/resolve", methods=["POST"])
@@ -224,11 +355,13 @@ def resolve():
 
     ticket = Ticket.query.get(user.ticket_id)
     ticket.status = "awaiting_feedback"
+    ticket.resolvedAt = db.func.now()
 
     data = request.get_json()
     mentor = User.query.get(data["mentor_id"])
     mentor.resolved_tickets = mentor.resolved_tickets + 1
     mentor.claimed = None
+    events.publish("ticket.resolved", ids=[ticket.id])
     db.session.commit()
 
     return {"message": "Ticket resolved! Please rate your mentor."}
@@ -0,0 +1,98 @@
+# Near-duplicate ticket detection
+#
+# Each ticket's question and content are reduced to a MinHash signature over
+# character 3-grams, whose matching positions estimate the Jaccard similarity
+# of two tickets. The signature is split into LSH bands; tickets sharing a
+# band hash are candidates, which are then checked against the full
+# signature. Signatures and band hashes are stored on the ticket
+# (migrations/0005_ticket_duplicates.sql), so every worker sees the same
+# index and lookups are a GIN index probe rather than a scan of the queue.
+
+import hashlib
+import html
+import os
+import random
+import re
+
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+
+from server import db
+
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Long code pastes don't change what a ticket is about, only how long hashing takes
+MAX_TEXT_CHARS = 1500
+# Estimated Jaccard similarity above which a ticket counts as a duplicate.
+# Short rewordings ("wifi is down" / "wifi down, can't connect") land around
+# 0.4; unrelated tickets stay under 0.1. With 32 bands of 2 rows, pairs above
+# 0.35 share a band about 98% of the time.
+DUPLICATE_THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", "0.35"))
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20231005)
+# Fixed seed: signatures are stored, so the permutations must never change
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _normalize(question, content):
+    text = f"{question or ''} {html.unescape(_TAG.sub(' ', content or ''))}".lower()
+    return " ".join(_WORD.findall(text))[:MAX_TEXT_CHARS]
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def signature(question, content):
+    """MinHash signature and LSH band hashes of a ticket, or (None, None)"""
+    text = _normalize(question, content)
+    if not text:
+        return None, None
+
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = [_hash64(shingle.encode()) % _PRIME for shingle in shingles]
+    minhash = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+    bands = []
+    for band in range(BANDS):
+        values = minhash[band * ROWS:(band + 1) * ROWS]
+        digest = _hash64(f"{band}:{','.join(map(str, values))}".encode())
+        bands.append(digest >> 1)  # fit in a signed BIGINT
+    return minhash, bands
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def find_duplicates(ticket, threshold=DUPLICATE_THRESHOLD):
+    """Open tickets that are near-duplicates of ticket, most similar first
+
+    Returns a list of (Ticket, similarity).
+    """
+    Ticket = type(ticket)
+    if not ticket.lsh_bands:
+        return []
+
+    candidates = db.session.scalars(
+        select(Ticket)
+        .where(Ticket.lsh_bands.overlap(ticket.lsh_bands))
+        # Open tickets, including ones handed back to the queue (status NULL)
+        .where(Ticket.active.is_(True), Ticket.claimant_id.is_(None))
+        .where(Ticket.id != ticket.id)
+        # Deferred on the model; load it here instead of once per candidate
+        .options(undefer(Ticket.minhash))
+    ).all()
+
+    matches = [(candidate, similarity(ticket.minhash, candidate.minhash)) for candidate in candidates]
+    matches = [(candidate, score) for candidate, score in matches if score >= threshold]
+    return sorted(matches, key=lambda match: (-match[1], match[0].id))
@@ -0,0 +1,204 @@
+# Queue wait-time estimates
+#
+# /api/ticket/status tells a hacker with an unclaimed ticket roughly how long
+# until a mentor picks it up. The estimate is
+#
+#     tickets ahead in the queue (plus this one) / claim rate
+#
+# where the claim rate is the number of claims in the last ETA_WINDOW_MINUTES,
+# or online mentors / ETA_DEFAULT_HELP_MINUTES before there is any history.
+# A tagged ticket can only be taken by the online mentors who list one of its
+# tags as a skill or list no skills at all, so its rate is scaled by their
+# share of the mentors online (server/presence.py).
+#
+# Each worker keeps the open queue (ordered by creation time) and the recent
+# claim waits in memory and updates them from ticket change events
+# (server/events.py), so a status poll costs a binary search, not a scan of
+# the tickets table. Events only carry ids: added or changed tickets are
+# loaded in one query on the next estimate. A "resync" event, an event
+# switch, or ETA_RELOAD_SECONDS without one reloads everything.
+#
+# Ticket timestamps come from the database's now() in its session time zone,
+# so claim times are taken from the database clock too: each reload records
+# how far it is from this worker's clock.
+
+import bisect
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from server import db, events, presence
+from server.log import get_logger
+
+ETA_WINDOW_MINUTES = int(os.environ.get("ETA_WINDOW_MINUTES", "60"))
+ETA_DEFAULT_HELP_MINUTES = float(os.environ.get("ETA_DEFAULT_HELP_MINUTES", "15"))
+# Without the event listener nothing keeps the queue current, so reload often
+ETA_RELOAD_SECONDS = int(os.environ.get("ETA_RELOAD_SECONDS", "300" if events.EVENTS_ENABLED else "10"))
+# Lower bound on the share of mentors who can take a ticket, so niche tags don't wait forever
+MIN_MENTOR_SHARE = 0.25
+
+log = get_logger("eta")
+
+_OPEN_TICKETS = """
+    SELECT id, "createdAt", tags FROM tickets
+    WHERE event_id = current_event_id() AND active AND claimant_id IS NULL
+"""
+
+
+class QueueModel:
+    """The open tickets and recent claims one worker knows about"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []  # sorted (created at, ticket id) of open tickets
+        self.tickets = {}  # ticket id -> (created at, tags)
+        self.claims = deque()  # (claimed at, seconds waited), oldest first
+        self.dirty = set()  # ticket ids to (re)load
+        self.loaded_at = None  # monotonic time of the last full load
+        self.clock_offset = None  # database clock minus this worker's, as of the last full load
+
+    def _add(self, ticket_id, created_at, tags):
+        self._discard(ticket_id)
+        self.tickets[ticket_id] = (created_at, tuple(tags or ()))
+        bisect.insort(self.order, (created_at, ticket_id))
+
+    def _discard(self, ticket_id):
+        entry = self.tickets.pop(ticket_id, None)
+        if entry is not None:
+            index = bisect.bisect_left(self.order, (entry[0], ticket_id))
+            if index < len(self.order) and self.order[index] == (entry[0], ticket_id):
+                del self.order[index]
+        return entry
+
+    def _db_now(self):
+        return datetime.now() + self.clock_offset
+
+    def _prune_claims(self, now):
+        cutoff = now - timedelta(minutes=ETA_WINDOW_MINUTES)
+        while self.claims and self.claims[0][0] < cutoff:
+            self.claims.popleft()
+
+    def on_event(self, event):
+        event_type = event["type"]
+        if event_type in ("resync", "hackathon.changed"):
+            with self.lock:
+                self.loaded_at = None
+        elif event_type == "ticket.claimed":
+            with self.lock:
+                # Before the first load there is nothing to discard; the load picks up the claims
+                if self.clock_offset is None:
+                    return
+                now = self._db_now()
+                for ticket_id in event.get("ids", ()):
+                    entry = self._discard(ticket_id)
+                    self.dirty.discard(ticket_id)
+                    if entry is not None:
+                        self.claims.append((now, (now - entry[0]).total_seconds()))
+                self._prune_claims(now)
+        elif event_type == "ticket.removed":
+            with self.lock:
+                for ticket_id in event.get("ids", ()):
+                    self._discard(ticket_id)
+                    self.dirty.discard(ticket_id)
+        elif event_type in ("ticket.created", "ticket.updated", "ticket.unclaimed"):
+            with self.lock:
+                self.dirty.update(event.get("ids", ()))
+
+    def reload(self, conn):
+        """Replace everything with what the database says"""
+        db_now = conn.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+        clock_offset = db_now - datetime.now()
+        rows = conn.execute(text(_OPEN_TICKETS)).all()
+        claims = conn.execute(
+            text("""
+                SELECT "claimedAt", extract(epoch FROM "claimedAt" - "createdAt") AS waited
+                FROM tickets
+                WHERE event_id = current_event_id() AND "claimedAt" > :since
+                ORDER BY "claimedAt"
+            """),
+            {"since": db_now - timedelta(minutes=ETA_WINDOW_MINUTES)},
+        ).all()
+        with self.lock:
+            self.clock_offset = clock_offset
+            self.order = sorted((row.createdAt, row.id) for row in rows)
+            self.tickets = {row.id: (row.createdAt, tuple(row.tags or ())) for row in rows}
+            self.claims = deque((row.claimedAt, float(row.waited)) for row in claims)
+            self.dirty.clear()
+            self.loaded_at = time.monotonic()
+
+    def stale(self, ticket_id):
+        """Whether the database has to be read before estimating for ticket_id"""
+        with self.lock:
+            if ticket_id not in self.tickets:
+                # Just submitted: its ticket.created event may still be on its way
+                self.dirty.add(ticket_id)
+            return (
+                bool(self.dirty)
+                or self.loaded_at is None
+                or time.monotonic() - self.loaded_at > ETA_RELOAD_SECONDS
+            )
+
+    def load_dirty(self, conn):
+        with self.lock:
+            ids = list(self.dirty)
+            self.dirty.clear()
+        if not ids:
+            return
+        rows = conn.execute(text(_OPEN_TICKETS + " AND id = ANY(:ids)"), {"ids": ids}).all()
+        with self.lock:
+            for ticket_id in ids:
+                self._discard(ticket_id)
+            for row in rows:
+                self._add(row.id, row.createdAt, row.tags)
+
+    def estimate(self, ticket_id, mentors):
+        """Position and expected seconds until claimed; None if the ticket isn't queued"""
+        with self.lock:
+            entry = self.tickets.get(ticket_id)
+            if entry is None:
+                return None
+            created_at, tags = entry
+            position = bisect.bisect_left(self.order, (created_at, ticket_id)) + 1
+            self._prune_claims(self._db_now())
+            queued = len(self.order)
+            claims = len(self.claims)
+            recent_waits = [waited for _, waited in self.claims]
+
+        if claims:
+            rate = claims / (ETA_WINDOW_MINUTES * 60)
+        else:
+            rate = len(mentors) / (ETA_DEFAULT_HELP_MINUTES * 60)
+        if tags and mentors:
+            able = sum(1 for _, _, skills in mentors if not skills or set(skills) & set(tags))
+            rate *= max(able / len(mentors), MIN_MENTOR_SHARE)
+
+        return {
+            "position": position,
+            "queued": queued,
+            "mentorsOnline": len(mentors),
+            "claimsPerHour": round(claims * 60 / ETA_WINDOW_MINUTES, 1),
+            "medianWaitSeconds": round(statistics.median(recent_waits)) if recent_waits else None,
+            # No mentors online and no recent claims: nothing to base a guess on
+            "etaSeconds": round(position / rate) if rate else None,
+        }
+
+
+_model = QueueModel()
+events.subscribe("ticket.", _model.on_event)
+events.subscribe("hackathon.", _model.on_event)
+
+
+def estimate(ticket_id):
+    """Queue position and ETA for an open ticket, or None if it isn't waiting in the queue"""
+    if _model.stale(ticket_id):
+        with db.engine.connect() as conn:
+            if _model.loaded_at is None or time.monotonic() - _model.loaded_at > ETA_RELOAD_SECONDS:
+                _model.reload(conn)
+            else:
+                _model.load_dirty(conn)
+    return _model.estimate(ticket_id, list(presence.online_mentors().values()))
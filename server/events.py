@@ -0,0 +1,185 @@
+# Cross-worker change events over Postgres LISTEN/NOTIFY
+#
+# Controllers publish compact events ({"type": "ticket.claimed", "ids": [12]})
+# as part of the transaction that makes the change; Postgres delivers them to
+# every listener only if that transaction commits. Each worker process keeps
+# one dedicated connection LISTENing on CHANNEL in a background thread and
+# hands events to the callbacks registered with subscribe(), which drop
+# cached state and feed live streams (see stream()). The publishing worker
+# receives its own events the same way, so there is one code path.
+#
+# While a worker is disconnected it can miss events, so after every
+# (re)connect subscribers receive {"type": "resync"} and should drop
+# everything they cache.
+
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+from server import db
+from server.log import get_logger
+
+CHANNEL = "qstack_events"
+EVENTS_ENABLED = os.environ.get("EVENTS_ENABLED", "true").lower() == "true"
+# How often the listener wakes up when idle to notice a dead connection
+POLL_SECONDS = 15
+RECONNECT_MAX_SECONDS = 30
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+STREAM_QUEUE_SIZE = 100
+
+log = get_logger("events")
+
+_handlers = []  # (type prefix, callback)
+_listener = None
+_lock = threading.Lock()
+_engine = None
+
+
+def publish(event_type, connection=None, **fields):
+    """Send an event to every worker when the current transaction commits
+
+    Uses the request's db.session unless another connection is given.
+    """
+    payload = json.dumps({"type": event_type, **fields}, separators=(",", ":"), default=str)
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        log.warning("Dropping oversized %s event (%s bytes)", event_type, len(payload))
+        return
+    (db.session if connection is None else connection).execute(
+        text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload}
+    )
+
+
+def subscribe(prefix, callback):
+    """Call callback(event) for every event whose type starts with prefix
+
+    Callbacks run on the listener thread and must be quick; "resync" events
+    are delivered to every subscriber.
+    """
+    _handlers.append((prefix, callback))
+
+
+def unsubscribe(callback):
+    _handlers[:] = [(prefix, handler) for prefix, handler in _handlers if handler is not callback]
+
+
+def _dispatch(event):
+    event_type = event.get("type", "")
+    for prefix, callback in list(_handlers):
+        if event_type == "resync" or event_type.startswith(prefix):
+            try:
+                callback(event)
+            except Exception:
+                log.exception("Event handler failed for %s", event_type)
+
+
+class Listener(threading.Thread):
+    """LISTENs on a dedicated connection and dispatches notifications"""
+
+    def __init__(self, engine):
+        super().__init__(name="qstack-events", daemon=True)
+        self.engine = engine
+        self.pid = os.getpid()
+
+    def _connect(self):
+        # Taken out of the pool for good: it sits in LISTEN for the life of the process
+        connection = self.engine.raw_connection()
+        connection.detach()
+        conn = connection.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def run(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                log.info("Listening for events on %s", CHANNEL)
+                backoff = 1
+                _dispatch({"type": "resync"})
+                while True:
+                    if select.select([conn], [], [], POLL_SECONDS) == ([], [], []):
+                        # Idle: make sure the connection is still alive
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            event = json.loads(notify.payload)
+                        except ValueError:
+                            log.warning("Ignoring malformed event %r", notify.payload[:200])
+                            continue
+                        _dispatch(event)
+            except Exception as e:
+                log.warning("Event listener disconnected (%s); retrying in %ss", e, backoff)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+
+
+def ensure_listening():
+    """Start this process's listener if it isn't running; cheap enough to call per request
+
+    Threads do not survive fork(), so a worker forked from a preloaded master
+    starts its own listener on its first request.
+    """
+    global _listener
+    if not EVENTS_ENABLED or _engine is None:
+        return
+    if _listener is not None and _listener.pid == os.getpid():
+        return
+    with _lock:
+        if _listener is None or _listener.pid != os.getpid():
+            _listener = Listener(_engine)
+            _listener.start()
+
+
+def init_app(app):
+    global _engine
+    with app.app_context():
+        _engine = db.engine
+    app.before_request(ensure_listening)
+
+
+def stream(prefixes, heartbeat=POLL_SECONDS):
+    """Yield matching events (or None every heartbeat seconds) for a live stream
+
+    Each call registers its own bounded queue; a client too slow to keep up
+    gets a "resync" instead of an ever-growing backlog.
+    """
+    events = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    def deliver(event):
+        if event["type"] != "resync" and not any(event["type"].startswith(prefix) for prefix in prefixes):
+            return
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            with events.mutex:
+                events.queue.clear()
+            events.put_nowait({"type": "resync"})
+
+    subscribe("", deliver)
+    try:
+        while True:
+            try:
+                yield events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield None
+    finally:
+        unsubscribe(deliver)
@@ -1,19 +1,36 @@
 # Firebase Session Authentication for HackPSU Integration
 # This module replaces Plume authentication with HackPSU's Firebase-based session auth
 
-import jwt
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from flask import request, session, redirect, abort
 from functools import wraps
 from server.models import User
-from server import db
-from server.hackpsu_api import get_user_info, get_my_info
+from server import db, events, upstream
+from server.log import get_logger
+from server.profiles import apply_profile
+from server.upstream import UpstreamUnavailable
 
 
 AUTH_SERVER_URL = os.environ.get('AUTH_SERVER_URL', 'http://localhost:3000/api/sessionUser')
 MIN_JUDGE_ROLE = 2  # Minimum role for basic access
 MIN_ADMIN_ROLE = 4  # Minimum role for admin access
 
+log = get_logger("auth")
+
+# Session cookies the auth server accepted recently. Within SESSION_VERIFY_TTL
+# seconds the check is skipped; up to SESSION_STALE_TTL seconds a cached answer
+# is still accepted while the auth server is unavailable.
+SESSION_VERIFY_TTL = int(os.environ.get('SESSION_VERIFY_TTL', '60'))
+SESSION_STALE_TTL = int(os.environ.get('SESSION_STALE_TTL', '900'))
+SESSION_CACHE_SIZE = 10000
+
+_verified_sessions = OrderedDict()  # sha256(cookie) -> monotonic time verified
+_verified_lock = threading.Lock()
+
 """
 Role Levels (from HackPSU NestJS backend):
 0 = NONE (no access)
@@ -26,16 +43,50 @@ Role Levels (from HackPSU NestJS backend):
 
 def decode_session_token(token_string):
     """Decode Firebase session JWT token without verification"""
+    import jwt
+
     try:
         # Decode without verification (we trust the session cookie from our auth server)
         decoded = jwt.decode(token_string, options={"verify_signature": False})
-        print(f"[DEBUG] Decoded token: {decoded}")
+        log.debug("Decoded session token for uid=%s", decoded.get('uid'))
         return decoded
     except Exception as e:
-        print(f"[ERROR] Failed to decode token: {e}")
+        log.error("Failed to decode token: %s", e)
         return None
 
 
+def session_cache_key(session_token):
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+
+def _session_verified_within(session_token, seconds):
+    key = session_cache_key(session_token)
+    with _verified_lock:
+        verified_at = _verified_sessions.get(key)
+    return verified_at is not None and time.monotonic() - verified_at < seconds
+
+
+def _remember_verified_session(session_token):
+    key = session_cache_key(session_token)
+    with _verified_lock:
+        _verified_sessions[key] = time.monotonic()
+        _verified_sessions.move_to_end(key)
+        while len(_verified_sessions) > SESSION_CACHE_SIZE:
+            _verified_sessions.popitem(last=False)
+
+
+def _on_session_event(event):
+    """Forget revoked cookies in every worker, not just the one that logged out"""
+    with _verified_lock:
+        if event["type"] == "resync":
+            _verified_sessions.clear()
+        else:
+            _verified_sessions.pop(event.get("key"), None)
+
+
+events.subscribe("session.", _on_session_event)
+
+
 def verify_hackpsu_session():
     """Verify session with HackPSU auth server and decode JWT for uid"""
     try:
@@ -43,43 +94,44 @@ def verify_hackpsu_session():
         session_token = request.cookies.get('__session')
 
         if not session_token:
-            print("[DEBUG] No __session cookie found")
+            log.debug("No __session cookie found")
             return None
 
-        print(f"[DEBUG] Found __session cookie, verifying with auth server...")
+        log.debug("Found __session cookie, verifying with auth server...")
 
         # First, verify with auth server to ensure session is valid
-        import requests
-        try:
-            response = requests.get(
-                AUTH_SERVER_URL,
-                cookies={'__session': session_token},
-                timeout=5
-            )
-
-            if not response.ok:
-                print(f"[DEBUG] Auth server returned {response.status_code}")
-                return None
-
-            auth_server_data = response.json()
-            print(f"[DEBUG] Auth server validation successful")
-        except Exception as e:
-            print(f"[DEBUG] Auth server verification failed: {e}")
-            return None
+        if _session_verified_within(session_token, SESSION_VERIFY_TTL):
+            log.debug("Session verified recently, skipping auth server")
+        else:
+            try:
+                response = upstream.auth.get(AUTH_SERVER_URL, cookies={'__session': session_token})
+                if response.status_code >= 500:
+                    raise UpstreamUnavailable("auth", f"status {response.status_code}")
+
+                if not response.ok:
+                    log.debug("Auth server returned %s", response.status_code)
+                    return None
+
+                _remember_verified_session(session_token)
+                log.debug("Auth server validation successful")
+            except Exception as e:
+                # Fall back to an earlier verification of this same cookie
+                if not _session_verified_within(session_token, SESSION_STALE_TTL):
+                    log.warning("Auth server verification failed: %s", e)
+                    return None
+                log.warning("Auth server unavailable (%s), using cached verification", e)
 
         # Decode JWT to get uid and custom claims (auth server doesn't return these)
         jwt_data = decode_session_token(session_token)
         if not jwt_data:
-            print("[DEBUG] Failed to decode JWT")
+            log.debug("Failed to decode JWT")
             return None
 
-        print(f"[DEBUG] Decoded JWT: {jwt_data}")
-
         # Extract user ID from JWT (uid field is the Firebase UID)
         uid = jwt_data.get('uid') or jwt_data.get('user_id') or jwt_data.get('sub')
 
         if not uid:
-            print("[DEBUG] No uid found in JWT")
+            log.debug("No uid found in JWT")
             return None
 
         # Extract user info from JWT
@@ -103,14 +155,12 @@ def verify_hackpsu_session():
             'session_token': session_token  # Store session token for later use
         }
 
-        print(f"[DEBUG] Extracted user info: uid={user_info['uid']}, email={user_info['email']}, name={user_info['displayName']}, claims={user_info['customClaims']}")
+        log.debug("Extracted user info: uid=%s, email=%s, name=%s, claims=%s", user_info['uid'], user_info['email'], user_info['displayName'], user_info['customClaims'])
 
         return user_info
 
     except Exception as e:
-        print(f"[ERROR] Session verification failed: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Session verification failed: %s", e)
         return None
 
 
@@ -146,41 +196,40 @@ def hackpsu_auth_required(f):
     """Require HackPSU authentication with basic access permissions"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        print(f"[DEBUG] Auth required for route: {request.path}")
-        print(f"[DEBUG] Cookies: {list(request.cookies.keys())}")
+        log.debug("Auth required for route: %s, cookies: %s", request.path, list(request.cookies.keys()))
 
         # Check if already authenticated in Flask session
         if 'user_id' in session:
             user = User.query.filter_by(id=session['user_id']).first()
             if user:
-                print(f"[DEBUG] User already authenticated via Flask session: {user.id}")
+                log.debug("User already authenticated via Flask session: %s", user.id)
                 return f(*args, **kwargs)
 
         # Check if __session cookie exists
         if not request.cookies.get('__session'):
-            print("[DEBUG] No __session cookie, redirecting to login")
+            log.debug("No __session cookie, redirecting to login")
             auth_login_url = os.environ.get('AUTH_LOGIN_URL', 'http://localhost:3000/login')
             from server.config import FRONTEND_URL
             redirect_url = f'{auth_login_url}?returnTo={FRONTEND_URL}'
             return redirect(redirect_url)
 
         # Verify __session cookie with auth server
-        print("[DEBUG] __session cookie found, verifying with auth server...")
+        log.debug("__session cookie found, verifying with auth server...")
         user_data = verify_hackpsu_session()
 
         if not user_data:
-            print("[DEBUG] __session cookie invalid or expired, redirecting to login")
+            log.debug("__session cookie invalid or expired, redirecting to login")
             auth_login_url = os.environ.get('AUTH_LOGIN_URL', 'http://localhost:3000/login')
             from server.config import FRONTEND_URL
             redirect_url = f'{auth_login_url}?returnTo={FRONTEND_URL}'
             return redirect(redirect_url)
 
-        print(f"[DEBUG] User data received: {user_data.get('email')}")
+        log.debug("User data received: %s", user_data.get('email'))
 
         # Check if user has sufficient privileges
         if not check_access_permission(user_data):
             privilege = extract_user_privilege(user_data)
-            print(f"[DEBUG] Insufficient privileges: {privilege} < {os.environ.get('MIN_ACCESS_ROLE', MIN_JUDGE_ROLE)}")
+            log.debug("Insufficient privileges: %s < %s", privilege, os.environ.get('MIN_ACCESS_ROLE', MIN_JUDGE_ROLE))
             return {
                 'error': f'You need organizer permissions (level 2+) to access QStack. Your current level: {privilege}'
             }, 403
@@ -188,7 +237,7 @@ def hackpsu_auth_required(f):
         # Get or create QStack user
         user = sync_user_from_auth_server(user_data)
         if not user:
-            print(f"[DEBUG] User creation failed")
+            log.debug("User creation failed")
             return {
                 'error': 'Failed to create user account. Please contact an admin.'
             }, 403
@@ -198,12 +247,12 @@ def hackpsu_auth_required(f):
         session['user_name'] = user_data.get('displayName', 'User')
         session['user_email'] = user_data.get('email', '')
 
-        print(f"[DEBUG] Auth successful, session set for: {user.id}")
+        log.debug("Auth successful, session set for: %s", user.id)
 
         # Check if Discord or phone number is connected
         has_contact = (user.discord and user.discord.strip() != '') or (user.phone and user.phone.strip() != '')
         if not has_contact:
-            print(f"[DEBUG] User {user.id} has no Discord or phone connected, needs to connect")
+            log.debug("User %s has no Discord or phone connected, needs to connect", user.id)
             from server.config import FRONTEND_URL
             # Return JSON response indicating contact info is required
             # Frontend will handle showing the connect screen
@@ -278,13 +327,18 @@ def sync_user_from_auth_server(user_data):
             phone=''
         )
         db.session.add(user)
-        db.session.commit()
-        print(f"[DEBUG] Created new user: {uid} with role {role}")
-    else:
+        log.debug("Created new user: %s with role %s", uid, role)
+    elif user.role != role:
         # Update existing user role if privilege changed
-        if user.role != role:
-            user.role = role
-            db.session.commit()
-            print(f"[DEBUG] Updated user role: {uid} -> {role}")
+        user.role = role
+        log.debug("Updated user role: %s -> %s", uid, role)
+
+    # Refresh the stored profile from the verified session
+    apply_profile(user, {
+        'name': user_data.get('displayName'),
+        'email': user_data.get('email'),
+        'privilege': privilege,
+    })
+    db.session.commit()
 
     return user
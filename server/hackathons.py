@@ -0,0 +1,178 @@
+# Hackathon events
+#
+# QStack is reused every event, and tickets and ratings are partitioned by
+# event (migrations/0008_events.sql). Exactly one event is current: new rows
+# go into it, and every ORM query for tickets is limited to it, so the queue,
+# leaderboard and admin views only see this event's partition. Pass
+# execution_options(all_events=True) to a query to look across events.
+#
+# Creating an event adds its partitions and makes it current. Closing one
+# (never the current one: new tickets need an event) detaches its tickets
+# partition (a quick catalog change that takes it out of every live query),
+# then copies the rows into tickets_archive and drops the detached table.
+# The copy runs after the detach has committed, so the live table isn't
+# locked meanwhile; if it fails, closing the event again picks it up.
+# Ratings stay attached for all-time views.
+#
+# Not to be confused with server/events.py, the change-event bus; switching
+# the current event is announced on it so every worker picks it up at once.
+
+import os
+import threading
+import time
+
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from server import archive, db, events
+from server.log import get_logger
+
+# How long a worker trusts its idea of the current event without asking
+CURRENT_EVENT_TTL = int(os.environ.get("CURRENT_EVENT_TTL", "60"))
+
+log = get_logger("hackathons")
+
+_current = None  # (event id, fetched at)
+_current_lock = threading.Lock()
+
+
+def current_event_id():
+    """Id of the current event (None if there is none), cached per process"""
+    global _current
+    cached = _current
+    if cached is not None and time.monotonic() - cached[1] < CURRENT_EVENT_TTL:
+        return cached[0]
+    with _current_lock:
+        # Own connection: this runs inside ORM query hooks
+        with db.engine.connect() as conn:
+            event_id = conn.execute(text("SELECT id FROM events WHERE is_current")).scalar()
+        _current = (event_id, time.monotonic())
+    return event_id
+
+
+def _forget_current(event):
+    global _current
+    _current = None
+
+
+events.subscribe("hackathon.", _forget_current)
+
+
+def _scope_to_current_event(state):
+    """Limit ORM SELECTs of tickets to the current event's partition"""
+    if not state.is_select or state.execution_options.get("all_events", False):
+        return
+    from server.models import Ticket
+
+    event_id = current_event_id()
+    if event_id is None:
+        return
+    state.statement = state.statement.options(
+        with_loader_criteria(Ticket, Ticket.event_id == event_id, include_aliases=True)
+    )
+
+
+def init_app(app):
+    if not sa_event.contains(Session, "do_orm_execute", _scope_to_current_event):
+        sa_event.listen(Session, "do_orm_execute", _scope_to_current_event)
+
+
+def mentor_stats(event_id=None):
+    """{mentor id: (tickets resolved, number of ratings, average rating)} for one event
+
+    Defaults to the current event; counts archived tickets too. Read from the
+    mentor_event_stats view, which the scheduler refreshes every minute
+    (server/scheduler.py). Mentors with neither ratings nor resolved tickets
+    are left out.
+    """
+    if event_id is None:
+        event_id = current_event_id()
+    rows = db.session.execute(
+        text("SELECT mentor_id, resolved, ratings, average_rating FROM mentor_event_stats WHERE event_id = :event_id"),
+        {"event_id": event_id},
+    ).all()
+    return {
+        row.mentor_id: (row.resolved, row.ratings, float(row.average_rating) if row.average_rating is not None else None)
+        for row in rows
+    }
+
+
+def _partition(table, event_id):
+    return f"{table}_e{int(event_id)}"
+
+
+def create_event(name, make_current=True):
+    """Create an event with its partitions; returns the Event"""
+    from server.models import Event
+
+    event = Event(name=name, is_current=False)
+    db.session.add(event)
+    db.session.flush()
+    for table in ("tickets", "ratings"):
+        db.session.execute(text(
+            f"CREATE TABLE {_partition(table, event.id)} PARTITION OF {table} FOR VALUES IN ({int(event.id)})"
+        ))
+    if make_current:
+        _set_current(event.id)
+    db.session.commit()
+    log.info("Created event %s (%s)", event.id, name)
+    return event
+
+
+def _set_current(event_id):
+    from server.models import Event
+
+    # Two statements: the unique index allows only one current row at a time
+    db.session.execute(
+        Event.__table__.update().where(Event.is_current).values(is_current=False)
+    )
+    db.session.execute(
+        Event.__table__.update().where(Event.id == event_id).values(is_current=True)
+    )
+    # Drafts and open tickets belong to the old event; nobody starts the new one with a ticket
+    db.session.execute(text("UPDATE users SET ticket_id = NULL WHERE ticket_id IS NOT NULL"))
+    events.publish("hackathon.changed", id=event_id)
+
+
+def set_current_event(event_id):
+    _set_current(event_id)
+    db.session.commit()
+
+
+def close_event(event_id):
+    """Take an event's tickets out of the live table and archive them
+
+    Returns the number of tickets archived. Closing an event whose archiving
+    failed part way finishes it.
+    """
+    from server.models import Event
+
+    event = db.session.get(Event, event_id)
+    if event is None:
+        raise ValueError(f"No event {event_id}")
+    if event.is_current:
+        raise ValueError("Make another event current before closing this one")
+
+    partition = _partition("tickets", event_id)
+    if event.closed_at is not None:
+        # Detached by an earlier close; the table is dropped once it has been archived
+        if db.session.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar() is None:
+            raise ValueError(f"Event {event_id} is already closed")
+        log.info("Resuming archive of closed event %s", event_id)
+    else:
+        # Nothing may point at tickets that are about to leave the live table
+        db.session.execute(text(f"UPDATE users SET ticket_id = NULL WHERE ticket_id IN (SELECT id FROM {partition})"))
+        db.session.execute(text(f"ALTER TABLE tickets DETACH PARTITION {partition}"))
+        event.closed_at = db.func.timezone("utc", db.func.now())
+        db.session.commit()
+
+    # Copy and drop together: the table only goes away once its rows are archived
+    columns = ", ".join(archive.COLUMNS)
+    moved = db.session.execute(text(f"""
+        INSERT INTO tickets_archive ({columns}) SELECT {columns} FROM {partition}
+        ON CONFLICT (id) DO NOTHING
+    """)).rowcount
+    db.session.execute(text(f"DROP TABLE {partition}"))
+    db.session.commit()
+    log.info("Closed event %s; archived %s tickets", event_id, moved)
+    return moved
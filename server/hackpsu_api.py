@@ -1,14 +1,18 @@
 # HackPSU API Client
 # Replaces Plume for fetching user information
 
-import requests
 import os
 from typing import Dict, List, Optional
-from flask import request
+from flask import request, has_request_context
+from server import upstream
+from server.log import get_logger
+from server.upstream import UpstreamUnavailable
 
 HACKPSU_API_URL = os.environ.get('HACKPSU_API_URL', 'https://apiv3.hackpsu.org')
 FIREBASE_API_KEY = os.environ.get('FIREBASE_API_KEY')
 
+log = get_logger("hackpsu")
+
 
 def get_firebase_id_token_from_session_cookie() -> Optional[str]:
     """Get Firebase ID token by exchanging session cookie with auth server
@@ -21,7 +25,7 @@ def get_firebase_id_token_from_session_cookie() -> Optional[str]:
 
     session_cookie = request.cookies.get('__session')
     if not session_cookie:
-        print("[DEBUG] No __session cookie found")
+        log.debug("No __session cookie found")
         return None
 
     try:
@@ -29,60 +33,57 @@ def get_firebase_id_token_from_session_cookie() -> Optional[str]:
         auth_base_url = AUTH_SERVER_URL.replace('/api/sessionUser', '')
         session_user_url = f"{auth_base_url}/api/sessionUser"
 
-        print(f"[DEBUG] Fetching custom token from {session_user_url}")
-        response = requests.get(
-            session_user_url,
-            cookies={'__session': session_cookie},
-            timeout=5
-        )
+        log.debug("Fetching custom token from %s", session_user_url)
+        response = upstream.auth.get(session_user_url, cookies={'__session': session_cookie})
 
         if not response.ok:
-            print(f"[DEBUG] Auth server returned {response.status_code}: {response.text[:200]}")
+            log.debug("Auth server returned %s: %s", response.status_code, response.text[:200])
             return None
 
         data = response.json()
         custom_token = data.get('customToken')
         if not custom_token:
-            print("[DEBUG] No customToken in response")
+            log.debug("No customToken in response")
             return None
 
-        print(f"[DEBUG] Got custom token from auth server (length: {len(custom_token)})")
+        log.debug("Got custom token from auth server (length: %s)", len(custom_token))
 
         # Step 2: Exchange custom token for ID token using Firebase Auth REST API
         if not FIREBASE_API_KEY:
-            print("[ERROR] FIREBASE_API_KEY not set in environment")
+            log.error("FIREBASE_API_KEY not set in environment")
             return None
 
         firebase_auth_url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithCustomToken?key={FIREBASE_API_KEY}"
 
-        print(f"[DEBUG] Exchanging custom token for ID token with Firebase")
-        firebase_response = requests.post(
+        log.debug("Exchanging custom token for ID token with Firebase")
+        firebase_response = upstream.firebase.post(
             firebase_auth_url,
+            detail="signInWithCustomToken",
             json={
                 'token': custom_token,
                 'returnSecureToken': True
             },
-            timeout=5
         )
 
         if not firebase_response.ok:
-            print(f"[DEBUG] Firebase auth returned {firebase_response.status_code}: {firebase_response.text[:200]}")
+            log.debug("Firebase auth returned %s: %s", firebase_response.status_code, firebase_response.text[:200])
             return None
 
         firebase_data = firebase_response.json()
         id_token = firebase_data.get('idToken')
 
         if id_token:
-            print(f"[DEBUG] Got Firebase ID token (length: {len(id_token)})")
+            log.debug("Got Firebase ID token (length: %s)", len(id_token))
             return id_token
         else:
-            print("[DEBUG] No idToken in Firebase response")
+            log.debug("No idToken in Firebase response")
             return None
 
+    except UpstreamUnavailable as e:
+        log.warning("Skipping Firebase ID token exchange: %s", e)
+        return None
     except Exception as e:
-        print(f"[DEBUG] Failed to get Firebase ID token: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Failed to get Firebase ID token: %s", e)
         return None
 
 
@@ -98,7 +99,7 @@ def get_bearer_token() -> Optional[str]:
     # Try session first (cached token)
     if 'firebase_id_token' in flask_session:
         token = flask_session['firebase_id_token']
-        print(f"[DEBUG] Bearer token from session cache (length: {len(token)})")
+        log.debug("Bearer token from session cache (length: %s)", len(token))
         return token
 
     # Get fresh token from auth server
@@ -106,10 +107,10 @@ def get_bearer_token() -> Optional[str]:
     if token:
         # Cache it in session for future requests
         flask_session['firebase_id_token'] = token
-        print(f"[DEBUG] Cached new token in session")
+        log.debug("Cached new token in session")
         return token
 
-    print("[DEBUG] No Firebase ID token available")
+    log.debug("No Firebase ID token available")
     return None
 
 
@@ -133,12 +134,12 @@ def get_user_info(user_ids: List[str], token: Optional[str] = None) -> Dict[str,
     if not token:
         token = get_bearer_token()
 
-    print(f"[DEBUG] Token being used for get_user_info: {'Present' if token else 'None'}")
+    log.debug("Token being used for get_user_info: %s", 'Present' if token else 'None')
 
     headers = {}
     if token:
         headers['Authorization'] = f'Bearer {token}'
-        print(f"[DEBUG] Authorization header set with Bearer token")
+        log.debug("Authorization header set with Bearer token")
 
     user_info_map = {}
     token_refreshed = False  # Track if we've already tried refreshing the token
@@ -151,18 +152,15 @@ def get_user_info(user_ids: List[str], token: Optional[str] = None) -> Dict[str,
         try:
             # Try organizer endpoint first (for admins/organizers)
             organizer_url = f"{HACKPSU_API_URL}/organizers/{user_id}"
-            print(f"[DEBUG] Fetching organizer info from {organizer_url}")
-            if headers.get('Authorization'):
-                auth_header = headers['Authorization']
-                print(f"[DEBUG] Authorization header: {auth_header[:20]}... (length: {len(auth_header)})")
-            else:
-                print(f"[DEBUG] No Authorization header!")
-            response = requests.get(organizer_url, headers=headers, timeout=5)
-            print(f"[DEBUG] Response status: {response.status_code}")
+            log.debug("Fetching organizer info from %s", organizer_url)
+            if not headers.get('Authorization'):
+                log.debug("No Authorization header!")
+            response = upstream.hackpsu.get(organizer_url, headers=headers)
+            log.debug("Response status: %s", response.status_code)
 
             # If we get 403 and haven't refreshed token yet, try refreshing and retrying
-            if response.status_code == 403 and not token_refreshed and 'firebase_id_token' in flask_session:
-                print(f"[DEBUG] Organizer endpoint returned 403 for {user_id}, token may be expired. Refreshing...")
+            if response.status_code == 403 and not token_refreshed and has_request_context() and 'firebase_id_token' in flask_session:
+                log.debug("Organizer endpoint returned 403 for %s, token may be expired. Refreshing...", user_id)
                 # Clear the cached token
                 del flask_session['firebase_id_token']
                 # Get a fresh token
@@ -171,12 +169,12 @@ def get_user_info(user_ids: List[str], token: Optional[str] = None) -> Dict[str,
                     flask_session['firebase_id_token'] = new_token
                     headers['Authorization'] = f'Bearer {new_token}'
                     token_refreshed = True
-                    print(f"[DEBUG] Token refreshed, retrying organizer endpoint for {user_id}")
+                    log.debug("Token refreshed, retrying organizer endpoint for %s", user_id)
                     # Retry the request with new token
-                    response = requests.get(organizer_url, headers=headers, timeout=5)
-                    print(f"[DEBUG] Retry response status: {response.status_code}")
+                    response = upstream.hackpsu.get(organizer_url, headers=headers)
+                    log.debug("Retry response status: %s", response.status_code)
                 else:
-                    print(f"[DEBUG] Failed to refresh token")
+                    log.debug("Failed to refresh token")
 
             if response.ok:
                 try:
@@ -192,25 +190,25 @@ def get_user_info(user_ids: List[str], token: Optional[str] = None) -> Dict[str,
                             'team': organizer_data.get('team', ''),
                             'isOrganizer': True
                         }
-                        print(f"[DEBUG] Successfully fetched organizer info for {user_id}: {user_info_map[user_id]}")
+                        log.debug("Successfully fetched organizer info for %s", user_id)
                         organizer_success = True
                         continue
                     else:
-                        print(f"[DEBUG] Organizer endpoint returned empty data for {user_id}")
+                        log.debug("Organizer endpoint returned empty data for %s", user_id)
                 except Exception as json_err:
-                    print(f"[DEBUG] Failed to parse organizer response for {user_id}: {json_err}")
+                    log.debug("Failed to parse organizer response for %s: %s", user_id, json_err)
             else:
-                print(f"[DEBUG] Organizer endpoint returned {response.status_code} for {user_id}")
+                log.debug("Organizer endpoint returned %s for %s", response.status_code, user_id)
         except Exception as e:
-            print(f"[DEBUG] Exception fetching organizer info for {user_id}: {e}")
+            log.debug("Exception fetching organizer info for %s: %s", user_id, e)
 
         # If organizer fetch failed, try /users/{id} endpoint
         if not organizer_success:
             try:
                 user_url = f"{HACKPSU_API_URL}/users/{user_id}"
-                print(f"[DEBUG] Fetching user info from {user_url}")
-                response = requests.get(user_url, headers=headers, timeout=5)
-                print(f"[DEBUG] Response status: {response.status_code}")
+                log.debug("Fetching user info from %s", user_url)
+                response = upstream.hackpsu.get(user_url, headers=headers)
+                log.debug("Response status: %s", response.status_code)
 
                 if response.ok:
                     try:
@@ -227,20 +225,20 @@ def get_user_info(user_ids: List[str], token: Optional[str] = None) -> Dict[str,
                                 'privilege': 0,  # Regular users have privilege 0
                                 'isOrganizer': False
                             }
-                            print(f"[DEBUG] Successfully fetched user info for {user_id}: {user_info_map[user_id]}")
+                            log.debug("Successfully fetched user info for %s", user_id)
                             continue
                         else:
-                            print(f"[DEBUG] /users/{id} endpoint returned empty data for {user_id}")
+                            log.debug("/users endpoint returned empty data for %s", user_id)
                     except Exception as json_err:
-                        print(f"[DEBUG] Failed to parse user response for {user_id}: {json_err}")
+                        log.debug("Failed to parse user response for %s: %s", user_id, json_err)
                 else:
-                    print(f"[DEBUG] /users/{id} endpoint returned {response.status_code} for {user_id}")
+                    log.debug("/users endpoint returned %s for %s", response.status_code, user_id)
             except Exception as e:
-                print(f"[DEBUG] Exception fetching user info for {user_id}: {e}")
+                log.debug("Exception fetching user info for %s: %s", user_id, e)
 
         # Only use default if both methods failed
         if user_id not in user_info_map:
-            print(f"[DEBUG] Both organizer and user endpoints failed, using default for {user_id}")
+            log.debug("Both organizer and user endpoints failed, using default for %s", user_id)
             user_info_map[user_id] = {
                 'name': 'User',
                 'email': '',
@@ -267,22 +265,22 @@ def get_my_info(token: Optional[str] = None) -> Optional[Dict]:
     if not token:
         token = get_bearer_token()
 
-    print(f"[DEBUG] Token being used for get_my_info: {'Present' if token else 'None'}")
+    log.debug("Token being used for get_my_info: %s", 'Present' if token else 'None')
 
     headers = {}
     if token:
         headers['Authorization'] = f'Bearer {token}'
-        print(f"[DEBUG] Authorization header set for /users/info/me")
+        log.debug("Authorization header set for /users/info/me")
 
     try:
         user_url = f"{HACKPSU_API_URL}/users/info/me"
-        print(f"[DEBUG] Fetching user info from {user_url}")
-        response = requests.get(user_url, headers=headers, timeout=5)
-        print(f"[DEBUG] Response status for /users/info/me: {response.status_code}")
+        log.debug("Fetching user info from %s", user_url)
+        response = upstream.hackpsu.get(user_url, headers=headers)
+        log.debug("Response status for /users/info/me: %s", response.status_code)
 
         if response.ok:
             user_data = response.json()
-            print(f"[DEBUG] Successfully fetched /users/info/me: {user_data}")
+            log.debug("Successfully fetched /users/info/me")
             return {
                 'name': f"{user_data.get('firstName', '')} {user_data.get('lastName', '')}".strip(),
                 'email': user_data.get('email', ''),
@@ -295,8 +293,8 @@ def get_my_info(token: Optional[str] = None) -> Optional[Dict]:
                 'isOrganizer': False
             }
         else:
-            print(f"[DEBUG] /users/info/me returned {response.status_code}: {response.text[:200]}")
+            log.debug("/users/info/me returned %s: %s", response.status_code, response.text[:200])
     except Exception as e:
-        print(f"[DEBUG] Exception fetching /users/info/me: {e}")
+        log.debug("Exception fetching /users/info/me: %s", e)
 
     return None
@@ -0,0 +1,87 @@
+# Idempotency keys
+#
+# The client sends an Idempotency-Key header with ticket submits and ratings
+# and reuses it when it retries, so a retry after a dropped response doesn't
+# create a second ticket or rate the mentor twice.
+#
+# The key is claimed with an INSERT ... ON CONFLICT DO NOTHING in the
+# request's own transaction, and the handler stores its response with
+# save_response() just before its single commit. So either both the work and
+# the key are committed or neither is:
+#   - first attempt: the insert wins and the handler runs as usual
+#   - retry after a commit: the stored response is replayed, nothing runs
+#   - retry while the first attempt is still running: Postgres makes the
+#     insert wait on the uncommitted row, then it goes one of the ways above
+#   - failed attempt (4xx/5xx): rolled back with the key, so a retry runs again
+# Requests without the header are not deduplicated. Keys older than
+# IDEMPOTENCY_TTL_HOURS are deleted by the scheduler (server/scheduler.py).
+
+import functools
+import os
+
+from apiflask import abort
+from flask import current_app, g, request, session
+from sqlalchemy import text
+
+from server import db
+
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(endpoint):
+    """Replay the stored response for a repeated Idempotency-Key instead of running the view again
+
+    Goes under auth_required_decorator: keys are per user.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get("Idempotency-Key")
+            if not key:
+                return func(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return abort(400, "Idempotency-Key is too long")
+
+            claimed = db.session.execute(
+                text("""
+                    INSERT INTO idempotency_keys (user_id, key, endpoint) VALUES (:user_id, :key, :endpoint)
+                    ON CONFLICT DO NOTHING
+                    RETURNING key
+                """),
+                {"user_id": session["user_id"], "key": key, "endpoint": endpoint},
+            ).scalar()
+            if claimed is None:
+                row = db.session.execute(
+                    text("SELECT endpoint, response FROM idempotency_keys WHERE user_id = :user_id AND key = :key"),
+                    {"user_id": session["user_id"], "key": key},
+                ).one()
+                db.session.rollback()
+                if row.endpoint != endpoint:
+                    return abort(422, "Idempotency-Key was already used for a different request")
+                if row.response is None:
+                    # Only if a view claimed the key but committed without save_response()
+                    return abort(409, "Idempotency-Key has no stored response")
+                response = current_app.json.response(row.response)
+                response.headers["Idempotent-Replayed"] = "true"
+                return response
+
+            g.idempotency_key = key
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def save_response(response):
+    """Store the response for this request's key, if it has one; call before committing"""
+    key = g.pop("idempotency_key", None)
+    if key is not None:
+        db.session.execute(
+            text("UPDATE idempotency_keys SET response = CAST(:response AS JSONB) WHERE user_id = :user_id AND key = :key"),
+            {"response": current_app.json.dumps(response), "user_id": session["user_id"], "key": key},
+        )
+    return response
+
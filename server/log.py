@@ -0,0 +1,206 @@
+# Structured logging for QStack
+#
+# Loggers live under "qstack.<category>". Records are handed to a bounded
+# in-memory queue and formatted, redacted and written by a background thread,
+# so logging on the request path never waits on stdout. Use %-style arguments
+# (log.debug("user %s", uid)) so nothing is formatted when the level is off.
+#
+# Environment:
+#   LOG_LEVEL          default level for all categories (INFO)
+#   LOG_LEVELS         per-category overrides, e.g. "auth=DEBUG,perf=WARNING"
+#   LOG_SAMPLE         keep only a fraction of DEBUG/INFO records per category,
+#                      e.g. "perf=0.1,hackpsu=0.05"
+#   LOG_FORMAT         "json" (default) or "text"
+#   LOG_CONTROL_FILE   JSON file of level overrides written by
+#                      POST /api/admin/loglevel and picked up by every worker
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+ROOT = "qstack"
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_CONTROL_FILE = os.environ.get("LOG_CONTROL_FILE", "/tmp/qstack-log-levels.json")
+CONTROL_CHECK_SECONDS = 5
+QUEUE_SIZE = 10000
+
+REDACTED = "[redacted]"
+SENSITIVE_KEYS = re.compile(r"token|cookie|session|authorization|password|secret|jwt", re.I)
+JWT_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+BEARER_PATTERN = re.compile(r"(Bearer\s+)[\w.\-]+", re.I)
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _parse_mapping(value):
+    result = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        key, _, val = item.partition("=")
+        result[key.strip()] = val.strip()
+    return result
+
+
+def get_logger(category):
+    return logging.getLogger(f"{ROOT}.{category}")
+
+
+def redact(value):
+    """Mask tokens, cookies and JWTs in a string, dict or list"""
+    if isinstance(value, str):
+        return BEARER_PATTERN.sub(r"\1" + REDACTED, JWT_PATTERN.sub(REDACTED, value))
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and SENSITIVE_KEYS.search(key) else redact(val)
+            for key, val in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records per category; warnings always pass"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {f"{ROOT}.{name}": float(rate) for name, rate in rates.items()}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        fields = {key: val for key, val in vars(record).items() if key not in _STANDARD_ATTRS}
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers all formatting to the listener and drops on overflow"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+_listener = None
+_lock = threading.Lock()
+_control_checked = 0.0
+_control_mtime = None
+_base_levels = {}
+_overridden = set()
+
+
+def _apply_levels(levels):
+    root = logging.getLogger(ROOT)
+    for category, level in levels.items():
+        logger = root if category in ("", "*", ROOT) else get_logger(category)
+        logger.setLevel(level.upper())
+
+
+def configure_logging():
+    """Install the queue handler on the qstack logger (once per process)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        root = logging.getLogger(ROOT)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _base_levels.update(_parse_mapping(os.environ.get("LOG_LEVELS")))
+        _apply_levels(_base_levels)
+
+        stream = logging.StreamHandler(sys.stderr)
+        if LOG_FORMAT == "text":
+            stream.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        else:
+            stream.setFormatter(JSONFormatter())
+
+        records = queue.Queue(maxsize=QUEUE_SIZE)
+        handler = NonBlockingQueueHandler(records)
+        handler.addFilter(SamplingFilter(_parse_mapping(os.environ.get("LOG_SAMPLE"))))
+        root.handlers = [handler]
+
+        _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def restart_after_fork():
+    """The listener thread does not survive fork(); start a fresh one in the child"""
+    global _listener
+    with _lock:
+        _listener = None
+    configure_logging()
+
+
+def set_levels(levels):
+    """Persist level overrides so every worker picks them up"""
+    tmp = f"{LOG_CONTROL_FILE}.{os.getpid()}"
+    with open(tmp, "w") as file:
+        json.dump(levels, file)
+    os.replace(tmp, LOG_CONTROL_FILE)
+    check_control_file(force=True)
+
+
+def check_control_file(force=False):
+    """Apply LOG_CONTROL_FILE if it changed; cheap enough to call per request"""
+    global _control_checked, _control_mtime
+    now = time.monotonic()
+    if not force and now - _control_checked < CONTROL_CHECK_SECONDS:
+        return
+    _control_checked = now
+    try:
+        mtime = os.stat(LOG_CONTROL_FILE).st_mtime
+    except OSError:
+        return
+    if mtime == _control_mtime:
+        return
+    _control_mtime = mtime
+    try:
+        with open(LOG_CONTROL_FILE) as file:
+            levels = json.load(file)
+        for category in _overridden - set(levels):
+            _apply_levels({category: _base_levels.get(category, "NOTSET")})
+        logging.getLogger(ROOT).setLevel(LOG_LEVEL)
+        _apply_levels({**_base_levels, **levels})
+        _overridden.clear()
+        _overridden.update(levels)
+    except (OSError, ValueError) as e:
+        get_logger("log").warning("Ignoring unreadable %s: %s", LOG_CONTROL_FILE, e)
@@ -0,0 +1,149 @@
+# Prometheus metrics for QStack
+#
+# Gunicorn runs several worker processes, so counters and histograms are
+# written to PROMETHEUS_MULTIPROC_DIR (set by start.prod.sh) and /metrics
+# merges every worker's files on each scrape. Queue gauges are read from
+# Postgres at scrape time, so they are correct whichever worker answers.
+
+import os
+
+from flask import Response, has_app_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from server.log import get_logger
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Mentors who claimed a ticket within this many minutes count as active
+ACTIVE_MENTOR_WINDOW_MINUTES = int(os.environ.get("ACTIVE_MENTOR_WINDOW_MINUTES", "30"))
+
+log = get_logger("metrics")
+
+REQUEST_LATENCY = Histogram(
+    "qstack_request_duration_seconds",
+    "Time spent serving /api requests",
+    ["endpoint", "method", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "qstack_upstream_duration_seconds",
+    "Time spent in outbound calls to upstream services",
+    ["service"],
+)
+UPSTREAM_REJECTED = Counter(
+    "qstack_upstream_rejected_total",
+    "Upstream calls skipped because the circuit was open or the request deadline had passed",
+    ["service", "reason"],
+)
+UPSTREAM_HEDGED = Counter(
+    "qstack_upstream_hedged_total", "Upstream GETs that were slow enough to send a hedge request", ["service"]
+)
+TICKET_CLAIMS = Counter("qstack_ticket_claims_total", "Tickets claimed by mentors")
+TICKET_UNCLAIMS = Counter("qstack_ticket_unclaims_total", "Tickets handed back to the queue")
+CLAIM_CONFLICTS = Counter(
+    "qstack_ticket_claim_conflicts_total", "Claims rejected because the ticket was already claimed"
+)
+DUPLICATE_TICKETS = Counter(
+    "qstack_duplicate_tickets_total", "Submitted tickets grouped with an open near-duplicate"
+)
+NOTIFICATIONS = Counter("qstack_notifications_total", "Gotify notifications", ["result"])
+JOB_DURATION = Histogram("qstack_job_duration_seconds", "Time spent in scheduled job runs", ["job"])
+JOB_ROWS = Counter("qstack_job_rows_total", "Rows changed by scheduled jobs", ["job"])
+JOB_FAILURES = Counter("qstack_job_failures_total", "Scheduled job runs that raised", ["job"])
+COALESCED = Counter(
+    "qstack_coalesced_requests_total",
+    "Requests for shared views by where the result came from (fresh, stale, joined, shared, computed)",
+    ["view", "source"],
+)
+
+
+class QueueCollector:
+    """Ticket and mentor gauges computed from the database on each scrape"""
+
+    def describe(self):
+        # Registering would otherwise call collect() to find the metric names,
+        # usually before there is an app context or a database to query
+        return []
+
+    def collect(self):
+        if not has_app_context():
+            return
+        from sqlalchemy import text
+        from server import db, presence
+
+        try:
+            row = db.session.execute(text(f"""
+                SELECT
+                    count(*) FILTER (WHERE claimant_id IS NULL AND active) AS open,
+                    count(*) FILTER (WHERE status = 'claimed') AS claimed,
+                    count(*) FILTER (WHERE status = 'awaiting_feedback') AS awaiting_feedback,
+                    count(DISTINCT claimant_id) FILTER (
+                        WHERE status = 'claimed'
+                           OR "claimedAt" > now() - interval '{ACTIVE_MENTOR_WINDOW_MINUTES} minutes'
+                    ) AS active_mentors
+                FROM tickets
+                WHERE event_id = current_event_id()
+            """)).one()
+            by_location = presence.counts()["byLocation"]
+        except Exception:
+            log.exception("Could not read queue gauges")
+            return
+        finally:
+            db.session.rollback()
+
+        tickets = GaugeMetricFamily("qstack_tickets", "Tickets currently in each state", labels=["state"])
+        tickets.add_metric(["open"], row.open)
+        tickets.add_metric(["claimed"], row.claimed)
+        tickets.add_metric(["awaiting_feedback"], row.awaiting_feedback)
+        yield tickets
+        yield GaugeMetricFamily(
+            "qstack_active_mentors",
+            f"Mentors holding a ticket or who claimed one in the last {ACTIVE_MENTOR_WINDOW_MINUTES} minutes",
+            value=row.active_mentors,
+        )
+
+        online = GaugeMetricFamily(
+            "qstack_mentors_online", "Mentors with a heartbeat in the last PRESENCE_TTL seconds", labels=["location"]
+        )
+        for location, count in by_location.items():
+            online.add_metric([location], count)
+        yield online
+
+
+queue_collector = QueueCollector()
+if not MULTIPROC_DIR:
+    REGISTRY.register(queue_collector)
+
+
+def observe_request(endpoint, method, status, seconds):
+    REQUEST_LATENCY.labels(endpoint or "unknown", method, str(status)).observe(seconds)
+
+
+def observe_upstream(service, seconds):
+    UPSTREAM_LATENCY.labels(service).observe(seconds)
+
+
+def metrics_view():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("Unauthorized", status=401)
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(queue_collector)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,112 @@
+# Versioned schema migrations
+#
+# Migrations are the numbered .sql files in server/migrations, applied in
+# order, each in its own transaction, and recorded in schema_migrations.
+# A Postgres advisory lock makes concurrent runs wait for each other, so it is
+# safe for several processes to start at once; only the first applies anything.
+#
+#   python -m server.migrate            # apply pending migrations
+#   python -m server.migrate --status   # list applied and pending migrations
+#
+# start.prod.sh runs this once before starting Gunicorn. Workers never touch
+# the schema.
+
+import argparse
+import re
+from pathlib import Path
+
+from server import db
+from server.log import get_logger
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+# Arbitrary key for pg_advisory_lock, shared by every migrate run
+LOCK_ID = 7_420_350
+
+log = get_logger("migrate")
+
+
+def available():
+    """[(version, name, path)] for every migration file, in order"""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = re.match(r"(\d+)_(.+)\.sql$", path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return migrations
+
+
+def _applied(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INTEGER PRIMARY KEY,
+            name        TEXT NOT NULL,
+            applied_at  TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def status():
+    conn = db.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        applied = _applied(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    return [(version, name, version in applied) for version, name, _ in available()]
+
+
+def upgrade():
+    """Apply pending migrations; returns the versions applied by this call"""
+    conn = db.engine.raw_connection()
+    done = []
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+        conn.commit()
+        try:
+            applied = _applied(cur)
+            conn.commit()
+            for version, name, path in available():
+                if version in applied:
+                    continue
+                log.info("Applying migration %04d_%s", version, name)
+                try:
+                    cur.execute(path.read_text())
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    log.exception("Migration %04d_%s failed", version, name)
+                    raise
+                done.append(version)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+            conn.commit()
+    finally:
+        conn.close()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply QStack schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations instead of applying them")
+    args = parser.parse_args()
+
+    from server import create_app
+
+    with create_app().app_context():
+        if args.status:
+            for version, name, applied in status():
+                print(f"{version:04d}_{name}: {'applied' if applied else 'pending'}")
+            return
+        done = upgrade()
+    print(f"Applied {len(done)} migration(s)" if done else "Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+-- Baseline schema, matching what db.create_all() produced before migrations.
+-- Written to be a no-op on databases that were created that way.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'preferred_contact') THEN
+        CREATE TYPE preferred_contact AS ENUM ('Email', 'Phone', 'Discord');
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS users (
+    id                VARCHAR       NOT NULL PRIMARY KEY,
+    role              TEXT          NOT NULL,
+    location          TEXT          NOT NULL,
+    zoomlink          TEXT          NOT NULL,
+    discord           TEXT          NOT NULL,
+    phone             TEXT          NOT NULL,
+    preferred         preferred_contact,
+    resolved_tickets  INTEGER,
+    ratings           NUMERIC(2,1)[],
+    reviews           JSON,
+    ticket_id         INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id             SERIAL        NOT NULL PRIMARY KEY,
+    creator_id     VARCHAR,
+    claimant_id    VARCHAR,
+    claimant_name  TEXT,
+    question       TEXT          NOT NULL,
+    content        TEXT          NOT NULL,
+    location       TEXT          NOT NULL,
+    tags           TEXT[]        NOT NULL,
+    images         TEXT[]        NOT NULL,
+    creator_email  TEXT          NOT NULL,
+    creator_name   TEXT          NOT NULL,
+    active         BOOLEAN       NOT NULL,
+    status         VARCHAR,
+    "createdAt"    TIMESTAMP     NOT NULL,
+    "claimedAt"    TIMESTAMP
+);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'users_ticket_id_fkey') THEN
+        ALTER TABLE users ADD CONSTRAINT users_ticket_id_fkey
+            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE SET NULL;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tickets_creator_id_fkey') THEN
+        ALTER TABLE tickets ADD CONSTRAINT tickets_creator_id_fkey
+            FOREIGN KEY (creator_id) REFERENCES users(id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tickets_claimant_id_fkey') THEN
+        ALTER TABLE tickets ADD CONSTRAINT tickets_claimant_id_fkey
+            FOREIGN KEY (claimant_id) REFERENCES users(id);
+    END IF;
+END $$;
@@ -0,0 +1,7 @@
+-- Stored user profiles (server/profiles.py)
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS name TEXT,
+    ADD COLUMN IF NOT EXISTS email TEXT,
+    ADD COLUMN IF NOT EXISTS privilege INTEGER,
+    ADD COLUMN IF NOT EXISTS profile_synced_at TIMESTAMP;
@@ -0,0 +1,8 @@
+-- Indexes for the queue, claim and admin queries
+
+CREATE INDEX IF NOT EXISTS ix_tickets_status ON tickets (status);
+CREATE INDEX IF NOT EXISTS ix_tickets_claimant_id ON tickets (claimant_id);
+CREATE INDEX IF NOT EXISTS ix_tickets_creator_id ON tickets (creator_id);
+CREATE INDEX IF NOT EXISTS ix_tickets_created_at ON tickets ("createdAt" DESC);
+CREATE INDEX IF NOT EXISTS ix_tickets_tags ON tickets USING GIN (tags);
+CREATE INDEX IF NOT EXISTS ix_users_role ON users (role);
@@ -0,0 +1,19 @@
+-- Full-text search over tickets (server/search.py)
+--
+-- The question weighs most, then tags, then the body. array_to_string is
+-- only STABLE, so the vector is built by an IMMUTABLE wrapper that a
+-- generated column is allowed to call.
+
+CREATE OR REPLACE FUNCTION ticket_search_vector(question TEXT, content TEXT, tags TEXT[])
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT setweight(to_tsvector('english', coalesce(question, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(array_to_string(tags, ' '), '')), 'B')
+        || setweight(to_tsvector('english', coalesce(content, '')), 'C')
+$$;
+
+ALTER TABLE tickets
+    ADD COLUMN IF NOT EXISTS search tsvector
+    GENERATED ALWAYS AS (ticket_search_vector(question, content, tags)) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_tickets_search ON tickets USING GIN (search);
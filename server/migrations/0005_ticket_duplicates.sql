@@ -0,0 +1,14 @@
+-- Near-duplicate detection (server/duplicates.py)
+--
+-- minhash is the ticket's MinHash signature; lsh_bands holds one hash per
+-- band of it, so candidate duplicates are the tickets sharing any band
+-- (lsh_bands && ...), answered from the GIN index. cluster_id points at the
+-- first ticket of a group of duplicates.
+
+ALTER TABLE tickets
+    ADD COLUMN IF NOT EXISTS minhash BIGINT[],
+    ADD COLUMN IF NOT EXISTS lsh_bands BIGINT[],
+    ADD COLUMN IF NOT EXISTS cluster_id INTEGER REFERENCES tickets (id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_tickets_lsh_bands ON tickets USING GIN (lsh_bands);
+CREATE INDEX IF NOT EXISTS ix_tickets_cluster_id ON tickets (cluster_id);
@@ -0,0 +1,12 @@
+-- Server-side sessions (server/sessions.py)
+--
+-- The cookie holds only a random session id; rows are keyed by its SHA-256
+-- so the table alone can't be used to hijack a session.
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data JSONB NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at);
@@ -0,0 +1,29 @@
+-- Cold storage for finished tickets (server/archive.py)
+--
+-- Same columns as tickets minus the search and duplicate-detection ones,
+-- which only matter while a ticket is live. No foreign keys: archived rows
+-- are history and must not slow down writes to users.
+
+CREATE TABLE IF NOT EXISTS tickets_archive (
+    id             INTEGER       NOT NULL PRIMARY KEY,
+    creator_id     VARCHAR,
+    claimant_id    VARCHAR,
+    claimant_name  TEXT,
+    question       TEXT          NOT NULL,
+    content        TEXT          NOT NULL,
+    location       TEXT          NOT NULL,
+    tags           TEXT[]        NOT NULL,
+    images         TEXT[]        NOT NULL,
+    creator_email  TEXT          NOT NULL,
+    creator_name   TEXT          NOT NULL,
+    active         BOOLEAN       NOT NULL,
+    status         VARCHAR,
+    "createdAt"    TIMESTAMP     NOT NULL,
+    "claimedAt"    TIMESTAMP,
+    cluster_id     INTEGER,
+    archived_at    TIMESTAMP     NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_tickets_archive_created_at ON tickets_archive ("createdAt" DESC);
+CREATE INDEX IF NOT EXISTS ix_tickets_archive_claimant_id ON tickets_archive (claimant_id);
+CREATE INDEX IF NOT EXISTS ix_tickets_archive_creator_id ON tickets_archive (creator_id);
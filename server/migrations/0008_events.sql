@@ -0,0 +1,105 @@
+-- Hackathon events (server/hackathons.py)
+--
+-- Every ticket and rating belongs to an event, and both tables are
+-- LIST-partitioned by event_id, one partition per event, so queries scoped
+-- to the current event only touch its partition and closing an event
+-- detaches it. The rows that existed before this migration become event 1.
+--
+-- A partitioned table's unique constraints must include the partition key,
+-- so nothing can reference tickets(id) with a foreign key any more: the
+-- users.ticket_id and tickets.cluster_id constraints are dropped and the app
+-- clears users.ticket_id itself when it removes tickets.
+
+CREATE TABLE IF NOT EXISTS events (
+    id          SERIAL     NOT NULL PRIMARY KEY,
+    name        TEXT       NOT NULL,
+    is_current  BOOLEAN    NOT NULL DEFAULT false,
+    created_at  TIMESTAMP  NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    closed_at   TIMESTAMP
+);
+-- At most one current event
+CREATE UNIQUE INDEX IF NOT EXISTS ux_events_current ON events (is_current) WHERE is_current;
+
+INSERT INTO events (id, name, is_current) VALUES (1, 'Current event', true) ON CONFLICT DO NOTHING;
+SELECT setval('events_id_seq', (SELECT max(id) FROM events));
+
+CREATE OR REPLACE FUNCTION current_event_id() RETURNS INTEGER
+LANGUAGE sql STABLE AS $$
+    SELECT id FROM events WHERE is_current
+$$;
+
+-- Tickets: turn the existing table into event 1's partition
+
+ALTER TABLE tickets ADD COLUMN event_id INTEGER;
+UPDATE tickets SET event_id = 1;
+ALTER TABLE tickets ALTER COLUMN event_id SET NOT NULL;
+
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_ticket_id_fkey;
+ALTER TABLE tickets DROP CONSTRAINT IF EXISTS tickets_cluster_id_fkey;
+ALTER TABLE tickets DROP CONSTRAINT IF EXISTS tickets_creator_id_fkey;
+ALTER TABLE tickets DROP CONSTRAINT IF EXISTS tickets_claimant_id_fkey;
+
+ALTER TABLE tickets RENAME TO tickets_e1;
+-- A partition's primary key has to match the parent's (id, event_id)
+ALTER TABLE tickets_e1 DROP CONSTRAINT tickets_pkey;
+ALTER TABLE tickets_e1 ADD CONSTRAINT tickets_e1_pkey PRIMARY KEY (id, event_id);
+DO $$
+DECLARE
+    index_name TEXT;
+BEGIN
+    FOR index_name IN
+        SELECT indexname FROM pg_indexes WHERE tablename = 'tickets_e1' AND indexname LIKE 'ix\_tickets\_%'
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', index_name, replace(index_name, 'ix_tickets_', 'ix_tickets_e1_'));
+    END LOOP;
+END $$;
+
+CREATE TABLE tickets (LIKE tickets_e1 INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE)
+    PARTITION BY LIST (event_id);
+ALTER TABLE tickets ALTER COLUMN event_id SET DEFAULT current_event_id();
+ALTER TABLE tickets ADD CONSTRAINT tickets_pkey PRIMARY KEY (id, event_id);
+-- The id sequence must outlive event 1's partition
+ALTER SEQUENCE tickets_id_seq OWNED BY tickets.id;
+
+ALTER TABLE tickets ATTACH PARTITION tickets_e1 FOR VALUES IN (1);
+-- Catches rows for an event whose partition is missing; normally empty
+CREATE TABLE tickets_default PARTITION OF tickets DEFAULT;
+
+-- Partitioned indexes; the existing ones on tickets_e1 are attached, not rebuilt
+CREATE INDEX ix_tickets_status ON tickets (status);
+CREATE INDEX ix_tickets_claimant_id ON tickets (claimant_id);
+CREATE INDEX ix_tickets_creator_id ON tickets (creator_id);
+CREATE INDEX ix_tickets_created_at ON tickets ("createdAt" DESC);
+CREATE INDEX ix_tickets_tags ON tickets USING GIN (tags);
+CREATE INDEX ix_tickets_search ON tickets USING GIN (search);
+CREATE INDEX ix_tickets_lsh_bands ON tickets USING GIN (lsh_bands);
+CREATE INDEX ix_tickets_cluster_id ON tickets (cluster_id);
+
+ALTER TABLE tickets ADD CONSTRAINT tickets_creator_id_fkey FOREIGN KEY (creator_id) REFERENCES users (id);
+ALTER TABLE tickets ADD CONSTRAINT tickets_claimant_id_fkey FOREIGN KEY (claimant_id) REFERENCES users (id);
+
+ALTER TABLE tickets_archive ADD COLUMN IF NOT EXISTS event_id INTEGER;
+UPDATE tickets_archive SET event_id = 1 WHERE event_id IS NULL;
+CREATE INDEX IF NOT EXISTS ix_tickets_archive_event_id ON tickets_archive (event_id);
+
+-- Ratings: one row per rating, so leaderboards can be computed per event.
+-- users.ratings keeps the all-time list shown on profiles.
+
+CREATE TABLE ratings (
+    id          BIGSERIAL     NOT NULL,
+    event_id    INTEGER       NOT NULL DEFAULT current_event_id(),
+    mentor_id   VARCHAR       NOT NULL,
+    ticket_id   INTEGER,
+    rating      NUMERIC(2,1)  NOT NULL,
+    reviewer    TEXT,
+    review      TEXT,
+    created_at  TIMESTAMP     NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (id, event_id)
+) PARTITION BY LIST (event_id);
+
+CREATE TABLE ratings_e1 PARTITION OF ratings FOR VALUES IN (1);
+CREATE TABLE ratings_default PARTITION OF ratings DEFAULT;
+CREATE INDEX ix_ratings_mentor_id ON ratings (mentor_id);
+
+INSERT INTO ratings (event_id, mentor_id, rating)
+SELECT 1, users.id, rating FROM users, unnest(users.ratings) AS rating WHERE rating IS NOT NULL;
@@ -0,0 +1,9 @@
+-- Mentor presence (server/presence.py)
+--
+-- skills are the ticket tags a mentor can help with; last_seen_at is the
+-- last heartbeat, written in batches by each worker.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS skills TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS ix_users_mentor_last_seen ON users (last_seen_at) WHERE role = 'mentor';
@@ -0,0 +1,46 @@
+-- Scheduled maintenance jobs (server/scheduler.py)
+
+-- When a mentor marked the ticket resolved; abandoned feedback is timed from here
+ALTER TABLE tickets ADD COLUMN IF NOT EXISTS "resolvedAt" TIMESTAMP;
+ALTER TABLE tickets_archive ADD COLUMN IF NOT EXISTS "resolvedAt" TIMESTAMP;
+
+-- Last run of each job, whichever worker ran it
+CREATE TABLE IF NOT EXISTS job_runs (
+    job          TEXT              NOT NULL PRIMARY KEY,
+    started_at   TIMESTAMP         NOT NULL,
+    duration_ms  DOUBLE PRECISION  NOT NULL,
+    rows         INTEGER,
+    error        TEXT,
+    runs         BIGINT            NOT NULL DEFAULT 0,
+    failures     BIGINT            NOT NULL DEFAULT 0
+);
+
+-- Per-event leaderboard numbers, refreshed by the refresh_rollups job instead
+-- of being aggregated on every /api/queue/ranking poll
+CREATE MATERIALIZED VIEW IF NOT EXISTS mentor_event_stats AS
+WITH resolved AS (
+    SELECT event_id, claimant_id AS mentor_id, count(*) AS resolved
+    FROM (
+        SELECT event_id, claimant_id, status FROM tickets
+        UNION ALL
+        SELECT event_id, claimant_id, status FROM tickets_archive
+    ) t
+    WHERE claimant_id IS NOT NULL AND status IN ('awaiting_feedback', 'completed')
+    GROUP BY event_id, claimant_id
+),
+rated AS (
+    SELECT event_id, mentor_id, count(*) AS ratings, avg(rating) AS average_rating
+    FROM ratings
+    GROUP BY event_id, mentor_id
+)
+SELECT
+    coalesce(rated.event_id, resolved.event_id) AS event_id,
+    coalesce(rated.mentor_id, resolved.mentor_id) AS mentor_id,
+    coalesce(resolved.resolved, 0) AS resolved,
+    coalesce(rated.ratings, 0) AS ratings,
+    rated.average_rating
+FROM rated
+FULL JOIN resolved ON resolved.event_id = rated.event_id AND resolved.mentor_id = rated.mentor_id;
+
+-- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mentor_event_stats ON mentor_event_stats (event_id, mentor_id);
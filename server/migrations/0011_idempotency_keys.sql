@@ -0,0 +1,17 @@
+-- Idempotency keys for ticket submit and rate (server/idempotency.py)
+--
+-- A row is inserted in the same transaction as the work it guards, so a
+-- retried request either finds the committed response to replay or, if the
+-- first attempt is still running, waits on the row lock until it finishes.
+-- The prune_idempotency_keys job deletes rows after IDEMPOTENCY_TTL_HOURS.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id     VARCHAR    NOT NULL,
+    key         TEXT       NOT NULL,
+    endpoint    TEXT       NOT NULL,
+    response    JSONB,
+    created_at  TIMESTAMP  NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created_at ON idempotency_keys (created_at);
@@ -0,0 +1,11 @@
+-- Results of expensive shared views, shared between workers (server/coalesce.py)
+--
+-- Unlogged: it is a cache, so writes skip the WAL and a crash just empties it.
+-- refreshing_until is the lease of the worker recomputing a stale result.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS shared_results (
+    key               TEXT         PRIMARY KEY,
+    body              TEXT,
+    computed_at       TIMESTAMPTZ,
+    refreshing_until  TIMESTAMPTZ
+);
@@ -1,2 +1,4 @@
 from server.models.user import User
-from server.models.ticket import Ticket
+from server.models.ticket import ArchivedTicket, Ticket
+from server.models.event import Event
+from server.models.rating import Rating
@@ -0,0 +1,23 @@
+from server import db
+from sqlalchemy import Column, Integer, Boolean, Text, DateTime, text
+
+
+class Event(db.Model):
+    """A hackathon; tickets and ratings are partitioned by event"""
+
+    __tablename__ = "events"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    name = Column(Text, nullable=False)
+    is_current = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, server_default=text("(now() AT TIME ZONE 'utc')"))
+    closed_at = Column(DateTime)
+
+    def map(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "current": self.is_current,
+            "createdAt": self.created_at,
+            "closedAt": self.closed_at,
+        }
@@ -0,0 +1,17 @@
+from server import db
+from sqlalchemy import Column, Integer, BigInteger, Text, String, Numeric, DateTime, text
+
+
+class Rating(db.Model):
+    """One hacker's rating of a mentor, in the event it was given"""
+
+    __tablename__ = "ratings"
+
+    id = Column(BigInteger, primary_key=True, nullable=False)
+    event_id = Column(Integer, nullable=False, server_default=text("current_event_id()"))
+    mentor_id = Column(String, nullable=False)
+    ticket_id = Column(Integer)
+    rating = Column(Numeric(2, 1), nullable=False)
+    reviewer = Column(Text)
+    review = Column(Text)
+    created_at = Column(DateTime, nullable=False, server_default=text("(now() AT TIME ZONE 'utc')"))
@@ -1,6 +1,7 @@
-from server import db
-from sqlalchemy import Column, Integer, Boolean, Text, String, ForeignKey, ARRAY, DateTime
-from sqlalchemy.orm import relationship
+from server import attachments, db, duplicates, hackathons
+from sqlalchemy import Column, Integer, BigInteger, Boolean, Text, String, ForeignKey, ARRAY, DateTime, Computed, text
+from sqlalchemy.dialects.postgresql import ARRAY as PG_ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 
 
 class Ticket(db.Model):
@@ -27,6 +28,20 @@ class Ticket(db.Model):
 
     createdAt = Column(DateTime, nullable=False)
     claimedAt = Column(DateTime)
+    resolvedAt = Column(DateTime)
+
+    # Generated by Postgres for full-text search (server/search.py); deferred
+    # so ordinary ticket queries don't load it
+    search = deferred(Column(TSVECTOR, Computed("ticket_search_vector(question, content, tags)", persisted=True)))
+
+    # Near-duplicate detection (server/duplicates.py)
+    minhash = deferred(Column(PG_ARRAY(BigInteger)))
+    lsh_bands = deferred(Column(PG_ARRAY(BigInteger)))
+    # First ticket of the group of duplicates this one belongs to
+    cluster_id = Column(Integer)
+
+    # Partition key (server/hackathons.py)
+    event_id = Column(Integer, nullable=False, server_default=text("current_event_id()"))
 
     def __init__(self, user, data, active, creator_email="", creator_name=""):
         self.creator = user
@@ -42,6 +57,8 @@ class Ticket(db.Model):
         self.status = "unclaimed"
         self.claimedAt = None
         self.claimant_name = None
+        self.event_id = hackathons.current_event_id()
+        self.minhash, self.lsh_bands = duplicates.signature(self.question, self.content)
 
     def update(self, data):
         self.question = data["question"]
@@ -49,6 +66,7 @@ class Ticket(db.Model):
         self.location = data["location"]
         self.images = data.get("images", [])
         self.tags = data.get("tags", [])
+        self.minhash, self.lsh_bands = duplicates.signature(self.question, self.content)
 
     def map(self):
         # Use stored creator name (captured at ticket creation)
@@ -79,7 +97,11 @@ class Ticket(db.Model):
             "content": self.content,
             "tags": self.tags,
             "location": self.location,
-            "images": self.images,
+            "images": [attachments.url(image) if attachments.REF_PATTERN.fullmatch(image) else image
+                       for image in self.images],
+            # None for legacy inline images: sending them twice would double the payload
+            "thumbnails": [attachments.thumbnail_url(image) if attachments.REF_PATTERN.fullmatch(image) else None
+                           for image in self.images],
             # This is now the true creator's name, stored at ticket creation
             "creator": creator_name,
             "creator_email": self.creator_email,
@@ -91,5 +113,38 @@ class Ticket(db.Model):
             "status": self.status,
             # This is now the true mentor's name, stored when ticket was claimed
             "mentor_name": mentor_name,
-            "mentor_id": self.claimant_id
+            "mentor_id": self.claimant_id,
+            "cluster_id": self.cluster_id,
         }
+
+
+class ArchivedTicket(db.Model):
+    """A finished ticket moved out of the live table by server/archive.py"""
+
+    __tablename__ = "tickets_archive"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    creator_id = Column(String)
+    creator = relationship("User", primaryjoin="foreign(ArchivedTicket.creator_id) == User.id", viewonly=True)
+
+    claimant_id = Column(String)
+    claimant = relationship("User", primaryjoin="foreign(ArchivedTicket.claimant_id) == User.id", viewonly=True)
+    claimant_name = Column(Text)
+
+    question = Column(Text, nullable=False)
+    content = Column(Text, nullable=False)
+    location = Column(Text, nullable=False)
+    tags = Column(ARRAY(Text), nullable=False, default=[])
+    images = Column(ARRAY(Text), nullable=False)
+    creator_email = Column(Text, nullable=False)
+    creator_name = Column(Text, nullable=False)
+
+    active = Column(Boolean, nullable=False, default=False)
+    status = Column(String)
+
+    createdAt = Column(DateTime, nullable=False)
+    claimedAt = Column(DateTime)
+    resolvedAt = Column(DateTime)
+    cluster_id = Column(Integer)
+    event_id = Column(Integer)
+    archived_at = Column(DateTime, nullable=False)
@@ -3,17 +3,15 @@ from sqlalchemy import (
     Column,
     Integer,
     Text,
-    ForeignKey,
     ARRAY,
     Numeric,
     String,
     Enum,
+    DateTime,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.mutable import MutableList
-from flask import session
 from sqlalchemy.dialects.postgresql import JSON
-from server.hackpsu_api import get_user_info, get_my_info
 
 
 class User(db.Model):
@@ -30,8 +28,20 @@ class User(db.Model):
     ratings = Column(MutableList.as_mutable(ARRAY(Numeric(2, 1))))
     reviews = Column(MutableList.as_mutable(JSON), default=list)
 
-    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="SET NULL"))
-    ticket = relationship("Ticket", foreign_keys=[ticket_id])
+    # Profile copied from the auth server / HackPSU API so views never need a remote lookup
+    name = Column(Text)
+    email = Column(Text)
+    privilege = Column(Integer)
+    profile_synced_at = Column(DateTime)
+
+    # Ticket tags a mentor can help with, and their last heartbeat (server/presence.py)
+    skills = Column(MutableList.as_mutable(ARRAY(Text)), nullable=False, server_default="{}")
+    last_seen_at = Column(DateTime)
+
+    # No foreign key since tickets is partitioned (migrations/0008_events.sql);
+    # whatever deletes or moves a ticket clears this
+    ticket_id = Column(Integer)
+    ticket = relationship("Ticket", primaryjoin="foreign(User.ticket_id) == Ticket.id", viewonly=True)
 
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
@@ -44,17 +54,13 @@ class User(db.Model):
         self.resolved_tickets = 0
         self.ratings = []
         self.reviews = []
+        self.skills = []
 
     def map(self):
-        # Get name and email from session (populated during login from JWT)
-        # TODO: When client sends Firebase ID token, we can fetch from HackPSU API
-        name = session.get('user_name', 'User')
-        email = session.get('user_email', '')
-
         return {
             "id": self.id,
-            "name": name,
-            "email": email,
+            "name": self.name or "User",
+            "email": self.email or "",
             "role": self.role,
             "location": self.location,
             "zoomlink": self.zoomlink,
@@ -69,5 +75,6 @@ class User(db.Model):
                 else None
             ),
             "reviews": self.reviews if self.reviews != None else [],
-            "preferred": self.preferred
+            "preferred": self.preferred,
+            "skills": self.skills or [],
         }
\ No newline at end of file
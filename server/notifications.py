@@ -4,7 +4,11 @@ Sends push notifications when new tickets are submitted
 """
 import requests
 from os import environ as env
-from flask import current_app as app
+from server import metrics, upstream
+from server.log import get_logger
+from server.upstream import UpstreamUnavailable
+
+log = get_logger("notify")
 
 
 def send_ticket_notification(ticket_data):
@@ -21,7 +25,8 @@ def send_ticket_notification(ticket_data):
     gotify_url = env.get("GOTIFY_URL", "https://notify.hackpsu.org")
 
     if not gotify_token:
-        app.logger.warning("GOTIFY_TOKEN not configured, skipping notification")
+        log.warning("GOTIFY_TOKEN not configured, skipping notification")
+        metrics.NOTIFICATIONS.labels("skipped").inc()
         return False
 
     try:
@@ -41,7 +46,7 @@ Tags: {tags_str}
         """.strip()
 
         # Send notification to Gotify
-        response = requests.post(
+        response = upstream.gotify.post(
             f"{gotify_url}/message",
             json={
                 "title": title,
@@ -49,16 +54,22 @@ Tags: {tags_str}
                 "priority": 5  # Default priority for new tickets
             },
             params={"token": gotify_token},
-            timeout=5  # 5 second timeout to avoid blocking
         )
 
         response.raise_for_status()
-        app.logger.info(f"Notification sent successfully for ticket: {ticket_data.get('question')}")
+        log.info("Notification sent successfully for ticket: %s", ticket_data.get('question'))
+        metrics.NOTIFICATIONS.labels("sent").inc()
         return True
 
+    except UpstreamUnavailable as e:
+        log.warning("Skipping Gotify notification: %s", e)
+        metrics.NOTIFICATIONS.labels("skipped").inc()
+        return False
     except requests.exceptions.RequestException as e:
-        app.logger.error(f"Failed to send Gotify notification: {str(e)}")
+        log.error("Failed to send Gotify notification: %s", e)
+        metrics.NOTIFICATIONS.labels("failed").inc()
         return False
     except Exception as e:
-        app.logger.error(f"Unexpected error sending notification: {str(e)}")
+        log.exception("Unexpected error sending notification: %s", e)
+        metrics.NOTIFICATIONS.labels("failed").inc()
         return False
@@ -0,0 +1,204 @@
+# Per-request performance instrumentation
+# Breaks each /api request down into SQL, upstream HTTP and JSON serialization
+# time, reported in a Server-Timing header and a structured log line.
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib json module
+    orjson = None
+else:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+from server import metrics
+from server.log import get_logger
+
+# Requests slower than this many milliseconds get their full breakdown logged.
+# Unset or 0 disables the slow request log.
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+
+log = get_logger("perf")
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.db_commits = 0
+        self.serialize_time = 0.0
+        self.compress_time = 0.0
+        self.upstream = {}  # name -> [count, seconds]
+        self.slow_log = SLOW_REQUEST_MS > 0
+        self.statements = []  # (seconds, sql), only kept for the slow request log
+        self.calls = []  # (name, seconds, detail), only kept for the slow request log
+
+    def add_upstream(self, name, elapsed, detail=None):
+        entry = self.upstream.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        if self.slow_log:
+            self.calls.append((name, elapsed, detail))
+
+    def server_timing(self, total):
+        parts = [f'db;desc="{self.db_count} queries, {self.db_commits} commits";dur={self.db_time * 1000:.2f}']
+        for name, (count, elapsed) in self.upstream.items():
+            parts.append(f'{name};desc="{count} calls";dur={elapsed * 1000:.2f}')
+        parts.append(f"serialize;dur={self.serialize_time * 1000:.2f}")
+        if self.compress_time:
+            parts.append(f"compress;dur={self.compress_time * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def current_stats():
+    """Stats for the request being served, or None outside a request"""
+    if not has_app_context():
+        return None
+    return g.get("perf")
+
+
+@contextmanager
+def timed_upstream(name, detail=None):
+    """Time an outbound HTTP call and attribute it to the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe_upstream(name, elapsed)
+        stats = current_stats()
+        if stats is not None:
+            stats.add_upstream(name, elapsed, detail)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("perf_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["perf_query_start"].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.db_count += 1
+        stats.db_time += elapsed
+        if stats.slow_log:
+            stats.statements.append((elapsed, statement))
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute doesn't run for a statement that raised; drop its start time
+    # so the next statement on this connection isn't timed from it
+    starts = context.connection.info.get("perf_query_start") if context.connection is not None else None
+    if context.cursor is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.db_count += 1
+        stats.db_time += elapsed
+        if stats.slow_log and context.statement:
+            stats.statements.append((elapsed, context.statement))
+
+
+@event.listens_for(Engine, "commit")
+def _commit(conn):
+    # Each one is a WAL flush on the database; handlers should need at most one
+    stats = current_stats()
+    if stats is not None:
+        stats.db_commits += 1
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that records how long encoding took
+
+    Uses orjson when it is installed. Output matches the default provider:
+    dates and Decimals still go through its default() hook.
+    """
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            if orjson is not None and not kwargs:
+                try:
+                    return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode()
+                except TypeError:
+                    pass  # e.g. integers beyond 64 bits; let the stdlib encoder handle it
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.serialize_time += time.perf_counter() - start
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is not None and not pretty:
+            # The default provider passes separators=(",", ":"), which is what orjson emits anyway
+            return self._app.response_class(
+                f"{self.dumps(self._prepare_response_obj(args, kwargs))}\n", mimetype=self.mimetype
+            )
+        return super().response(*args, **kwargs)
+
+
+def before_request():
+    g.perf = RequestStats()
+
+
+def after_request(response):
+    stats = g.pop("perf", None)
+    if stats is None:
+        return response
+
+    total = time.perf_counter() - stats.start
+    response.headers["Server-Timing"] = stats.server_timing(total)
+    metrics.observe_request(request.endpoint, request.method, response.status_code, total)
+
+    slow = stats.slow_log and total * 1000 >= SLOW_REQUEST_MS
+    if not slow and not log.isEnabledFor(logging.INFO):
+        return response
+
+    record = {
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "total_ms": round(total * 1000, 2),
+        "db_queries": stats.db_count,
+        "db_ms": round(stats.db_time * 1000, 2),
+        "db_commits": stats.db_commits,
+        "upstream_ms": {name: round(elapsed * 1000, 2) for name, (_, elapsed) in stats.upstream.items()},
+        "serialize_ms": round(stats.serialize_time * 1000, 2),
+        "compress_ms": round(stats.compress_time * 1000, 2),
+    }
+    log.info("request", extra=record)
+
+    if slow:
+        record["upstream_calls"] = [
+            {"name": name, "ms": round(elapsed * 1000, 2), "detail": detail}
+            for name, elapsed, detail in stats.calls
+        ]
+        record["slowest_queries"] = [
+            {"ms": round(elapsed * 1000, 2), "sql": statement[:500]}
+            for elapsed, statement in sorted(stats.statements, reverse=True)[:10]
+        ]
+        log.warning("slow request", extra=record)
+
+    return response
+
+
+def init_app(flask_app):
+    flask_app.json = TimedJSONProvider(flask_app)
+    # config.py sets DEBUG = True, which would otherwise indent every response
+    flask_app.json.compact = os.environ.get("JSON_PRETTY", "false").lower() != "true"
@@ -0,0 +1,213 @@
+# Bulk user import into QStack
+# Streams user rows from Plume (server-side cursor) or a CSV export and loads
+# them in batches with COPY into a temp staging table plus one
+# INSERT ... SELECT ... ON CONFLICT per batch, or with execute_values.
+# Progress is checkpointed per batch in import_checkpoints, so an interrupted
+# run picks up after the last committed id. A run that reaches the end
+# deletes its checkpoint: ids are opaque strings, so new users can sort
+# before the last id and the next run has to start from the beginning.
+#
+#   python server/plume/importer.py plume
+#   python server/plume/importer.py csv users.csv --batch 10000
+#
+# CSV files need an "id" column; "name", "email" and "role" are optional.
+
+import argparse
+import csv
+import io
+import sys
+import time
+
+from psycopg2.extras import execute_values
+
+try:
+    from utils import create_ec2_connection, create_qstack_connection
+except ImportError:
+    from plume.utils import create_ec2_connection, create_qstack_connection
+
+DEFAULT_BATCH = 5000
+COLUMNS = ("id", "name", "email", "role")
+
+CHECKPOINT_TABLE = """
+    CREATE TABLE IF NOT EXISTS import_checkpoints (
+        source      TEXT PRIMARY KEY,
+        last_id     TEXT NOT NULL,
+        rows        BIGINT NOT NULL DEFAULT 0,
+        updated_at  TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+STAGING_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS import_users_stage (
+        id     TEXT,
+        name   TEXT,
+        email  TEXT,
+        role   TEXT
+    ) ON COMMIT DELETE ROWS
+"""
+
+# New users get the same defaults as User.__init__; existing users keep their
+# role and contact details and only pick up a name/email they don't have yet.
+UPSERT_FROM_STAGE = """
+    INSERT INTO users (id, role, location, zoomlink, discord, phone,
+                       resolved_tickets, ratings, reviews, name, email)
+    SELECT DISTINCT ON (id) id, COALESCE(role, 'hacker'), 'in person', '', '', '',
+           0, '{}'::numeric[], '[]'::json, name, email
+    FROM import_users_stage
+    ORDER BY id
+    ON CONFLICT (id) DO UPDATE SET
+        name = COALESCE(users.name, EXCLUDED.name),
+        email = COALESCE(users.email, EXCLUDED.email)
+"""
+
+UPSERT_VALUES = """
+    INSERT INTO users (id, role, location, zoomlink, discord, phone,
+                       resolved_tickets, ratings, reviews, name, email)
+    VALUES %s
+    ON CONFLICT (id) DO UPDATE SET
+        name = COALESCE(users.name, EXCLUDED.name),
+        email = COALESCE(users.email, EXCLUDED.email)
+"""
+VALUES_TEMPLATE = "(%s, COALESCE(%s, 'hacker'), 'in person', '', '', '', 0, '{}'::numeric[], '[]'::json, %s, %s)"
+
+
+def plume_rows(after=None, batch=DEFAULT_BATCH):
+    """Yield (id, name, email, role) from Plume's user table in id order"""
+    ec2_conn, _ = create_ec2_connection()
+    try:
+        # Named cursor: rows are streamed from the server in batch-sized chunks
+        with ec2_conn.cursor(name="qstack_user_import") as cur:
+            cur.itersize = batch
+            cur.execute("""
+                SELECT id::text, NULLIF(trim(concat_ws(' ', first_name, last_name)), ''), email, NULL
+                FROM "user"
+                WHERE %(after)s IS NULL OR id::text > %(after)s
+                ORDER BY id::text
+            """, {"after": after})
+            yield from cur
+    finally:
+        ec2_conn.close()
+
+
+def csv_rows(path, after=None):
+    """Yield (id, name, email, role) from a CSV export, sorted by id so runs can resume"""
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        rows = sorted(
+            (tuple(row.get(column) or None for column in COLUMNS) for row in reader if row.get("id")),
+            key=lambda row: row[0],
+        )
+    for row in rows:
+        if after is None or row[0] > after:
+            yield row
+
+
+def get_checkpoint(cur, source):
+    cur.execute("SELECT last_id, rows FROM import_checkpoints WHERE source = %s", (source,))
+    return cur.fetchone() or (None, 0)
+
+
+def reset_checkpoint(cur, source):
+    cur.execute("DELETE FROM import_checkpoints WHERE source = %s", (source,))
+
+
+def _save_checkpoint(cur, source, last_id, rows):
+    cur.execute("""
+        INSERT INTO import_checkpoints (source, last_id, rows, updated_at)
+        VALUES (%s, %s, %s, now())
+        ON CONFLICT (source) DO UPDATE
+            SET last_id = EXCLUDED.last_id, rows = EXCLUDED.rows, updated_at = EXCLUDED.updated_at
+    """, (source, last_id, rows))
+
+
+def _copy_batch(cur, batch):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY import_users_stage ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    cur.execute(UPSERT_FROM_STAGE)
+
+
+def _values_batch(cur, batch):
+    # Duplicate ids within one statement would make ON CONFLICT fail
+    unique = {row[0]: row for row in batch}
+    execute_values(cur, UPSERT_VALUES, [(id, role, name, email) for id, name, email, role in unique.values()],
+                   template=VALUES_TEMPLATE, page_size=len(unique))
+
+
+def import_users(source, rows, batch=DEFAULT_BATCH, method="copy", progress=print):
+    """Load rows into users in batches, committing a checkpoint with each batch
+
+    rows must be in ascending id order and start after the checkpoint (see
+    plume_rows/csv_rows). The checkpoint is deleted once rows is exhausted.
+    Returns the total number of rows loaded for source.
+    """
+    load_batch = _copy_batch if method == "copy" else _values_batch
+    qstack_conn, cur = create_qstack_connection()
+    cur.execute(CHECKPOINT_TABLE)
+    cur.execute(STAGING_TABLE)
+    qstack_conn.commit()
+
+    _, total = get_checkpoint(cur, source)
+    loaded = 0
+    start = time.perf_counter()
+    pending = []
+
+    def flush():
+        nonlocal loaded, total
+        load_batch(cur, pending)
+        loaded += len(pending)
+        total += len(pending)
+        _save_checkpoint(cur, source, pending[-1][0], total)
+        qstack_conn.commit()
+        elapsed = time.perf_counter() - start
+        progress(f"{source}: {loaded} rows this run ({total} total), {loaded / elapsed:,.0f} rows/s, last id {pending[-1][0]}")
+        pending.clear()
+
+    try:
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= batch:
+                flush()
+        if pending:
+            flush()
+        # Finished: only interrupted runs resume
+        reset_checkpoint(cur, source)
+        qstack_conn.commit()
+    finally:
+        qstack_conn.close()
+
+    elapsed = time.perf_counter() - start
+    progress(f"{source}: done, {loaded} rows in {elapsed:.2f}s")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users into QStack")
+    parser.add_argument("source", choices=["plume", "csv"])
+    parser.add_argument("path", nargs="?", help="CSV file (for the csv source)")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="rows per batch/commit")
+    parser.add_argument("--method", choices=["copy", "values"], default="copy")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    args = parser.parse_args()
+
+    if args.source == "csv" and not args.path:
+        parser.error("the csv source needs a path")
+    source = "plume" if args.source == "plume" else f"csv:{args.path}"
+
+    qstack_conn, cur = create_qstack_connection()
+    cur.execute(CHECKPOINT_TABLE)
+    if args.restart:
+        reset_checkpoint(cur, source)
+    after, _ = get_checkpoint(cur, source)
+    qstack_conn.commit()
+    qstack_conn.close()
+    if after:
+        print(f"{source}: resuming after id {after}")
+
+    rows = plume_rows(after, args.batch) if args.source == "plume" else csv_rows(args.path, after)
+    import_users(source, rows, args.batch, args.method)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
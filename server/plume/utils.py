@@ -128,30 +128,19 @@ def init_new_users_table():
 
 def load_all_users():
     """
-    Copy all user ids from plume to qstack
+    Copy all users from plume to qstack (resumable bulk load, see importer.py)
     """
-    # set up connections
-    ec2_conn, ec2_cur = create_ec2_connection()
-    qstack_conn, qstack_cur = create_qstack_connection()
-
-    # load user data from plume's user table
-    ec2_cur.execute("""
-        SELECT id from "user";
-    """)
-    uids = [uid[0] for uid in ec2_cur.fetchall()]
-    # uids = ec2_cur.fetchall()
-
-    # add ids to qstack's new users table
-    for i in range(len(uids)):
-        uid = uids[i]
+    try:
+        from importer import get_checkpoint, import_users, plume_rows
+    except ImportError:
+        from plume.importer import get_checkpoint, import_users, plume_rows
 
-        qstack_cur.execute(f"""
-            INSERT INTO users (id, role, location, zoomlink, discord, reviews)
-            VALUES ('{str(uid)}', 'hacker', 'in person', '', '', ARRAY[]::text[])
-            ON CONFLICT (id) DO NOTHING;
-        """)
+    qstack_conn, qstack_cur = create_qstack_connection()
+    qstack_cur.execute("SELECT to_regclass('import_checkpoints')")
+    after = get_checkpoint(qstack_cur, "plume")[0] if qstack_cur.fetchone()[0] else None
+    qstack_conn.close()
 
-    qstack_conn.commit()
+    return import_users("plume", plume_rows(after))
 
 
 def delete_users_old():
@@ -176,13 +165,13 @@ def get_info(uids: list[str]):
     if not uids:
         return {}
 
-    placeholders = ",".join([f"'{uid}'" for uid in uids])
-    ec2_cur.execute(f"""
+    ec2_cur.execute("""
         SELECT id, first_name, last_name, email
             FROM "user"
-            WHERE id IN ({placeholders});
-    """)
+            WHERE id::text = ANY(%s);
+    """, ([str(uid) for uid in uids],))
     uinfo = ec2_cur.fetchall()
+    ec2_conn.close()
 
     for id, first, last, email in uinfo:
         plume_info[id] = {"name": f"{first} {last}", "email": email}
@@ -0,0 +1,187 @@
+# Mentor presence
+#
+# Who is online right now, without a database write per request. Every
+# authenticated request from a mentor (the queue page polls every few
+# seconds) and every open event stream is a heartbeat, which only touches
+# this worker's in-memory table. Every PRESENCE_FLUSH_SECONDS a background
+# thread sends the mentors this worker saw to every other worker as
+# presence.seen events (server/events.py) and stores their last-seen times
+# with one UPDATE. A mentor is online until PRESENCE_TTL seconds pass without
+# a heartbeat on any worker.
+#
+# After (re)connecting to the event bus a worker reloads the table from
+# users.last_seen_at, so a new or reconnected worker is at most one flush
+# behind the others.
+
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import text
+
+from server import db, events
+from server.log import get_logger
+
+PRESENCE_TTL = int(os.environ.get("PRESENCE_TTL", "60"))
+PRESENCE_FLUSH_SECONDS = int(os.environ.get("PRESENCE_FLUSH_SECONDS", "10"))
+# Mentors per presence.seen event, to stay under the NOTIFY payload limit
+EVENT_BATCH = 25
+
+log = get_logger("presence")
+
+_mentors = {}  # user id -> (last seen as unix time, location, skills)
+_pending = {}  # the same, for mentors seen by this worker since the last flush
+_lock = threading.Lock()
+_needs_reload = True
+_flusher = None
+_flusher_lock = threading.Lock()
+_engine = None
+
+
+def seen(user_id, location, skills):
+    """Record a heartbeat from a mentor; cheap enough to call on every request"""
+    entry = (time.time(), location, tuple(skills or ()))
+    with _lock:
+        _mentors[user_id] = entry
+        _pending[user_id] = entry
+    _ensure_flushing()
+
+
+def _merge(user_id, entry):
+    current = _mentors.get(user_id)
+    if current is None or current[0] < entry[0]:
+        _mentors[user_id] = entry
+
+
+def _on_event(event):
+    global _needs_reload
+    if event["type"] == "resync":
+        # Heartbeats may have been missed; reload before the next count
+        _needs_reload = True
+    elif event["type"] == "presence.seen" and event.get("pid") != os.getpid():
+        with _lock:
+            for user_id, seen_at, location, skills in event["mentors"]:
+                _merge(user_id, (seen_at, location, tuple(skills)))
+
+
+events.subscribe("presence.", _on_event)
+
+
+def _reload():
+    global _needs_reload
+    _needs_reload = False
+    try:
+        with _engine.connect() as conn:
+            rows = conn.execute(
+                text("""
+                    SELECT id, extract(epoch FROM last_seen_at AT TIME ZONE 'utc') AS seen_at, location, skills
+                    FROM users
+                    WHERE role = 'mentor'
+                      AND last_seen_at > (now() AT TIME ZONE 'utc') - make_interval(secs => :ttl)
+                """),
+                {"ttl": PRESENCE_TTL},
+            ).all()
+    except Exception:
+        _needs_reload = True
+        raise
+    with _lock:
+        for row in rows:
+            _merge(row.id, (float(row.seen_at), row.location, tuple(row.skills or ())))
+
+
+def flush():
+    """Share and store the heartbeats seen since the last flush; returns how many"""
+    with _lock:
+        pending = list(_pending.items())
+        _pending.clear()
+        # Forget mentors who went offline so the table stays small
+        cutoff = time.time() - PRESENCE_TTL
+        for user_id in [user_id for user_id, entry in _mentors.items() if entry[0] < cutoff]:
+            del _mentors[user_id]
+    if not pending:
+        return 0
+
+    try:
+        _store(pending)
+    except Exception:
+        # Try again with the next flush, unless a newer heartbeat arrived meanwhile
+        with _lock:
+            for user_id, entry in pending:
+                current = _pending.get(user_id)
+                if current is None or current[0] < entry[0]:
+                    _pending[user_id] = entry
+        raise
+    return len(pending)
+
+
+def _store(pending):
+    with _engine.begin() as conn:
+        for start in range(0, len(pending), EVENT_BATCH):
+            events.publish(
+                "presence.seen",
+                connection=conn,
+                pid=os.getpid(),
+                mentors=[
+                    [user_id, round(seen_at, 1), location, list(skills)]
+                    for user_id, (seen_at, location, skills) in pending[start:start + EVENT_BATCH]
+                ],
+            )
+        conn.execute(
+            text("""
+                UPDATE users SET last_seen_at = to_timestamp(seen.at) AT TIME ZONE 'utc'
+                FROM unnest(CAST(:ids AS TEXT[]), CAST(:ats AS FLOAT8[])) AS seen(id, at)
+                WHERE users.id = seen.id
+            """),
+            {"ids": [user_id for user_id, _ in pending], "ats": [entry[0] for _, entry in pending]},
+        )
+
+
+class Flusher(threading.Thread):
+    def __init__(self):
+        super().__init__(name="qstack-presence", daemon=True)
+        self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            time.sleep(PRESENCE_FLUSH_SECONDS)
+            try:
+                flush()
+            except Exception:
+                log.exception("Presence flush failed")
+
+
+def _ensure_flushing():
+    # Like events.ensure_listening: threads do not survive fork()
+    global _flusher
+    if _engine is None or (_flusher is not None and _flusher.pid == os.getpid()):
+        return
+    with _flusher_lock:
+        if _flusher is None or _flusher.pid != os.getpid():
+            _flusher = Flusher()
+            _flusher.start()
+
+
+def online_mentors():
+    """{user id: (last seen, location, skills)} for every mentor online now"""
+    if _needs_reload and _engine is not None:
+        _reload()
+    cutoff = time.time() - PRESENCE_TTL
+    with _lock:
+        return {user_id: entry for user_id, entry in _mentors.items() if entry[0] >= cutoff}
+
+
+def counts():
+    """Online mentors in total, per location and per skill tag"""
+    mentors = online_mentors().values()
+    return {
+        "total": len(mentors),
+        "byLocation": dict(Counter(location for _, location, _ in mentors)),
+        "byTag": dict(Counter(tag for _, _, skills in mentors for tag in skills)),
+    }
+
+
+def init_app(app):
+    global _engine
+    with app.app_context():
+        _engine = db.engine
@@ -0,0 +1,155 @@
+# Stored user profiles
+# Name, email and privilege are kept on the User row. They are refreshed from
+# the verified session at login and by the standalone sync worker
+# (sync_worker.py), so request handlers never look them up remotely.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from server import db, upstream
+from server.log import get_logger
+
+# Seconds between sync runs
+PROFILE_SYNC_INTERVAL = int(os.environ.get("PROFILE_SYNC_INTERVAL", "900"))
+# Concurrent HackPSU API lookups
+PROFILE_SYNC_CONCURRENCY = int(os.environ.get("PROFILE_SYNC_CONCURRENCY", "8"))
+# Users looked up per second across all threads
+PROFILE_SYNC_RATE = float(os.environ.get("PROFILE_SYNC_RATE", "20"))
+# Rows written per UPDATE batch
+PROFILE_SYNC_BATCH = int(os.environ.get("PROFILE_SYNC_BATCH", "500"))
+
+# Service credential for HackPSU API calls made outside a request: either a
+# Firebase refresh token for a service account (preferred, exchanged for an
+# ID token as needed) or a fixed Firebase ID token.
+HACKPSU_SERVICE_REFRESH_TOKEN = os.environ.get("HACKPSU_SERVICE_REFRESH_TOKEN")
+HACKPSU_API_TOKEN = os.environ.get("HACKPSU_API_TOKEN")
+
+log = get_logger("profiles")
+
+
+def apply_profile(user, info):
+    """Copy name/email/privilege onto user, ignoring empty values"""
+    if info.get("name"):
+        user.name = info["name"]
+    if info.get("email"):
+        user.email = info["email"]
+    if info.get("privilege") is not None:
+        user.privilege = info["privilege"]
+    user.profile_synced_at = datetime.utcnow()
+
+
+class ServiceToken:
+    """Firebase ID token for the sync worker, refreshed shortly before it expires"""
+
+    def __init__(self, refresh_token=HACKPSU_SERVICE_REFRESH_TOKEN, id_token=HACKPSU_API_TOKEN):
+        self.refresh_token = refresh_token
+        self.id_token = id_token
+        self.expires_at = 0 if refresh_token else float("inf")
+
+    def get(self):
+        if self.refresh_token and time.monotonic() >= self.expires_at:
+            from server.hackpsu_api import FIREBASE_API_KEY
+
+            response = upstream.firebase.post(
+                f"https://securetoken.googleapis.com/v1/token?key={FIREBASE_API_KEY}",
+                detail="securetoken",
+                data={"grant_type": "refresh_token", "refresh_token": self.refresh_token},
+            )
+            response.raise_for_status()
+            data = response.json()
+            self.id_token = data["id_token"]
+            self.expires_at = time.monotonic() + int(data.get("expires_in", 3600)) - 60
+        return self.id_token
+
+
+class RateLimiter:
+    """Token bucket shared by the lookup threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fetch_profiles(uids, token, concurrency=PROFILE_SYNC_CONCURRENCY, rate=PROFILE_SYNC_RATE):
+    """Look up uids on the HackPSU API; returns {uid: info} for the ones found"""
+    from server.hackpsu_api import get_user_info
+
+    limiter = RateLimiter(rate)
+
+    def lookup(uid):
+        limiter.wait()
+        return get_user_info([uid], token=token).get(uid)
+
+    profiles = {}
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="profile-sync") as pool:
+        for uid, info in zip(uids, pool.map(lookup, uids)):
+            # get_user_info fills in a placeholder when both lookups fail; keep what we have
+            if info and info.get("email"):
+                profiles[uid] = info
+    return profiles
+
+
+def write_profiles(profiles, batch=PROFILE_SYNC_BATCH):
+    """Bulk-update the stored profiles, one executemany per batch"""
+    from server.models import User
+
+    synced_at = datetime.utcnow()
+    rows = [
+        {
+            "id": uid,
+            "name": info.get("name") or None,
+            "email": info["email"],
+            "privilege": info.get("privilege", 0),
+            "profile_synced_at": synced_at,
+        }
+        for uid, info in profiles.items()
+    ]
+    for start in range(0, len(rows), batch):
+        db.session.execute(update(User), rows[start:start + batch])
+        db.session.commit()
+
+
+def sync_profiles(token, concurrency=PROFILE_SYNC_CONCURRENCY, rate=PROFILE_SYNC_RATE, batch=PROFILE_SYNC_BATCH):
+    """Refresh every user's stored profile; returns the run's stats"""
+    from server.models import User
+
+    started = time.perf_counter()
+    # Oldest profiles first, so an interrupted run still makes progress
+    uids = db.session.execute(
+        select(User.id).order_by(User.profile_synced_at.asc().nullsfirst())
+    ).scalars().all()
+    # Don't hold a transaction open during the lookups
+    db.session.rollback()
+    loaded = time.perf_counter()
+
+    profiles = fetch_profiles(uids, token, concurrency, rate)
+    fetched = time.perf_counter()
+
+    write_profiles(profiles, batch)
+    written = time.perf_counter()
+
+    stats = {
+        "users": len(uids),
+        "updated": len(profiles),
+        "failed": len(uids) - len(profiles),
+        "load_ms": round((loaded - started) * 1000, 2),
+        "fetch_ms": round((fetched - loaded) * 1000, 2),
+        "write_ms": round((written - fetched) * 1000, 2),
+        "total_ms": round((written - started) * 1000, 2),
+    }
+    log.info("profile sync run", extra=stats)
+    return stats
@@ -0,0 +1,266 @@
+# Scheduled maintenance jobs
+#
+# Every worker runs a scheduler thread, but only the one holding a Postgres
+# session advisory lock (LEADER_LOCK_ID) runs jobs. The lock lives on a
+# dedicated connection, so if the leader's process dies Postgres releases it
+# and another worker takes over within LEADER_RETRY_SECONDS.
+#
+# Jobs are plain batched SQL against the current event:
+#   unclaim_stale     hand claimed tickets back to the queue when the mentor
+#                     has not been seen (server/presence.py) for STALE_CLAIM_MINUTES
+#   complete_feedback complete tickets left awaiting feedback for FEEDBACK_TIMEOUT_MINUTES
+#   prune_orphans     clear users.ticket_id pointing at no live ticket
+#   refresh_rollups   refresh the mentor_event_stats leaderboard view
+#   prune_idempotency_keys
+#                     delete idempotency keys (server/idempotency.py) older
+#                     than IDEMPOTENCY_TTL_HOURS
+#
+# Each run is logged with its duration and row count, counted in Prometheus,
+# and recorded in job_runs (GET /api/admin/jobs).
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from server import db, events, idempotency, metrics
+from server.log import get_logger
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+STALE_CLAIM_MINUTES = int(os.environ.get("STALE_CLAIM_MINUTES", "45"))
+FEEDBACK_TIMEOUT_MINUTES = int(os.environ.get("FEEDBACK_TIMEOUT_MINUTES", "60"))
+JOB_BATCH = int(os.environ.get("JOB_BATCH", "500"))
+LEADER_RETRY_SECONDS = 30
+# Any constant shared by all workers (migrate uses 7_420_350, sessions 7_420_351)
+LEADER_LOCK_ID = 7_420_352
+
+log = get_logger("scheduler")
+
+_scheduler = None
+_lock = threading.Lock()
+_engine = None
+
+
+def _in_batches(conn, sql, event=None, **params):
+    """Run a batched UPDATE ... RETURNING id until it returns less than a batch; returns every id
+
+    With event, publishes an event of that type with each batch's ids. One
+    event for the whole run could be too big for NOTIFY and get dropped.
+    """
+    ids = []
+    while True:
+        batch = conn.execute(text(sql), {"batch": JOB_BATCH, **params}).scalars().all()
+        if event and batch:
+            events.publish(event, connection=conn, ids=batch)
+        ids += batch
+        if len(batch) < JOB_BATCH:
+            return ids
+
+
+def unclaim_stale(conn):
+    ids = _in_batches(conn, """
+        WITH stale AS (
+            SELECT t.id FROM tickets t
+            LEFT JOIN users u ON u.id = t.claimant_id
+            WHERE t.event_id = current_event_id()
+              AND t.status = 'claimed'
+              AND t."claimedAt" < now() - make_interval(mins => :minutes)
+              AND (u.last_seen_at IS NULL
+                   OR u.last_seen_at < (now() AT TIME ZONE 'utc') - make_interval(mins => :minutes))
+            ORDER BY t.id
+            LIMIT :batch
+            FOR UPDATE OF t SKIP LOCKED
+        )
+        UPDATE tickets SET active = true, status = NULL, claimant_id = NULL, claimant_name = NULL, "claimedAt" = NULL
+        FROM stale
+        WHERE tickets.id = stale.id AND tickets.event_id = current_event_id()
+        RETURNING tickets.id
+    """, event="ticket.unclaimed", minutes=STALE_CLAIM_MINUTES)
+    if ids:
+        metrics.TICKET_UNCLAIMS.inc(len(ids))
+    return len(ids)
+
+
+def complete_feedback(conn):
+    ids = _in_batches(conn, """
+        WITH abandoned AS (
+            SELECT id FROM tickets
+            WHERE event_id = current_event_id()
+              AND status = 'awaiting_feedback'
+              AND coalesce("resolvedAt", "claimedAt") < now() - make_interval(mins => :minutes)
+            ORDER BY id
+            LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        ),
+        completed AS (
+            UPDATE tickets SET status = 'completed', active = false
+            FROM abandoned
+            WHERE tickets.id = abandoned.id AND tickets.event_id = current_event_id()
+            RETURNING tickets.id
+        ),
+        -- Lets the hackers submit again, as rating would have
+        cleared AS (
+            UPDATE users SET ticket_id = NULL WHERE ticket_id IN (SELECT id FROM completed)
+        )
+        SELECT id FROM completed
+    """, event="ticket.completed", minutes=FEEDBACK_TIMEOUT_MINUTES)
+    return len(ids)
+
+
+def prune_orphans(conn):
+    return len(_in_batches(conn, """
+        WITH orphans AS (
+            SELECT u.id FROM users u
+            WHERE u.ticket_id IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM tickets t WHERE t.id = u.ticket_id AND t.event_id = current_event_id()
+              )
+            LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE users SET ticket_id = NULL FROM orphans WHERE users.id = orphans.id
+        RETURNING users.id
+    """))
+
+
+def prune_idempotency_keys(conn):
+    return len(_in_batches(conn, """
+        WITH expired AS (
+            SELECT user_id, key FROM idempotency_keys
+            WHERE created_at < (now() AT TIME ZONE 'utc') - make_interval(hours => :hours)
+            LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        )
+        DELETE FROM idempotency_keys k USING expired
+        WHERE k.user_id = expired.user_id AND k.key = expired.key
+        RETURNING k.key
+    """, hours=idempotency.IDEMPOTENCY_TTL_HOURS))
+
+
+def refresh_rollups(conn):
+    conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mentor_event_stats"))
+    return None
+
+
+# (name, function, interval in seconds)
+JOBS = [
+    ("unclaim_stale", unclaim_stale, int(os.environ.get("UNCLAIM_STALE_INTERVAL", "60"))),
+    ("complete_feedback", complete_feedback, int(os.environ.get("COMPLETE_FEEDBACK_INTERVAL", "300"))),
+    ("prune_orphans", prune_orphans, int(os.environ.get("PRUNE_ORPHANS_INTERVAL", "600"))),
+    ("refresh_rollups", refresh_rollups, int(os.environ.get("REFRESH_ROLLUPS_INTERVAL", "60"))),
+    ("prune_idempotency_keys", prune_idempotency_keys, int(os.environ.get("PRUNE_IDEMPOTENCY_KEYS_INTERVAL", "3600"))),
+]
+
+
+def run_job(name, job):
+    """Run one job in its own transaction, then record how it went"""
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    rows, error = None, None
+    try:
+        with _engine.begin() as conn:
+            rows = job(conn)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        log.exception("Job %s failed", name)
+        metrics.JOB_FAILURES.labels(name).inc()
+    duration = time.perf_counter() - started
+
+    metrics.JOB_DURATION.labels(name).observe(duration)
+    if rows:
+        metrics.JOB_ROWS.labels(name).inc(rows)
+    log.info("job run", extra={"job": name, "rows": rows, "duration_ms": round(duration * 1000, 2), "error": error})
+    with _engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO job_runs (job, started_at, duration_ms, rows, error, runs, failures)
+                VALUES (:job, :started_at, :duration_ms, :rows, :error, 1, :failed)
+                ON CONFLICT (job) DO UPDATE SET
+                    started_at = EXCLUDED.started_at, duration_ms = EXCLUDED.duration_ms,
+                    rows = EXCLUDED.rows, error = EXCLUDED.error,
+                    runs = job_runs.runs + 1, failures = job_runs.failures + EXCLUDED.failures
+            """),
+            {
+                "job": name, "started_at": started_at, "duration_ms": duration * 1000,
+                "rows": rows, "error": error, "failed": int(error is not None),
+            },
+        )
+    return rows
+
+
+class Scheduler(threading.Thread):
+    """Competes for leadership and, while leader, runs each job on its interval"""
+
+    def __init__(self, engine):
+        super().__init__(name="qstack-scheduler", daemon=True)
+        self.engine = engine
+        self.pid = os.getpid()
+
+    def _try_lead(self):
+        # Taken out of the pool for good: the lock lasts as long as this connection
+        connection = self.engine.raw_connection()
+        connection.detach()
+        conn = connection.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK_ID,))
+            if cur.fetchone()[0]:
+                return conn
+        conn.close()
+        return None
+
+    def _lead(self, conn):
+        next_run = {name: time.monotonic() for name, _, _ in JOBS}
+        while True:
+            for name, job, interval in JOBS:
+                if time.monotonic() >= next_run[name]:
+                    try:
+                        run_job(name, job)
+                    except Exception:
+                        # Only recording the run failed; the job itself was logged
+                        log.exception("Could not record run of %s", name)
+                    next_run[name] = time.monotonic() + interval
+            time.sleep(max(min(next_run.values()) - time.monotonic(), 1))
+            # Still holding the lock? A dead connection means another worker may lead now
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+
+    def run(self):
+        while True:
+            conn = None
+            try:
+                conn = self._try_lead()
+                if conn is not None:
+                    log.info("Became job scheduler leader")
+                    self._lead(conn)
+            except Exception as e:
+                log.warning("Scheduler lost leadership (%s)", e)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(LEADER_RETRY_SECONDS)
+
+
+def ensure_running():
+    """Start this process's scheduler thread if it isn't running (see events.ensure_listening)"""
+    global _scheduler
+    if not SCHEDULER_ENABLED or _engine is None:
+        return
+    if _scheduler is not None and _scheduler.pid == os.getpid():
+        return
+    with _lock:
+        if _scheduler is None or _scheduler.pid != os.getpid():
+            _scheduler = Scheduler(_engine)
+            _scheduler.start()
+
+
+def init_app(app):
+    global _engine
+    with app.app_context():
+        _engine = db.engine
+    app.before_request(ensure_running)
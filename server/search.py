@@ -0,0 +1,82 @@
+# Full-text search over tickets
+#
+# Tickets carry a generated tsvector column (tickets.search, see
+# migrations/0004_ticket_search.sql) built from the question, tags and content
+# and indexed with GIN. search_tickets() answers the mentor/admin search box;
+# similar_open_tickets() is the looser lookup shown to hackers while they
+# write a ticket, so they can find someone already asking the same thing.
+
+import os
+
+from sqlalchemy import Text, cast, func, or_, select
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.orm import joinedload
+
+from server import db
+from server.models import Ticket
+
+SEARCH_CONFIG = "english"
+SEARCH_MAX_PAGE_SIZE = 100
+SIMILAR_LIMIT = int(os.environ.get("SIMILAR_LIMIT", "5"))
+# ts_rank below this is mostly a single shared common word in the body
+SIMILAR_MIN_RANK = float(os.environ.get("SIMILAR_MIN_RANK", "0.1"))
+# Unclaiming (by a mentor or the scheduler) puts a ticket back with status NULL
+OPEN_STATUSES = ("unclaimed", "claimed")
+
+
+def search_tickets(text, statuses=None, since=None, until=None, page=1, per_page=20):
+    """Tickets matching text, best match first
+
+    text uses web search syntax ("quoted phrases", -excluded, or). Returns
+    (rows, more) where rows is a list of (Ticket, rank) for the requested
+    page and more says whether another page follows.
+    """
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    rank = func.ts_rank_cd(Ticket.search, query)
+
+    stmt = (
+        select(Ticket, rank.label("rank"))
+        .where(Ticket.search.op("@@")(query))
+        .options(joinedload(Ticket.creator))
+    )
+    if statuses:
+        stmt = stmt.where(Ticket.status.in_(statuses))
+    if since:
+        stmt = stmt.where(Ticket.createdAt >= since)
+    if until:
+        stmt = stmt.where(Ticket.createdAt < until)
+
+    per_page = max(1, min(per_page, SEARCH_MAX_PAGE_SIZE))
+    rows = db.session.execute(
+        stmt.order_by(rank.desc(), Ticket.createdAt.desc(), Ticket.id.desc())
+        .offset((max(page, 1) - 1) * per_page)
+        # One extra row tells us whether there is a next page without a COUNT
+        .limit(per_page + 1)
+    ).all()
+    return [(row.Ticket, row.rank) for row in rows[:per_page]], len(rows) > per_page
+
+
+def similar_open_tickets(text, exclude_id=None, limit=SIMILAR_LIMIT):
+    """Open tickets that share words with text, best match first
+
+    Unlike search_tickets() any shared word counts (the query's terms are
+    OR-ed together), and weak matches are cut off by SIMILAR_MIN_RANK.
+    """
+    if not text or len(text.strip()) < 3:
+        return []
+
+    # plainto_tsquery gives 'a' & 'b'; swap the operators to match any term
+    query = cast(func.replace(cast(func.plainto_tsquery(SEARCH_CONFIG, text), Text), " & ", " | "), TSQUERY)
+    rank = func.ts_rank(Ticket.search, query)
+
+    stmt = (
+        select(Ticket, rank.label("rank"))
+        .where(Ticket.search.op("@@")(query))
+        .where(Ticket.active.is_(True), or_(Ticket.status.is_(None), Ticket.status.in_(OPEN_STATUSES)))
+        .where(rank >= SIMILAR_MIN_RANK)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(Ticket.id != exclude_id)
+
+    rows = db.session.execute(stmt.order_by(rank.desc()).limit(limit)).all()
+    return [(row.Ticket, row.rank) for row in rows]
@@ -0,0 +1,25 @@
+# Response formats for list endpoints
+#
+# List endpoints return an array of objects by default. With ?format=columnar
+# they return each field name once and the values row by row:
+#   {"columns": ["id", "question", ...], "rows": [[1, "Help"], [2, "Bug"]]}
+# which is much smaller for the admin dashboards that poll every few seconds.
+
+from flask import request
+
+COLUMNAR = "columnar"
+
+
+def columnar(records):
+    """Convert a list of dicts with the same keys into {"columns", "rows"}"""
+    if not records:
+        return {"columns": [], "rows": []}
+    columns = list(records[0])
+    return {"columns": columns, "rows": [[record.get(column) for column in columns] for record in records]}
+
+
+def list_response(records):
+    """records as requested by the client: a plain list, or columnar"""
+    if request.args.get("format") == COLUMNAR:
+        return columnar(records)
+    return records
@@ -0,0 +1,241 @@
+# Server-side sessions
+#
+# Flask's default session puts everything (user id, name, email and two
+# Firebase JWTs) in a signed cookie that every poll re-sends and every
+# request re-verifies. With SESSION_BACKEND=postgres (the default) the
+# cookie holds only a random session id; the data lives in the sessions
+# table (migrations/0006_sessions.sql) behind a small per-process LRU.
+# Workers drop each other's cached copies through session.* events, so an
+# update in one worker is seen by the next request wherever it lands.
+#
+# Expiry slides: a session is written back only when it changed or has less
+# than half its lifetime left, so a poll costs at most a cache lookup.
+# Expired rows are deleted in batches by whichever worker gets there first.
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import request
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from sqlalchemy import text
+from werkzeug.datastructures import CallbackDict
+
+from server import db, events
+from server.log import get_logger
+
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "postgres")
+SESSION_LIFETIME = timedelta(seconds=int(os.environ.get("SESSION_LIFETIME_SECONDS", str(7 * 24 * 60 * 60))))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+# Upper bound on how long a cached copy is used without asking the database,
+# in case an invalidation event was missed
+SESSION_CACHE_TTL = 300
+SESSION_GC_INTERVAL = int(os.environ.get("SESSION_GC_INTERVAL", "600"))
+SESSION_GC_BATCH = 1000
+# Any constant shared by all workers; keeps two of them from collecting at once
+GC_LOCK_ID = 7_420_351
+
+log = get_logger("sessions")
+
+
+def _key(sid):
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+
+
+class SessionCache:
+    """LRU of session key -> (data, expires_at, cached at)"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[2] > SESSION_CACHE_TTL:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, expires_at):
+        with self.lock:
+            self.entries[key] = (data, expires_at, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = SessionCache(SESSION_CACHE_SIZE)
+_last_gc = 0.0
+
+
+def _on_session_event(event):
+    if event.get("pid") == os.getpid():
+        return  # our own write; the cache already has it
+    if event["type"] == "resync":
+        _cache.clear()
+    elif event["type"] in ("session.changed", "session.deleted"):
+        _cache.discard(event.get("id"))
+
+
+events.subscribe("session.", _on_session_event)
+
+
+def collect_garbage(batch=SESSION_GC_BATCH):
+    """Delete one batch of expired sessions; returns the number deleted"""
+    with db.engine.begin() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": GC_LOCK_ID}).scalar():
+            return 0
+        deleted = conn.execute(
+            text("""
+                DELETE FROM sessions WHERE id IN (
+                    SELECT id FROM sessions WHERE expires_at < :now LIMIT :batch
+                )
+            """),
+            {"now": datetime.utcnow(), "batch": batch},
+        ).rowcount
+    if deleted:
+        log.info("Deleted %s expired sessions", deleted)
+    return deleted
+
+
+def _maybe_collect_garbage():
+    global _last_gc
+    now = time.monotonic()
+    if now - _last_gc < SESSION_GC_INTERVAL:
+        return
+    _last_gc = now
+    try:
+        collect_garbage()
+    except Exception:
+        log.exception("Session garbage collection failed")
+
+
+class PostgresSessionInterface(SessionInterface):
+    """Keeps session data in Postgres and only a session id in the cookie"""
+
+    # Reads the signed cookies issued before this backend, so nobody is logged out by a deploy
+    legacy = SecureCookieSessionInterface()
+
+    def _load(self, key):
+        cached = _cache.get(key)
+        if cached is not None:
+            data, expires_at, _ = cached
+        else:
+            # Separate connection: never mix session I/O into the request's transaction
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    text("SELECT data, expires_at FROM sessions WHERE id = :id AND expires_at > :now"),
+                    {"id": key, "now": datetime.utcnow()},
+                ).first()
+            if row is None:
+                return None
+            data, expires_at = row.data, row.expires_at
+            _cache.put(key, data, expires_at)
+        if expires_at <= datetime.utcnow():
+            return None
+        return data, expires_at
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and "." not in sid:
+            loaded = self._load(_key(sid))
+            if loaded is not None:
+                data, expires_at = loaded
+                return ServerSession(dict(data), sid=sid, expires_at=expires_at)
+        elif sid:
+            legacy = self.legacy.open_session(app, request)
+            if legacy:
+                session = ServerSession(dict(legacy), new=True)
+                session.modified = True
+                return session
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid and session.modified:
+                key = _key(session.sid)
+                with db.engine.begin() as conn:
+                    conn.execute(text("DELETE FROM sessions WHERE id = :id"), {"id": key})
+                    events.publish("session.deleted", connection=conn, id=key, pid=os.getpid())
+                _cache.discard(key)
+                response.delete_cookie(name, domain=domain, path=path)
+            elif session.new and name in request.cookies:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        refresh = session.expires_at is None or session.expires_at - now < SESSION_LIFETIME / 2
+        if not (session.modified or refresh):
+            return
+
+        if not session.sid:
+            session.sid = secrets.token_urlsafe(32)
+        key = _key(session.sid)
+        expires_at = now + SESSION_LIFETIME
+        data = dict(session)
+        with db.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO sessions (id, data, expires_at) VALUES (:id, CAST(:data AS JSONB), :expires_at)
+                    ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at
+                """),
+                {"id": key, "data": json.dumps(data), "expires_at": expires_at},
+            )
+            if not session.new:
+                # Other workers may hold the old copy
+                events.publish("session.changed", connection=conn, id=key, pid=os.getpid())
+        _cache.put(key, data, expires_at)
+        session.expires_at = expires_at
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=expires_at,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        _maybe_collect_garbage()
+
+
+def init_app(app):
+    if SESSION_BACKEND == "postgres":
+        app.session_interface = PostgresSessionInterface()
+    elif SESSION_BACKEND != "cookie":
+        raise ValueError(f"Unknown SESSION_BACKEND {SESSION_BACKEND!r}; use 'postgres' or 'cookie'")
@@ -0,0 +1,203 @@
+# Shared client for upstream HTTP dependencies
+#
+# Every call to the auth server, Firebase, the HackPSU API and Gotify goes
+# through one Upstream per service:
+#   - a pooled keep-alive requests.Session, so calls reuse connections
+#   - a circuit breaker: after UPSTREAM_FAILURE_THRESHOLD consecutive failures
+#     the service is skipped for UPSTREAM_RESET_SECONDS, then one trial call
+#     decides whether it is back
+#   - a per-request deadline: all upstream calls made while serving one
+#     request share UPSTREAM_DEADLINE_SECONDS, and each call's timeout is
+#     capped at what is left
+#   - optional hedging for idempotent GETs: if no answer arrives within
+#     UPSTREAM_HEDGE_MS a second identical request is sent from its own
+#     greenlet and the first response wins. The first attempt runs in the
+#     caller's greenlet, so hedging needs the gevent workers; elsewhere GETs
+#     are not hedged.
+# When a call is skipped, the client raises UpstreamUnavailable right away so
+# callers can fall back to cached or stored data.
+
+import os
+import threading
+import time
+
+import gevent
+import requests
+from gevent import monkey
+from requests.adapters import HTTPAdapter
+
+from server import metrics
+from server.log import get_logger
+from server.perf import current_stats, timed_upstream
+
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "3"))
+UPSTREAM_DEADLINE_SECONDS = float(os.environ.get("UPSTREAM_DEADLINE_SECONDS", "8"))
+UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", "5"))
+UPSTREAM_RESET_SECONDS = float(os.environ.get("UPSTREAM_RESET_SECONDS", "30"))
+# 0 disables hedging
+UPSTREAM_HEDGE_MS = float(os.environ.get("UPSTREAM_HEDGE_MS", "750"))
+UPSTREAM_POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", "20"))
+
+log = get_logger("upstream")
+
+
+class _HedgeWon(BaseException):
+    """Thrown into the caller's greenlet when the hedge request answered first
+
+    A BaseException, like gevent.Timeout, so nothing on the way out catches it.
+    """
+
+
+class UpstreamUnavailable(Exception):
+    """The call was not made: the circuit is open or the request deadline has passed"""
+
+    def __init__(self, service, reason):
+        super().__init__(f"{service} unavailable ({reason})")
+        self.service = service
+        self.reason = reason
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, threshold=UPSTREAM_FAILURE_THRESHOLD, reset_after=UPSTREAM_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+                # Let exactly one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                log.warning("Circuit for %s closed", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+                log.warning("Circuit for %s opened after %s failures", self.name, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+def remaining_deadline():
+    """Seconds left in the current request's upstream budget, or None outside a request"""
+    stats = current_stats()
+    if stats is None:
+        return None
+    return UPSTREAM_DEADLINE_SECONDS - (time.perf_counter() - stats.start)
+
+
+class Upstream:
+    def __init__(self, name, timeout=UPSTREAM_TIMEOUT, hedge_ms=UPSTREAM_HEDGE_MS):
+        self.name = name
+        self.timeout = timeout
+        self.hedge_after = hedge_ms / 1000
+        self.breaker = CircuitBreaker(name)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=UPSTREAM_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _reject(self, reason):
+        metrics.UPSTREAM_REJECTED.labels(self.name, reason).inc()
+        raise UpstreamUnavailable(self.name, reason)
+
+    def _hedged(self, method, url, timeout, kwargs):
+        deadline = time.monotonic() + timeout
+        caller = gevent.getcurrent()
+        state = {"finished": False, "hedging": False}
+
+        def interrupt():
+            # Runs in the hub, so the caller can't finish between the check and the throw
+            if not state["finished"]:
+                caller.throw(_HedgeWon())
+
+        def hedge():
+            state["hedging"] = True
+            metrics.UPSTREAM_HEDGED.labels(self.name).inc()
+            try:
+                response = self.session.request(method, url, timeout=timeout - self.hedge_after, **kwargs)
+            except Exception as e:
+                return None, e
+            gevent.get_hub().loop.run_callback(interrupt)
+            return response, None
+
+        second = gevent.spawn_later(self.hedge_after, hedge)
+        try:
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+        except _HedgeWon:
+            state["finished"] = True
+            return second.value[0]
+        except Exception:
+            state["finished"] = True
+            if not state["hedging"]:
+                second.kill(block=False)
+                raise
+            # The first attempt failed; the hedge may still answer before the deadline
+            second.join(max(deadline - time.monotonic(), 0))
+            if second.ready() and second.value[0] is not None:
+                return second.value[0]
+            second.kill(block=False)
+            raise
+        state["finished"] = True
+        second.kill(block=False)
+        return response
+
+    def request(self, method, url, detail=None, hedge=False, **kwargs):
+        """Make a call through the breaker; raises UpstreamUnavailable or requests' errors
+
+        5xx responses count as failures but are still returned to the caller.
+        """
+        if not self.breaker.allow():
+            self._reject("circuit_open")
+
+        timeout = self.timeout
+        remaining = remaining_deadline()
+        if remaining is not None:
+            if remaining <= 0:
+                self._reject("deadline")
+            timeout = min(timeout, remaining)
+
+        with timed_upstream(self.name, detail or url.split("?", 1)[0]):
+            try:
+                if hedge and method == "GET" and 0 < self.hedge_after < timeout and monkey.is_module_patched("socket"):
+                    response = self._hedged(method, url, timeout, kwargs)
+                else:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, hedge=True, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+auth = Upstream("auth")
+firebase = Upstream("firebase")
+hackpsu = Upstream("hackpsu")
+gotify = Upstream("gotify", hedge_ms=0)
@@ -47,6 +47,25 @@ su - postgres -c "psql -d postgres -c \"GRANT ALL PRIVILEGES ON DATABASE qstackd
 
 echo "QStack database initialized"
 
-# Start Gunicorn with gevent worker class
-echo "Starting QStack application with gevent..."
-exec gunicorn -b 0.0.0.0:3001 -w 4 wsgi:app
+# Apply schema migrations once, before any worker starts
+echo "Applying database migrations..."
+python -m server.migrate
+
+# Keep stored user profiles fresh from the HackPSU API
+if [ -n "$HACKPSU_SERVICE_REFRESH_TOKEN" ] || [ -n "$HACKPSU_API_TOKEN" ]; then
+  echo "Starting profile sync worker..."
+  python sync_worker.py &
+fi
+
+# Move finished tickets out of the live table every hour
+echo "Starting ticket archiver..."
+python -m server.archive --interval "${ARCHIVE_INTERVAL:-3600}" &
+
+# Shared directory where each Gunicorn worker writes its Prometheus metrics
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/qstack-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Start Gunicorn (worker class/count configured in gunicorn.conf.py)
+echo "Starting QStack application with ${GUNICORN_WORKER_CLASS:-gevent} workers..."
+exec gunicorn -c gunicorn.conf.py wsgi:app
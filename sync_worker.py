@@ -0,0 +1,55 @@
+# Standalone profile sync worker
+# Refreshes the stored name/email/privilege of every user from the HackPSU API
+# on an interval, so the web workers never have to call it.
+#
+#   python sync_worker.py            # run forever
+#   python sync_worker.py --once     # single run, e.g. from cron
+
+import argparse
+import sys
+import time
+
+from server import create_app, db
+from server import profiles
+from server.log import get_logger
+
+log = get_logger("profiles")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync user profiles from the HackPSU API")
+    parser.add_argument("--once", action="store_true", help="run a single sync and exit")
+    parser.add_argument("--interval", type=int, default=profiles.PROFILE_SYNC_INTERVAL,
+                        help="seconds between runs")
+    parser.add_argument("--concurrency", type=int, default=profiles.PROFILE_SYNC_CONCURRENCY,
+                        help="concurrent HackPSU API lookups")
+    parser.add_argument("--rate", type=float, default=profiles.PROFILE_SYNC_RATE,
+                        help="max users looked up per second")
+    parser.add_argument("--batch", type=int, default=profiles.PROFILE_SYNC_BATCH,
+                        help="rows per bulk UPDATE")
+    args = parser.parse_args()
+
+    app = create_app()
+    token = profiles.ServiceToken()
+    if not token.refresh_token and not token.id_token:
+        sys.exit("Set HACKPSU_SERVICE_REFRESH_TOKEN or HACKPSU_API_TOKEN")
+
+    while True:
+        started = time.monotonic()
+        with app.app_context():
+            try:
+                profiles.sync_profiles(token.get(), args.concurrency, args.rate, args.batch)
+            except Exception as e:
+                db.session.rollback()
+                log.exception("Profile sync failed: %s", e)
+                if args.once:
+                    sys.exit(1)
+            finally:
+                db.session.remove()
+        if args.once:
+            return
+        time.sleep(max(args.interval - (time.monotonic() - started), 0))
+
+
+if __name__ == "__main__":
+    main()
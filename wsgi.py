@@ -1,6 +1,13 @@
-from server import app
+from server import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
+    from server import migrate
+
+    with app.app_context():
+        migrate.upgrade()
+
     port = app.config["FLASK_RUN_PORT"]
     debug = app.config["DEBUG"]
     app.run(host="0.0.0.0", port=port, debug=debug)